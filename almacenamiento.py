@@ -0,0 +1,391 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from decouple import config
+
+# -------------------------------------------------------------------
+# ⚙️ Configuración del almacenamiento de blobs
+# -------------------------------------------------------------------
+BLOB_BACKEND = config("BLOB_BACKEND", default="local")
+BLOB_DIR = config("BLOB_DIR", default="blobs")
+
+TAMANNO_BLOQUE = 1024 * 1024  # 1 MB por bloque al copiar archivos
+
+
+class BlobNoEncontrado(Exception):
+    pass
+
+
+class BlobDemasiadoGrande(Exception):
+    def __init__(self, limite: int):
+        super().__init__(f"El contenido excede el límite de {limite} bytes")
+        self.limite = limite
+
+
+class HashNoCoincide(Exception):
+    def __init__(self, esperado: str, obtenido: str):
+        super().__init__(f"El hash del contenido ({obtenido}) no coincide con el esperado ({esperado})")
+        self.esperado = esperado
+        self.obtenido = obtenido
+
+
+class DesplazamientoInvalido(Exception):
+    """El bloque no continúa lo ya recibido de una carga parcial."""
+    def __init__(self, recibido: int):
+        super().__init__(f"El bloque debe empezar en el byte {recibido}")
+        self.recibido = recibido
+
+
+# -------------------------------------------------------------------
+# 🧩 Interfaz: almacenamiento direccionado por contenido (SHA-256)
+# -------------------------------------------------------------------
+class AlmacenamientoBlobs(ABC):
+    """
+    Cada blob se guarda una sola vez bajo el SHA-256 de su contenido.
+    Los backends solo implementan las operaciones básicas; el cálculo del
+    hash y la deduplicación se hacen aquí.
+    """
+
+    @abstractmethod
+    def existe(self, hash_hex: str) -> bool:
+        ...
+
+    @abstractmethod
+    def abrir(self, hash_hex: str) -> BinaryIO:
+        """Devuelve un objeto tipo archivo de solo lectura (el llamador lo cierra)."""
+
+    @abstractmethod
+    def tamanno(self, hash_hex: str) -> int:
+        ...
+
+    @abstractmethod
+    def eliminar(self, hash_hex: str) -> None:
+        ...
+
+    @abstractmethod
+    def _publicar(self, hash_hex: str, ruta_temporal: str) -> None:
+        """Mueve un archivo temporal ya verificado a su ubicación definitiva."""
+
+    @abstractmethod
+    def modificado(self, hash_hex: str) -> Optional[float]:
+        """Momento (epoch) de la última publicación del blob, o None si no existe."""
+
+    def eliminar_si_anterior(self, hash_hex: str, limite: float) -> bool:
+        """
+        Elimina el blob solo si no se volvió a publicar desde 'limite' (epoch).
+        Devuelve False si se conservó. Los backends pueden hacerlo atómico.
+        """
+        momento = self.modificado(hash_hex)
+        if momento is not None and momento >= limite:
+            return False
+        self.eliminar(hash_hex)
+        return True
+
+    def _dir_temporal(self) -> Optional[str]:
+        return None
+
+    # Cargas parciales (subidas reanudables). Opcional para otros backends.
+    def escribir_parcial(self, id_carga: str, inicio: int, data: bytes) -> int:
+        """Escribe un bloque en 'inicio' (descarta lo que hubiera después) y devuelve el total recibido."""
+        raise NotImplementedError(f"{type(self).__name__} no soporta subidas reanudables")
+
+    def tamanno_parcial(self, id_carga: str) -> int:
+        raise NotImplementedError(f"{type(self).__name__} no soporta subidas reanudables")
+
+    def leer_parcial(self, id_carga: str) -> Iterator[bytes]:
+        raise NotImplementedError(f"{type(self).__name__} no soporta subidas reanudables")
+
+    def eliminar_parcial(self, id_carga: str) -> None:
+        raise NotImplementedError(f"{type(self).__name__} no soporta subidas reanudables")
+
+    def leer(self, hash_hex: str) -> bytes:
+        with closing(self.abrir(hash_hex)) as f:
+            return f.read()
+
+    def leer_bloques(self, hash_hex: str, inicio: int = 0, fin: Optional[int] = None) -> Iterator[bytes]:
+        """Itera el rango [inicio, fin] (ambos incluidos) del blob en bloques."""
+        with closing(self.abrir(hash_hex)) as f:
+            try:
+                f.seek(inicio)
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                # Flujos sin seek (p. ej. S3): se descarta el prefijo
+                saltar = inicio
+                while saltar > 0:
+                    descartado = f.read(min(TAMANNO_BLOQUE, saltar))
+                    if not descartado:
+                        return
+                    saltar -= len(descartado)
+            restante = None if fin is None else fin - inicio + 1
+            while restante is None or restante > 0:
+                bloque = f.read(TAMANNO_BLOQUE if restante is None else min(TAMANNO_BLOQUE, restante))
+                if not bloque:
+                    return
+                if restante is not None:
+                    restante -= len(bloque)
+                yield bloque
+
+    def guardar_bytes(self, data: bytes) -> tuple[str, int]:
+        return self.guardar_stream([data])
+
+    def guardar_stream(self, bloques: Iterable[bytes], limite: Optional[int] = None) -> tuple[str, int]:
+        """
+        Escribe los bloques a un archivo temporal calculando el hash al vuelo y
+        lo publica. Devuelve (hash, tamaño).
+
+        Se publica aunque el contenido ya exista: así queda con fecha reciente
+        y el recolector (eliminar_si_anterior) no borra un blob huérfano que
+        una subida acaba de reutilizar.
+        """
+        sha = hashlib.sha256()
+        total = 0
+        fd, ruta = tempfile.mkstemp(dir=self._dir_temporal())
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for bloque in bloques:
+                    total += len(bloque)
+                    if limite is not None and total > limite:
+                        raise BlobDemasiadoGrande(limite)
+                    sha.update(bloque)
+                    tmp.write(bloque)
+            hash_hex = sha.hexdigest()
+            self._publicar(hash_hex, ruta)
+            return hash_hex, total
+        finally:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+# -------------------------------------------------------------------
+# 💾 Backend local (sistema de archivos)
+# -------------------------------------------------------------------
+class AlmacenamientoLocal(AlmacenamientoBlobs):
+    def __init__(self, raiz: str):
+        self.raiz = os.path.abspath(raiz)
+        os.makedirs(os.path.join(self.raiz, "tmp"), exist_ok=True)
+
+    def ruta(self, hash_hex: str) -> str:
+        # Dos niveles de directorios para no acumular miles de archivos en uno solo
+        return os.path.join(self.raiz, hash_hex[:2], hash_hex[2:4], hash_hex)
+
+    def _dir_temporal(self) -> str:
+        return os.path.join(self.raiz, "tmp")
+
+    def existe(self, hash_hex: str) -> bool:
+        return os.path.exists(self.ruta(hash_hex))
+
+    def abrir(self, hash_hex: str) -> BinaryIO:
+        try:
+            return open(self.ruta(hash_hex), "rb")
+        except FileNotFoundError:
+            raise BlobNoEncontrado(hash_hex)
+
+    def tamanno(self, hash_hex: str) -> int:
+        try:
+            return os.path.getsize(self.ruta(hash_hex))
+        except FileNotFoundError:
+            raise BlobNoEncontrado(hash_hex)
+
+    def eliminar(self, hash_hex: str) -> None:
+        try:
+            os.remove(self.ruta(hash_hex))
+        except FileNotFoundError:
+            pass
+
+    def _publicar(self, hash_hex: str, ruta_temporal: str) -> None:
+        destino = self.ruta(hash_hex)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(ruta_temporal, destino)  # atómico dentro del mismo disco
+
+    def modificado(self, hash_hex: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.ruta(hash_hex))
+        except FileNotFoundError:
+            return None
+
+    def eliminar_si_anterior(self, hash_hex: str, limite: float) -> bool:
+        # Se aparta primero (rename atómico) y se mira la fecha de lo apartado: una
+        # publicación anterior al rename queda con fecha reciente y se restaura, y
+        # una posterior deja su propio archivo en el destino.
+        apartado = os.path.join(self._dir_temporal(), f"borrar-{hash_hex}-{uuid.uuid4().hex}")
+        try:
+            os.replace(self.ruta(hash_hex), apartado)
+        except FileNotFoundError:
+            return True
+        if os.path.getmtime(apartado) >= limite:
+            os.replace(apartado, self.ruta(hash_hex))
+            return False
+        os.remove(apartado)
+        return True
+
+    def _ruta_parcial(self, id_carga: str) -> str:
+        return os.path.join(self.raiz, "cargas", os.path.basename(id_carga))
+
+    def escribir_parcial(self, id_carga: str, inicio: int, data: bytes) -> int:
+        ruta = self._ruta_parcial(id_carga)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        recibido = self.tamanno_parcial(id_carga)
+        if inicio > recibido:
+            raise DesplazamientoInvalido(recibido)
+        with open(ruta, "r+b" if os.path.exists(ruta) else "wb") as f:
+            f.seek(inicio)
+            f.write(data)
+            f.truncate()
+        return inicio + len(data)
+
+    def tamanno_parcial(self, id_carga: str) -> int:
+        try:
+            return os.path.getsize(self._ruta_parcial(id_carga))
+        except FileNotFoundError:
+            return 0
+
+    def leer_parcial(self, id_carga: str) -> Iterator[bytes]:
+        with open(self._ruta_parcial(id_carga), "rb") as f:
+            while True:
+                bloque = f.read(TAMANNO_BLOQUE)
+                if not bloque:
+                    return
+                yield bloque
+
+    def eliminar_parcial(self, id_carga: str) -> None:
+        try:
+            os.remove(self._ruta_parcial(id_carga))
+        except FileNotFoundError:
+            pass
+
+
+# -------------------------------------------------------------------
+# ☁️ Backend S3 / compatible (dependencia opcional: boto3)
+# -------------------------------------------------------------------
+class AlmacenamientoS3(AlmacenamientoBlobs):
+    def __init__(self, bucket: str, prefijo: str = "", endpoint_url: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("El backend 's3' requiere instalar boto3")
+        self.bucket = bucket
+        self.prefijo = prefijo
+        self.cliente = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def _clave(self, hash_hex: str) -> str:
+        return f"{self.prefijo}{hash_hex}"
+
+    def existe(self, hash_hex: str) -> bool:
+        try:
+            self.cliente.head_object(Bucket=self.bucket, Key=self._clave(hash_hex))
+            return True
+        except self.cliente.exceptions.ClientError:
+            return False
+
+    def abrir(self, hash_hex: str) -> BinaryIO:
+        try:
+            return self.cliente.get_object(Bucket=self.bucket, Key=self._clave(hash_hex))["Body"]
+        except self.cliente.exceptions.NoSuchKey:
+            raise BlobNoEncontrado(hash_hex)
+
+    def tamanno(self, hash_hex: str) -> int:
+        try:
+            return self.cliente.head_object(Bucket=self.bucket, Key=self._clave(hash_hex))["ContentLength"]
+        except self.cliente.exceptions.ClientError:
+            raise BlobNoEncontrado(hash_hex)
+
+    def eliminar(self, hash_hex: str) -> None:
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._clave(hash_hex))
+
+    def _publicar(self, hash_hex: str, ruta_temporal: str) -> None:
+        self.cliente.upload_file(ruta_temporal, self.bucket, self._clave(hash_hex))
+
+    def modificado(self, hash_hex: str) -> Optional[float]:
+        try:
+            respuesta = self.cliente.head_object(Bucket=self.bucket, Key=self._clave(hash_hex))
+        except self.cliente.exceptions.ClientError:
+            return None
+        return respuesta["LastModified"].timestamp()
+
+    # Cada bloque de una carga parcial es un objeto "cargas/<id>/<inicio>"
+    def _partes(self, id_carga: str) -> list[tuple[int, int, str]]:
+        prefijo = self._clave(f"cargas/{id_carga}/")
+        partes = []
+        for pagina in self.cliente.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefijo):
+            for obj in pagina.get("Contents", []):
+                partes.append((int(obj["Key"][len(prefijo):]), obj["Size"], obj["Key"]))
+        return sorted(partes)
+
+    @staticmethod
+    def _contiguo(partes: list[tuple[int, int, str]]) -> int:
+        recibido = 0
+        for inicio, tamanno, _ in partes:
+            if inicio != recibido:
+                break
+            recibido += tamanno
+        return recibido
+
+    def escribir_parcial(self, id_carga: str, inicio: int, data: bytes) -> int:
+        partes = self._partes(id_carga)
+        recibido = self._contiguo(partes)
+        # Solo se puede continuar o reenviar desde el inicio de un bloque ya recibido
+        if inicio > recibido or (inicio != recibido and inicio not in {p[0] for p in partes}):
+            raise DesplazamientoInvalido(recibido)
+        for inicio_parte, _, clave in partes:
+            if inicio_parte >= inicio:
+                self.cliente.delete_object(Bucket=self.bucket, Key=clave)
+        self.cliente.put_object(Bucket=self.bucket, Key=self._clave(f"cargas/{id_carga}/{inicio:012d}"), Body=data)
+        return inicio + len(data)
+
+    def tamanno_parcial(self, id_carga: str) -> int:
+        return self._contiguo(self._partes(id_carga))
+
+    def leer_parcial(self, id_carga: str) -> Iterator[bytes]:
+        recibido = 0
+        for inicio, tamanno, clave in self._partes(id_carga):
+            if inicio != recibido:
+                return
+            cuerpo = self.cliente.get_object(Bucket=self.bucket, Key=clave)["Body"]
+            with closing(cuerpo):
+                while True:
+                    bloque = cuerpo.read(TAMANNO_BLOQUE)
+                    if not bloque:
+                        break
+                    yield bloque
+            recibido += tamanno
+
+    def eliminar_parcial(self, id_carga: str) -> None:
+        for _, _, clave in self._partes(id_carga):
+            self.cliente.delete_object(Bucket=self.bucket, Key=clave)
+
+
+# -------------------------------------------------------------------
+# Registro de backends e instancia compartida
+# -------------------------------------------------------------------
+_BACKENDS: dict[str, Callable[[], AlmacenamientoBlobs]] = {
+    "local": lambda: AlmacenamientoLocal(BLOB_DIR),
+    "s3": lambda: AlmacenamientoS3(
+        config("BLOB_S3_BUCKET"),
+        prefijo=config("BLOB_S3_PREFIJO", default=""),
+        endpoint_url=config("BLOB_S3_ENDPOINT", default=""),
+    ),
+}
+
+_instancia: Optional[AlmacenamientoBlobs] = None
+_lock = threading.Lock()
+
+
+def registrar_backend(nombre: str, fabrica: Callable[[], AlmacenamientoBlobs]) -> None:
+    _BACKENDS[nombre] = fabrica
+
+
+def get_almacenamiento() -> AlmacenamientoBlobs:
+    global _instancia
+    if _instancia is None:
+        with _lock:
+            if _instancia is None:
+                if BLOB_BACKEND not in _BACKENDS:
+                    raise RuntimeError(f"Backend de blobs desconocido: {BLOB_BACKEND}")
+                _instancia = _BACKENDS[BLOB_BACKEND]()
+    return _instancia
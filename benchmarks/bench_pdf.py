@@ -0,0 +1,86 @@
+"""
+Tiempo de render por PDF de contrato (sin base de datos ni imágenes).
+
+Compara el render "en frío", vaciando en cada iteración las cachés de la
+plantilla (estilos y números en palabras), con el render normal de un
+proceso que ya generó contratos.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_pdf [--iteraciones 50]
+"""
+import argparse
+import io
+import statistics
+import time
+from datetime import date, datetime
+
+import plantilla_contrato
+
+
+def datos_contrato(n: int) -> dict:
+    """Contrato sintético; 'n' varía el monto y las cédulas entre iteraciones."""
+    return {
+        "id": n,
+        "contrato": {
+            "fecha_inicio": datetime(2024, 1, 5),
+            "fecha_maxima_pago_deposito": datetime(2024, 1, 10),
+            "monto_mensual_inicial": 250000 + (n % 5) * 10000,
+            "monto_deposito_inicial": 250000,
+            "dia_pago_mes": 5,
+            "agua_incluida": True,
+            "luz_incluida": False,
+            "internet_incluido": True,
+            "cable_incluido": False,
+            "cantidad_mascotas": 1,
+        },
+        "apartamento": {
+            "direccion_fisica": "San José, Calle 1", "num_piso": 2, "num_cuartos": 2, "num_bannos": 1,
+            "num_pilas": 1, "num_salas": 1, "num_cocina": 1, "num_comedor": 1, "color_interno": "blanco",
+            "color_externo": "gris", "num_ventanas": 4, "tiene_ducha": True, "num_220": 1, "num_closet": 2,
+            "num_mueble_cocina": 1, "tiene_parqueo": True,
+        },
+        "propietarios": [{"nombre": "Pedro Mora", "cedula": "101110111", "calidades": "casado, comerciante"}],
+        "finca_info": "SJ-123456-000",
+        "inquilinos": [
+            {"nombre": "Ana Solís", "cedula": f"1122406{n % 10}1"},
+            {"nombre": "Luis Vega", "cedula": "203330444"},
+        ],
+        "fotos": {},
+        "fecha": date.today(),
+    }
+
+
+def _vaciar_caches():
+    plantilla_contrato._estilos.cache_clear()
+    plantilla_contrato._num_to_words_es.cache_clear()
+    plantilla_contrato._money_to_words_upper.cache_clear()
+    plantilla_contrato._id_to_words_upper.cache_clear()
+
+
+def medir(iteraciones: int, frio: bool) -> list[float]:
+    tiempos = []
+    for n in range(iteraciones):
+        if frio:
+            _vaciar_caches()
+        datos = datos_contrato(n)
+        inicio = time.perf_counter()
+        plantilla_contrato.renderizar_pdf(datos, {}, io.BytesIO())
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _resumen(nombre: str, tiempos: list[float]) -> str:
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+    return (f"{nombre:<10} media {statistics.mean(tiempos):7.2f} ms  "
+            f"p50 {statistics.median(tiempos):7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de render por PDF de contrato")
+    parser.add_argument("--iteraciones", type=int, default=50)
+    args = parser.parse_args()
+
+    medir(3, frio=False)  # importaciones y fuentes de ReportLab fuera de la medición
+    print(_resumen("frío", medir(args.iteraciones, frio=True)))
+    print(_resumen("caliente", medir(args.iteraciones, frio=False)))
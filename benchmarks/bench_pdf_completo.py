@@ -0,0 +1,184 @@
+"""
+Costo de generar el PDF completo del contrato según la cantidad de inquilinos
+y la resolución de las fotos de cédula. Corre sin Supabase (ver entorno.py).
+
+Por escenario se crean un contrato, N inquilinos y una foto de cédula (frente
+y reverso) por inquilino, subidas por el mismo camino que la API
+(normalización y variantes). Luego se mide, en el proceso actual, cada fase de
+lo que hacen las rutas de PDF:
+
+  db       pdf_contrato.cargar_datos + fuentes_imagenes (SQLite: sin latencia de red)
+  img      preparar_imagenes con la variante "pdf" ya generada (caso normal)
+  img_orig preparar_imagenes desde los blobs originales (primer PDF tras subir la foto)
+  layout   renderizar_pdf (ReportLab)
+
+La memoria pico se mide con tracemalloc en una pasada aparte (para no alterar
+los tiempos). tracemalloc no ve los buffers de píxeles de Pillow, que se
+reservan fuera del asignador de Python; rss_max es el pico del proceso.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_pdf_completo [--inquilinos 1,2,4,6]
+        [--resoluciones baja,media,alta] [--iteraciones 3] [--json salida.json]
+"""
+import argparse
+import base64
+import io
+import json
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks import entorno
+
+RESOLUCIONES = {
+    "baja": (800, 500),
+    "media": (2000, 1250),
+    "alta": (4000, 2500),
+}
+PROPIETARIOS = [{"nombre": "Pedro Mora", "cedula": "101110111", "calidades": "casado, comerciante"}]
+
+
+def foto_sintetica(ancho: int, alto: int, semilla: int) -> bytes:
+    """JPEG con degradado, ruido y texto: se comprime como una foto real, no como un color plano."""
+    from PIL import Image, ImageChops, ImageDraw
+
+    degradado = Image.linear_gradient("L").resize((ancho, alto))
+    ruido = Image.effect_noise((ancho, alto), 25 + semilla % 10)
+    imagen = Image.merge("RGB", (degradado, ruido, ImageChops.invert(degradado)))
+    dibujo = ImageDraw.Draw(imagen)
+    for fila in range(0, alto, max(alto // 20, 10)):
+        dibujo.text((ancho // 10, fila), f"REPUBLICA DE COSTA RICA {semilla} CEDULA {fila}", fill=(20, 20, 20))
+    buf = io.BytesIO()
+    imagen.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def crear_escenario(db, n_inquilinos: int, resolucion: tuple[int, int], semilla: int) -> tuple[int, dict]:
+    """Crea contrato, inquilinos y fotos; devuelve (id del contrato, cuerpo de la petición)."""
+    import imagenes
+    import models
+    import servicio_fotos
+
+    apto = models.Apartamento(nombre=f"Apto {semilla}", num_piso=2, direccion_fisica="San José, Calle 1")
+    db.add(apto)
+    db.flush()
+    contrato = models.Contrato(
+        id_apartamento=apto.id, fecha_inicio=datetime(2024, 1, 5), monto_mensual_inicial=250000,
+        monto_deposito_inicial=250000, dia_pago_mes=5, cantidad_mascotas=1,
+    )
+    db.add(contrato)
+    inquilinos = []
+    for i in range(n_inquilinos):
+        cedula = f"{semilla:03d}{i:06d}"
+        db.add(models.Inquilino(cedula=cedula, nombre=f"Inquilino {i}"))
+        partes = [base64.b64encode(foto_sintetica(*resolucion, semilla + i + p)).decode() for p in (0, 1)]
+        foto = servicio_fotos.crear_foto(db, "cedula", *partes)
+        db.flush()
+        db.add(models.InquilinoFoto(cedula_inquilino=cedula, id_foto=foto.id, contexto="cedula"))
+        inquilinos.append({"nombre": f"Inquilino {i}", "cedula": cedula})
+        # Variantes en este proceso y de forma síncrona (sin depender del callback del pool)
+        for hash_hex in (foto.hash_parte1, foto.hash_parte2):
+            servicio_fotos.registrar_variantes(db, imagenes.generar_variantes(hash_hex))
+    db.commit()
+    return contrato.id, {"propietarios": PROPIETARIOS, "fincaInfo": "SJ-123456-000", "inquilinos": inquilinos}
+
+
+def _fases(id_contrato: int, cuerpo: dict) -> dict:
+    """Una generación completa; devuelve segundos por fase y el tamaño del PDF."""
+    import pdf_contrato
+    import plantilla_contrato
+    from database import SessionLocal
+
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        datos = pdf_contrato.cargar_datos(db, id_contrato, cuerpo)
+        fuentes = pdf_contrato.fuentes_imagenes(db, datos)
+    t_db = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as directorio, tempfile.TemporaryDirectory() as directorio_orig:
+        imagenes = plantilla_contrato.preparar_imagenes(fuentes, directorio)
+        t_img = time.perf_counter()
+
+        originales = {
+            clave: {"hash": origen, "variante": False}
+            for f in (f for lista in datos["fotos"].values() for f in lista)
+            for clave, origen in (((f["id"], 1), f["hashes"][0]), ((f["id"], 2), f["hashes"][1]))
+            if origen
+        }
+        t_orig_inicio = time.perf_counter()
+        plantilla_contrato.preparar_imagenes(originales, directorio_orig)
+        t_orig = time.perf_counter()
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as salida:
+            plantilla_contrato.renderizar_pdf(datos, imagenes, salida)
+            tamanno = salida.tell()
+        t_layout = time.perf_counter()
+    return {
+        "db": t_db - inicio,
+        "img": t_img - t_db,
+        "img_orig": t_orig - t_orig_inicio,
+        "layout": t_layout - t_orig,
+        "bytes": tamanno,
+    }
+
+
+def _memoria_pico(id_contrato: int, cuerpo: dict) -> int:
+    tracemalloc.start()
+    try:
+        _fases(id_contrato, cuerpo)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def medir(n_inquilinos: int, nombre_resolucion: str, iteraciones: int, semilla: int) -> dict:
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        id_contrato, cuerpo = crear_escenario(db, n_inquilinos, RESOLUCIONES[nombre_resolucion], semilla)
+    _fases(id_contrato, cuerpo)  # calentamiento: importaciones, fuentes, cachés de la plantilla
+    corridas = [_fases(id_contrato, cuerpo) for _ in range(iteraciones)]
+    resultado = {"inquilinos": n_inquilinos, "resolucion": nombre_resolucion}
+    for fase in ("db", "img", "img_orig", "layout"):
+        resultado[f"{fase}_ms"] = round(statistics.median(c[fase] for c in corridas) * 1000, 1)
+    resultado["total_ms"] = round(resultado["db_ms"] + resultado["img_ms"] + resultado["layout_ms"], 1)
+    resultado["pdf_kb"] = round(corridas[-1]["bytes"] / 1024, 1)
+    resultado["pico_mb"] = round(_memoria_pico(id_contrato, cuerpo) / (1024 * 1024), 2)
+    resultado["rss_max_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return resultado
+
+
+COLUMNAS = ("inquilinos", "resolucion", "db_ms", "img_ms", "img_orig_ms", "layout_ms", "total_ms",
+            "pdf_kb", "pico_mb", "rss_max_mb")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo, memoria y tamaño del PDF completo del contrato")
+    parser.add_argument("--inquilinos", default="1,2,4,6", help="lista separada por comas (1 a 6)")
+    parser.add_argument("--resoluciones", default="baja,media,alta", help=", ".join(RESOLUCIONES))
+    parser.add_argument("--iteraciones", type=int, default=3)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    entorno.preparar()
+    cantidades = [int(n) for n in args.inquilinos.split(",")]
+    if any(n < 1 or n > 6 for n in cantidades):
+        parser.error("--inquilinos admite valores de 1 a 6")
+    nombres = args.resoluciones.split(",")
+    if any(nombre not in RESOLUCIONES for nombre in nombres):
+        parser.error(f"--resoluciones admite: {', '.join(RESOLUCIONES)}")
+
+    resultados = []
+    print("  ".join(f"{c:>11}" for c in COLUMNAS))
+    for nombre in nombres:
+        for n in cantidades:
+            fila = medir(n, nombre, args.iteraciones, semilla=len(resultados) * 10 + 1)
+            resultados.append(fila)
+            print("  ".join(f"{fila[c]:>11}" for c in COLUMNAS), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
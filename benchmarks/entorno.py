@@ -0,0 +1,39 @@
+"""
+Entorno local para los benchmarks, sin Supabase: SQLite en memoria y blobs y
+caché de PDFs en directorios temporales que se borran al salir.
+
+preparar() debe llamarse antes de importar database, models o cualquier
+módulo que los importe.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+
+def _directorio_temporal(prefijo: str) -> str:
+    ruta = tempfile.mkdtemp(prefix=prefijo)
+    atexit.register(shutil.rmtree, ruta, ignore_errors=True)
+    return ruta
+
+
+def preparar() -> None:
+    # database.py exige las credenciales aunque el engine se reemplace; nunca se conecta
+    for variable in ("SUPABASE_URL", "SUPABASE_USER", "SUPABASE_PASSWORD", "SUPABASE_DATABASE"):
+        os.environ.setdefault(variable, "benchmark")
+    # Heredadas por los workers (spawn) de los pools de imágenes y PDFs
+    os.environ["BLOB_BACKEND"] = "local"
+    os.environ["BLOB_DIR"] = _directorio_temporal("bench-blobs-")
+    os.environ["PDF_CACHE_DIR"] = _directorio_temporal("bench-cache-pdf-")
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    import database
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.engine = engine
+    database.SessionLocal.configure(bind=engine)
+
+    import models  # noqa: F401  (registra las tablas)
+    database.Base.metadata.create_all(engine)
@@ -0,0 +1,145 @@
+"""
+Caché en disco de PDFs generados, direccionada por una clave de contenido.
+
+Cada entrada es un archivo <clave>.pdf. Un acierto actualiza su fecha de
+modificación; al superar PDF_CACHE_MAX_BYTES se borran primero los menos
+usados recientemente (LRU por tamaño total). Los PDFs se escriben en un
+<nombre>.tmp del mismo directorio y se publican con un rename; los .tmp
+abandonados se borran al desalojar.
+"""
+import os
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional
+
+from decouple import config
+
+PDF_CACHE_DIR = config("PDF_CACHE_DIR", default="cache_pdf")
+PDF_CACHE_MAX_BYTES = config("PDF_CACHE_MAX_BYTES", default=200 * 1024 * 1024, cast=int)
+# Un .tmp más viejo que esto es de un render que no terminó
+PDF_CACHE_TMP_MAX_S = config("PDF_CACHE_TMP_MAX_S", default=3600, cast=int)
+BLOQUE_PDF = 64 * 1024
+
+
+class CachePDF:
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = os.path.abspath(directorio)
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{os.path.basename(clave)}.pdf")
+
+    def abrir(self, clave: str) -> Optional[BinaryIO]:
+        """
+        Archivo abierto de la entrada (el llamador lo cierra). Aunque el LRU la
+        borre mientras se envía, el archivo abierto sigue siendo legible.
+        """
+        ruta = self.ruta(clave)
+        try:
+            archivo = open(ruta, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self.fallos += 1
+            return None
+        try:
+            os.utime(ruta)  # marca de uso reciente para el LRU
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.aciertos += 1
+        return archivo
+
+    def ruta_temporal(self) -> str:
+        """Archivo vacío en el directorio de la caché para escribir un PDF y luego publicarlo."""
+        fd, ruta = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        os.close(fd)
+        return ruta
+
+    def publicar(self, clave: str, ruta_temporal: str) -> None:
+        """Mueve un PDF ya escrito (ruta_temporal) a su entrada; atómico en el mismo disco."""
+        os.replace(ruta_temporal, self.ruta(clave))
+        self._desalojar()
+
+    def _entradas(self, extension: str = ".pdf") -> list[tuple[float, int, str]]:
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(extension):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, ruta))
+        return entradas
+
+    def _desalojar(self) -> None:
+        with self._lock:
+            # Temporales de renders que no terminaron (worker caído, proceso reiniciado)
+            limite = time.time() - PDF_CACHE_TMP_MAX_S
+            for modificado, _, ruta in self._entradas(".tmp"):
+                if modificado < limite:
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass
+            entradas = self._entradas()
+            total = sum(tamanno for _, tamanno, _ in entradas)
+            for _, tamanno, ruta in sorted(entradas):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                total -= tamanno
+
+    def limpiar(self) -> None:
+        with self._lock:
+            for _, _, ruta in self._entradas():
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+
+    def estadisticas(self) -> dict:
+        entradas = self._entradas()
+        with self._lock:
+            aciertos, fallos = self.aciertos, self.fallos
+        return {
+            "archivos": len(entradas),
+            "bytes": sum(tamanno for _, tamanno, _ in entradas),
+            "max_bytes": self.max_bytes,
+            "aciertos": aciertos,
+            "fallos": fallos,
+        }
+
+
+def iterar_y_cerrar(archivo: BinaryIO) -> Iterator[bytes]:
+    """Bloques de un archivo abierto (p. ej. de CachePDF.abrir) para una StreamingResponse."""
+    try:
+        while True:
+            bloque = archivo.read(BLOQUE_PDF)
+            if not bloque:
+                return
+            yield bloque
+    finally:
+        archivo.close()
+
+
+_instancia: Optional[CachePDF] = None
+_lock = threading.Lock()
+
+
+def get_cache_pdf() -> CachePDF:
+    global _instancia
+    if _instancia is None:
+        with _lock:
+            if _instancia is None:
+                _instancia = CachePDF(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+    return _instancia
@@ -0,0 +1,256 @@
+"""
+Hash y verificación de contraseñas fuera de los hilos de las peticiones.
+
+bcrypt tarda cientos de milisegundos por llamada a propósito. Ejecutado en el
+threadpool de las peticiones, una ráfaga de logins ocupa todos sus hilos y
+frena al resto de la API. Aquí se ejecuta en un pool propio de CLAVES_HILOS
+hilos (bcrypt libera el GIL) con un máximo de trabajos en vuelo
+(CLAVES_HILOS + CLAVES_COLA_MAX); por encima se rechaza con ColaClavesLlena
+(503 con Retry-After).
+
+Además limita los intentos por IP y los fallos por cuenta antes de llegar a
+bcrypt, para que el trabajo caro no lo decida quien ataca.
+
+La IP sale de X-Forwarded-For solo con LOGIN_IP_DESDE_PROXY, activado por
+defecto en Vercel (variable VERCEL), que reescribe esa cabecera con la IP
+real. Detrás de otro proxy hay que activarlo a mano; sin proxy debe quedar
+desactivado, o el cliente podría elegir su IP enviando la cabecera.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from decouple import config
+
+import security
+
+CLAVES_HILOS = config("CLAVES_HILOS", default=2, cast=int)
+CLAVES_COLA_MAX = config("CLAVES_COLA_MAX", default=16, cast=int)
+CLAVES_RETRY_AFTER = config("CLAVES_RETRY_AFTER", default=2, cast=int)  # segundos
+LOGIN_VENTANA_S = config("LOGIN_VENTANA_S", default=300, cast=int)
+LOGIN_MAX_POR_IP = config("LOGIN_MAX_POR_IP", default=30, cast=int)  # intentos por ventana
+LOGIN_MAX_FALLOS_CUENTA = config("LOGIN_MAX_FALLOS_CUENTA", default=5, cast=int)  # fallos por ventana
+# Detrás de un proxy (Vercel) la IP del cliente llega en X-Forwarded-For;
+# sin esto todas las peticiones comparten la IP del proxy y su límite
+LOGIN_IP_DESDE_PROXY = config(
+    "LOGIN_IP_DESDE_PROXY", default=os.environ.get("VERCEL") is not None, cast=bool
+)
+
+
+class ColaClavesLlena(Exception):
+    def __init__(self):
+        super().__init__("Hay demasiados inicios de sesión en curso, intente de nuevo en unos segundos")
+        self.retry_after = CLAVES_RETRY_AFTER
+
+
+class DemasiadosIntentos(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Demasiados intentos, intente de nuevo más tarde")
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------
+# Métricas (en memoria, por proceso web)
+# ---------------------------------------------------------
+_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(CLAVES_HILOS + CLAVES_COLA_MAX)
+_pool: Optional[ThreadPoolExecutor] = None
+
+_metricas = {
+    "en_vuelo": 0,
+    "max_en_vuelo": 0,
+    "hashes": 0,
+    "rechazados": 0,
+    "limitados": 0,
+    "logins_ok": 0,
+    "logins_fallidos": 0,
+    "rehash": 0,
+}
+_tiempos_espera: deque = deque(maxlen=200)
+_tiempos_hash: deque = deque(maxlen=200)
+_tiempos_login: deque = deque(maxlen=200)
+
+
+def _percentil(valores: list[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))], 3)
+
+
+def metricas() -> dict:
+    with _lock:
+        espera, hash_, login = list(_tiempos_espera), list(_tiempos_hash), list(_tiempos_login)
+        datos = dict(_metricas)
+    datos.update({
+        "hilos": CLAVES_HILOS,
+        "capacidad": CLAVES_HILOS + CLAVES_COLA_MAX,
+        "en_cola": max(datos["en_vuelo"] - CLAVES_HILOS, 0),
+        "bcrypt_rondas": security.BCRYPT_ROUNDS,
+        "espera_p50_s": _percentil(espera, 0.5),
+        "espera_p95_s": _percentil(espera, 0.95),
+        "hash_p50_s": _percentil(hash_, 0.5),
+        "hash_p95_s": _percentil(hash_, 0.95),
+        "login_p50_s": _percentil(login, 0.5),
+        "login_p95_s": _percentil(login, 0.95),
+        "login_max_s": round(max(login), 3) if login else None,
+    })
+    return datos
+
+
+def registrar_login(inicio: float, exito: bool, rehash: bool = False) -> None:
+    """Latencia completa de un login (consulta + hash + escritura), medida desde 'inicio'."""
+    with _lock:
+        _metricas["logins_ok" if exito else "logins_fallidos"] += 1
+        if rehash:
+            _metricas["rehash"] += 1
+        _tiempos_login.append(time.perf_counter() - inicio)
+
+
+# ---------------------------------------------------------
+# Límite de intentos (ventana deslizante, en memoria por proceso)
+# ---------------------------------------------------------
+class Limitador:
+    def __init__(self, maximo: int, ventana_s: float, max_claves: int = 10000):
+        self.maximo = maximo
+        self.ventana_s = ventana_s
+        self.max_claves = max_claves
+        self._intentos: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _vigentes(self, clave: str, ahora: float) -> Optional[deque]:
+        intentos = self._intentos.get(clave)
+        if intentos is None:
+            return None
+        while intentos and intentos[0] <= ahora - self.ventana_s:
+            intentos.popleft()
+        if not intentos:
+            del self._intentos[clave]
+            return None
+        return intentos
+
+    def espera(self, clave: str) -> int:
+        """Segundos hasta que la clave pueda intentar de nuevo (0 = permitido)."""
+        if self.maximo <= 0:
+            return 0
+        ahora = time.monotonic()
+        with self._lock:
+            intentos = self._vigentes(clave, ahora)
+            if intentos is None or len(intentos) < self.maximo:
+                return 0
+            return max(int(intentos[0] + self.ventana_s - ahora) + 1, 1)
+
+    def registrar(self, clave: str) -> None:
+        if self.maximo <= 0:
+            return
+        ahora = time.monotonic()
+        with self._lock:
+            if clave not in self._intentos and len(self._intentos) >= self.max_claves:
+                # Lleno: se descartan las claves cuya ventana ya pasó, y si no alcanza, la más antigua
+                for otra in list(self._intentos):
+                    self._vigentes(otra, ahora)
+                if len(self._intentos) >= self.max_claves:
+                    del self._intentos[next(iter(self._intentos))]
+            self._intentos.setdefault(clave, deque()).append(ahora)
+
+    def reiniciar(self, clave: str) -> None:
+        with self._lock:
+            self._intentos.pop(clave, None)
+
+
+limitador_ip = Limitador(LOGIN_MAX_POR_IP, LOGIN_VENTANA_S)
+limitador_cuenta = Limitador(LOGIN_MAX_FALLOS_CUENTA, LOGIN_VENTANA_S)
+
+
+def ip_cliente(request) -> str:
+    if LOGIN_IP_DESDE_PROXY:
+        reenviada = request.headers.get("x-forwarded-for")
+        if reenviada:
+            return reenviada.split(",")[0].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+def comprobar_intentos(ip: str, correo: Optional[str] = None) -> None:
+    """Lanza DemasiadosIntentos si la IP o la cuenta superaron su límite; si no, cuenta el intento de la IP."""
+    espera = limitador_ip.espera(ip)
+    if correo:
+        espera = max(espera, limitador_cuenta.espera(correo.lower()))
+    if espera:
+        with _lock:
+            _metricas["limitados"] += 1
+        raise DemasiadosIntentos(espera)
+    limitador_ip.registrar(ip)
+
+
+def registrar_fallo(correo: str) -> None:
+    limitador_cuenta.registrar(correo.lower())
+
+
+def registrar_exito(correo: str) -> None:
+    limitador_cuenta.reiniciar(correo.lower())
+
+
+# ---------------------------------------------------------
+# Pool de hash
+# ---------------------------------------------------------
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=CLAVES_HILOS, thread_name_prefix="claves")
+    return _pool
+
+
+def _medido(funcion: Callable, args: tuple, enviado: float):
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args)
+    finally:
+        fin = time.perf_counter()
+        with _lock:
+            _metricas["hashes"] += 1
+            _tiempos_espera.append(inicio - enviado)
+            _tiempos_hash.append(fin - inicio)
+
+
+def _enviar(funcion: Callable, *args):
+    if not _cupos.acquire(blocking=False):
+        with _lock:
+            _metricas["rechazados"] += 1
+        raise ColaClavesLlena()
+    with _lock:
+        _metricas["en_vuelo"] += 1
+        _metricas["max_en_vuelo"] = max(_metricas["max_en_vuelo"], _metricas["en_vuelo"])
+
+    def _liberar(_):
+        _cupos.release()
+        with _lock:
+            _metricas["en_vuelo"] -= 1
+
+    try:
+        futuro = get_pool().submit(_medido, funcion, args, time.perf_counter())
+    except Exception:
+        _liberar(None)
+        raise
+    futuro.add_done_callback(_liberar)
+    return futuro
+
+
+async def hashear(clave: str, salt: str) -> str:
+    """make_password_hash en el pool; la petición espera sin ocupar un hilo."""
+    return await asyncio.wrap_future(_enviar(security.make_password_hash, clave, salt))
+
+
+async def verificar(clave: str, salt: str, hash_guardado: str) -> tuple[bool, Optional[str]]:
+    """(válida, hash nuevo si el guardado usa parámetros anteriores o None)."""
+    return await asyncio.wrap_future(_enviar(security.verify_and_update_password, clave, salt, hash_guardado))
+
+
+def hashear_bloqueante(clave: str, salt: str) -> str:
+    """Para rutas síncronas: mismo pool y mismo límite, esperando en el hilo actual."""
+    return _enviar(security.make_password_hash, clave, salt).result()
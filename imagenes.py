@@ -0,0 +1,296 @@
+"""
+Procesamiento de imágenes en un pool de procesos.
+
+Las funciones que se ejecutan en los workers no tocan la base de datos: leen y
+escriben blobs en el almacenamiento y devuelven metadatos simples; quien las
+llama se encarga de registrarlos.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Union
+
+from decouple import config
+from PIL import Image as PILImage, ImageOps
+
+from almacenamiento import get_almacenamiento, TAMANNO_BLOQUE
+
+IMG_WORKERS = config("IMG_WORKERS", default=2, cast=int)
+IMG_CALIDAD_VARIANTES = config("IMG_CALIDAD_VARIANTES", default=82, cast=int)
+
+# Normalización al subir: orientación, sin metadatos, lado máximo y recodificación
+IMG_NORMALIZAR = config("IMG_NORMALIZAR", default=True, cast=bool)
+IMG_LADO_MAXIMO = config("IMG_LADO_MAXIMO", default=2048, cast=int)
+IMG_FORMATO = config("IMG_FORMATO", default="WEBP").upper()
+IMG_CALIDAD = config("IMG_CALIDAD", default=80, cast=int)
+
+# Lado mayor (px) de cada variante; "original" es el blob almacenado (ya normalizado)
+VARIANTES = {
+    "miniatura": 320,
+    "mediana": 1280,
+    "pdf": 900,  # fotos de cédula en el PDF del contrato (se insertan tal cual)
+}
+VARIANTE_ORIGINAL = "original"
+VARIANTE_PDF = "pdf"
+
+# ---------------------------------------------------------
+# Detección del tipo de contenido por firma (magic bytes)
+# ---------------------------------------------------------
+_FIRMAS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF", "application/pdf"),
+]
+
+
+class NoEsImagen(Exception):
+    """El blob no es una imagen legible: no tiene variantes."""
+
+
+class ImagenDemasiadoGrande(Exception):
+    """Más píxeles que PIL.Image.MAX_IMAGE_PIXELS: posible bomba de descompresión."""
+
+
+def es_imagen(tipo_contenido: Optional[str]) -> bool:
+    return bool(tipo_contenido) and tipo_contenido.startswith("image/")
+
+
+def detectar_tipo_contenido(cabecera: bytes) -> str:
+    for firma, tipo in _FIRMAS:
+        if cabecera.startswith(firma):
+            return tipo
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "image/webp"
+    if cabecera[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool compartido; 'spawn' evita heredar hilos y conexiones del proceso web."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=IMG_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _descartar_pool() -> None:
+    """Un worker que muere deja el pool inservible; el siguiente uso crea otro."""
+    global _pool
+    with _lock:
+        _pool = None
+
+
+def _abrir(origen: Union[bytes, str]) -> PILImage.Image:
+    try:
+        return PILImage.open(io.BytesIO(origen) if isinstance(origen, bytes) else origen)
+    except PILImage.DecompressionBombError as e:
+        # No hereda de OSError: sin esto llegaría como error 500
+        raise ImagenDemasiadoGrande(f"La imagen tiene demasiados píxeles para procesarla ({e})")
+
+
+def abrir_imagen(origen: Union[bytes, str], reducir_a: Optional[int] = None) -> PILImage.Image:
+    """
+    Decodifica con la orientación EXIF aplicada. Con 'reducir_a' un JPEG se
+    decodifica ya reducido (1/2, 1/4 o 1/8) sin bajar de ese lado.
+    """
+    imagen = _abrir(origen)
+    if reducir_a:
+        imagen.draft("RGB", (reducir_a, reducir_a))
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode not in ("RGB", "L"):
+        imagen = imagen.convert("RGB")
+    return imagen
+
+
+def codificar_jpeg(imagen: PILImage.Image, calidad: int) -> bytes:
+    buf = io.BytesIO()
+    imagen.save(buf, format="JPEG", quality=calidad, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def memoria_decodificada(origen: Union[bytes, str], reducir_a: Optional[int] = None) -> int:
+    """Bytes que ocupará la imagen al decodificarla con abrir_imagen; solo lee la cabecera."""
+    with _abrir(origen) as imagen:
+        if reducir_a:
+            imagen.draft("RGB", (reducir_a, reducir_a))
+        return imagen.width * imagen.height * len(imagen.getbands())
+
+
+def jpeg_variante(origen: Union[bytes, str], variante: str) -> bytes:
+    """Variante en JPEG calculada sin guardarla (contenido que aún no está en el almacenamiento)."""
+    lado = VARIANTES[variante]
+    imagen = abrir_imagen(origen, reducir_a=lado)
+    imagen.thumbnail((lado, lado))
+    return codificar_jpeg(imagen, IMG_CALIDAD_VARIANTES)
+
+
+# ---------------------------------------------------------
+# Trabajo de los workers
+# ---------------------------------------------------------
+def generar_variantes(hash_origen: str) -> dict:
+    """
+    Genera las variantes (miniatura, mediana, pdf) de un blob. Devuelve los metadatos del origen y
+    de cada variante para que el proceso web los registre.
+    """
+    almacenamiento = get_almacenamiento()
+    if not es_imagen(detectar_tipo_contenido(b"".join(almacenamiento.leer_bloques(hash_origen, 0, 15)))):
+        raise NoEsImagen(f"El blob {hash_origen} no es una imagen")
+    data = almacenamiento.leer(hash_origen)
+    try:
+        imagen = abrir_imagen(data)
+    except PILImage.UnidentifiedImageError:
+        raise NoEsImagen(f"El blob {hash_origen} no es una imagen legible")
+    resultado = {
+        "hash_origen": hash_origen,
+        "tamanno_origen": len(data),
+        "tipo_origen": PILImage.MIME.get(_abrir(data).format, "application/octet-stream"),
+        "ancho": imagen.width,
+        "alto": imagen.height,
+        "variantes": [],
+    }
+    for nombre, lado in VARIANTES.items():
+        copia = imagen.copy()
+        copia.thumbnail((lado, lado))
+        contenido = codificar_jpeg(copia, IMG_CALIDAD_VARIANTES)
+        hash_hex, tamanno = almacenamiento.guardar_bytes(contenido)
+        resultado["variantes"].append({
+            "variante": nombre,
+            "hash": hash_hex,
+            "tamanno": tamanno,
+            "ancho": copia.width,
+            "alto": copia.height,
+        })
+    return resultado
+
+
+def _enviar(funcion, *args) -> Future:
+    """submit() falla con BrokenProcessPool si un worker murió antes: se reintenta en un pool nuevo."""
+    try:
+        return get_pool().submit(funcion, *args)
+    except BrokenProcessPool:
+        _descartar_pool()
+        return get_pool().submit(funcion, *args)
+
+
+def enviar_variantes(hash_origen: str) -> Future:
+    return _enviar(generar_variantes, hash_origen)
+
+
+# ---------------------------------------------------------
+# Normalización al ingresar (origen: bytes o ruta de un archivo temporal)
+# ---------------------------------------------------------
+def _bloques_archivo(ruta: str):
+    with open(ruta, "rb") as f:
+        while True:
+            bloque = f.read(TAMANNO_BLOQUE)
+            if not bloque:
+                return
+            yield bloque
+
+
+def guardar_sin_cambios(origen: Union[bytes, str]) -> dict:
+    """Guarda el contenido tal como llegó (no es imagen o la normalización está desactivada)."""
+    almacenamiento = get_almacenamiento()
+    if isinstance(origen, bytes):
+        cabecera = origen[:16]
+        hash_hex, tamanno = almacenamiento.guardar_bytes(origen)
+    else:
+        with open(origen, "rb") as f:
+            cabecera = f.read(16)
+        hash_hex, tamanno = almacenamiento.guardar_stream(_bloques_archivo(origen))
+    return {
+        "hash": hash_hex,
+        "tamanno": tamanno,
+        "tamanno_original": tamanno,
+        "tipo_contenido": detectar_tipo_contenido(cabecera),
+    }
+
+
+def normalizar(origen: Union[bytes, str]) -> dict:
+    """
+    Aplica la orientación EXIF, descarta los metadatos (se conserva solo el
+    perfil de color), limita el lado mayor y recodifica en IMG_FORMATO.
+    Si el contenido no es una imagen legible (p. ej. un PDF) se guarda sin cambios;
+    si supera MAX_IMAGE_PIXELS se rechaza con ImagenDemasiadoGrande.
+    """
+    tamanno_original = len(origen) if isinstance(origen, bytes) else os.path.getsize(origen)
+    try:
+        imagen = _abrir(origen)
+        imagen.load()
+    except PILImage.DecompressionBombError as e:
+        raise ImagenDemasiadoGrande(f"La imagen tiene demasiados píxeles para procesarla ({e})")
+    except (PILImage.UnidentifiedImageError, OSError):
+        return guardar_sin_cambios(origen)
+
+    perfil_color = imagen.info.get("icc_profile")
+    imagen = ImageOps.exif_transpose(imagen)
+    if max(imagen.size) > IMG_LADO_MAXIMO:
+        imagen.thumbnail((IMG_LADO_MAXIMO, IMG_LADO_MAXIMO), PILImage.LANCZOS)
+
+    transparente = imagen.mode in ("RGBA", "LA") or "transparency" in imagen.info
+    if IMG_FORMATO == "JPEG" or not transparente:
+        if transparente:
+            fondo = PILImage.new("RGB", imagen.size, (255, 255, 255))
+            fondo.paste(imagen.convert("RGBA"), mask=imagen.convert("RGBA").getchannel("A"))
+            imagen = fondo
+        elif imagen.mode not in ("RGB", "L"):
+            imagen = imagen.convert("RGB")
+    elif imagen.mode != "RGBA":
+        imagen = imagen.convert("RGBA")
+
+    opciones = {"quality": IMG_CALIDAD}
+    if perfil_color:
+        opciones["icc_profile"] = perfil_color
+    if IMG_FORMATO == "JPEG":
+        opciones.update(optimize=True, progressive=True)
+    elif IMG_FORMATO == "WEBP":
+        opciones["method"] = 4
+    buf = io.BytesIO()
+    imagen.save(buf, format=IMG_FORMATO, **opciones)
+
+    hash_hex, tamanno = get_almacenamiento().guardar_bytes(buf.getvalue())
+    return {
+        "hash": hash_hex,
+        "tamanno": tamanno,
+        "tamanno_original": tamanno_original,
+        "tipo_contenido": PILImage.MIME.get(IMG_FORMATO, "application/octet-stream"),
+    }
+
+
+def procesar_ingesta(*origenes: Union[bytes, str]) -> list[dict]:
+    """
+    Normaliza varios contenidos en paralelo en el pool y espera los resultados
+    (en el mismo orden). Con IMG_NORMALIZAR desactivado se guardan sin cambios.
+    """
+    if not IMG_NORMALIZAR:
+        return [guardar_sin_cambios(o) for o in origenes]
+    try:
+        futuros = [_enviar(normalizar, o) for o in origenes]
+    except (OSError, ImportError, NotImplementedError) as e:
+        # Plataforma sin soporte de procesos (sin sem_open, límites del contenedor...)
+        print("⚠️ Pool de imágenes no disponible, se normaliza en el proceso web:", e)
+        return [normalizar(o) for o in origenes]
+    resultados = []
+    for origen, futuro in zip(origenes, futuros):
+        try:
+            resultados.append(futuro.result())
+        except BrokenProcessPool as e:
+            print("⚠️ Pool de imágenes caído, se normaliza en el proceso web:", e)
+            _descartar_pool()
+            resultados.append(normalizar(origen))
+    return resultados
@@ -0,0 +1,250 @@
+"""
+Importación masiva de apartamentos, inquilinos, contratos y vínculos
+contrato-inquilino (alta de un edificio completo).
+
+Cada lote se valida entero antes de escribir: esquema de cada fila, duplicados
+dentro del lote y referencias a la base de datos con una consulta por
+conjunto. Luego todas las filas válidas se insertan en una sola transacción,
+con COPY en PostgreSQL y con un INSERT por lote en otros motores.
+"""
+import csv
+import io
+import json
+import time
+from typing import Any, Callable, Optional
+
+from decouple import config
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text, tuple_
+
+from database import SessionLocal
+import models
+import reportes
+import schemas
+
+IMPORTACION_MAX_FILAS = config("IMPORTACION_MAX_FILAS", default=5000, cast=int)
+
+
+class ImportacionInvalida(Exception):
+    """El lote no se puede leer (formato, columnas o tamaño): no se valida fila por fila."""
+
+
+# ---------------------------------------------------------
+# Lectura de JSON / CSV
+# ---------------------------------------------------------
+def leer_filas(contenido: bytes, tipo_contenido: str, campos: list[str]) -> list[dict]:
+    """
+    Filas del cuerpo: un arreglo JSON de objetos o un CSV con encabezado. En el
+    CSV las celdas vacías son nulas y no se aceptan columnas desconocidas.
+    """
+    if "csv" in (tipo_contenido or ""):
+        try:
+            lector = csv.DictReader(io.StringIO(contenido.decode("utf-8-sig")))
+            desconocidas = [c for c in (lector.fieldnames or []) if c not in campos]
+            if desconocidas:
+                raise ImportacionInvalida(f"Columnas desconocidas: {', '.join(desconocidas)}")
+            filas = [{k: (v if v != "" else None) for k, v in fila.items()} for fila in lector]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportacionInvalida(f"CSV inválido: {e}")
+    else:
+        try:
+            filas = json.loads(contenido or b"null")
+        except ValueError as e:
+            raise ImportacionInvalida(f"JSON inválido: {e}")
+        if not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+            raise ImportacionInvalida("Se esperaba un arreglo JSON de objetos")
+
+    if not filas:
+        raise ImportacionInvalida("El lote está vacío")
+    if len(filas) > IMPORTACION_MAX_FILAS:
+        raise ImportacionInvalida(f"Máximo {IMPORTACION_MAX_FILAS} filas por lote")
+    return filas
+
+
+# ---------------------------------------------------------
+# Validación
+# ---------------------------------------------------------
+def _errores_pydantic(e: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(p) for p in error['loc'])}: {error['msg']}" for error in e.errors()]
+
+
+def _validar_esquema(filas: list[dict], esquema) -> tuple[list[Optional[dict]], dict[int, list[str]]]:
+    """Valida cada fila con el esquema del POST individual; los campos ausentes se toman como nulos."""
+    campos = list(esquema.__fields__)
+    validas: list[Optional[dict]] = []
+    errores: dict[int, list[str]] = {}
+    for i, fila in enumerate(filas):
+        try:
+            validas.append(esquema(**{campo: fila.get(campo) for campo in campos}).dict())
+        except ValidationError as e:
+            validas.append(None)
+            errores[i] = _errores_pydantic(e)
+    return validas, errores
+
+
+def _marcar_duplicados(validas: list[Optional[dict]], clave: Callable[[dict], Any], mensaje: str,
+                       errores: dict[int, list[str]]) -> None:
+    vistas: dict[Any, int] = {}
+    for i, fila in enumerate(validas):
+        if fila is None:
+            continue
+        k = clave(fila)
+        if k in vistas:
+            errores.setdefault(i, []).append(f"{mensaje} (igual a la fila {vistas[k] + 1})")
+        else:
+            vistas[k] = i
+
+
+def _marcar_referencias(db, validas: list[Optional[dict]], campo: str, columna, mensaje: str,
+                        errores: dict[int, list[str]], debe_existir: bool = True) -> None:
+    """Una consulta para todos los valores de 'campo'; marca las filas cuya referencia falta (o sobra)."""
+    valores = {fila[campo] for fila in validas if fila is not None and fila[campo] is not None}
+    existentes = set(db.scalars(select(columna).where(columna.in_(valores)))) if valores else set()
+    for i, fila in enumerate(validas):
+        if fila is None or fila[campo] is None:
+            continue
+        if (fila[campo] in existentes) != debe_existir:
+            errores.setdefault(i, []).append(f"{mensaje}: {fila[campo]}")
+
+
+def _validar_inquilinos(db, validas, errores) -> None:
+    _marcar_duplicados(validas, lambda f: f["cedula"], "Cédula repetida en el lote", errores)
+    _marcar_referencias(db, validas, "cedula", models.Inquilino.cedula,
+                        "Ya existe un inquilino con esa cédula", errores, debe_existir=False)
+
+
+def _validar_contratos(db, validas, errores) -> None:
+    _marcar_referencias(db, validas, "id_apartamento", models.Apartamento.id, "Apartamento no encontrado", errores)
+
+
+def _validar_contratos_inquilinos(db, validas, errores) -> None:
+    par = lambda f: (f["id_contrato"], f["cedula_inquilino"])
+    _marcar_duplicados(validas, par, "Vínculo repetido en el lote", errores)
+    _marcar_referencias(db, validas, "id_contrato", models.Contrato.id, "Contrato no encontrado", errores)
+    _marcar_referencias(db, validas, "cedula_inquilino", models.Inquilino.cedula, "Inquilino no encontrado", errores)
+    pares = {par(f) for f in validas if f is not None}
+    tabla = models.ContratoInquilino
+    existentes = set(
+        db.execute(
+            select(tabla.id_contrato, tabla.cedula_inquilino)
+            .where(tuple_(tabla.id_contrato, tabla.cedula_inquilino).in_(pares))
+        ).tuples()
+    ) if pares else set()
+    for i, fila in enumerate(validas):
+        if fila is not None and par(fila) in existentes:
+            errores.setdefault(i, []).append("El inquilino ya está vinculado a ese contrato")
+
+
+# ---------------------------------------------------------
+# Inserción
+# ---------------------------------------------------------
+def _con_valores_por_defecto(modelo, filas: list[dict]) -> list[dict]:
+    """Aplica los valores por defecto de Python (p. ej. fecha_formalizacion) a los campos nulos."""
+    por_defecto = {
+        c.name: c.default.arg for c in modelo.__table__.columns
+        if c.default is not None and c.default.is_callable and c.name in filas[0]
+    }
+    if not por_defecto:
+        return filas
+    for fila in filas:
+        for campo, funcion in por_defecto.items():
+            if fila[campo] is None:
+                fila[campo] = funcion(None)
+    return filas
+
+
+def _copy(db, tabla: str, columnas: list[str], filas: list[dict]) -> None:
+    cursor = db.connection().connection.cursor()
+    try:
+        with cursor.copy(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN") as copia:
+            for fila in filas:
+                copia.write_row(tuple(fila[c] for c in columnas))
+    finally:
+        cursor.close()
+
+
+def _insertar(db, modelo, filas: list[dict], con_id: bool) -> list:
+    """
+    Inserta las filas en la sesión 'db' (sin confirmar). Con con_id devuelve los
+    id generados en el orden de las filas; en PostgreSQL se reservan antes a la
+    secuencia para poder usar COPY.
+    """
+    tabla = modelo.__table__
+    columnas = list(filas[0])
+    if db.get_bind().dialect.name == "postgresql":
+        if con_id:
+            ids = db.scalars(
+                text("SELECT nextval(pg_get_serial_sequence(:tabla, 'id')) FROM generate_series(1, :n)"),
+                {"tabla": tabla.name, "n": len(filas)},
+            ).all()
+            for fila, id_ in zip(filas, ids):
+                fila["id"] = id_
+            columnas = ["id"] + columnas
+        _copy(db, tabla.name, columnas, filas)
+        return [fila["id"] for fila in filas] if con_id else []
+
+    if con_id:
+        return list(db.scalars(insert(modelo).returning(modelo.id, sort_by_parameter_order=True), filas))
+    db.execute(insert(modelo), filas)
+    return []
+
+
+# ---------------------------------------------------------
+# Importación completa
+# ---------------------------------------------------------
+ENTIDADES = {
+    # nombre: (esquema, modelo, validación contra la base de datos, genera id, clave de las filas sin id)
+    "apartamentos": (schemas.ApartamentoCreate, models.Apartamento, None, True, None),
+    "inquilinos": (schemas.InquilinoCreate, models.Inquilino, _validar_inquilinos, False,
+                   lambda f: f["cedula"]),
+    "contratos": (schemas.ContratoCreate, models.Contrato, _validar_contratos, True, None),
+    "contratos-inquilinos": (schemas.ContratoInquilinoCreate, models.ContratoInquilino,
+                             _validar_contratos_inquilinos, False,
+                             lambda f: f"{f['id_contrato']}:{f['cedula_inquilino']}"),
+}
+
+
+def campos(entidad: str) -> list[str]:
+    return list(ENTIDADES[entidad][0].__fields__)
+
+
+def importar(entidad: str, filas: list[dict], parcial: bool = False) -> dict:
+    """
+    Valida e inserta un lote. Si alguna fila tiene errores no se inserta nada,
+    salvo con parcial=True, que inserta las válidas. 'filas' en los errores es
+    el número de fila de datos (1 = primera fila después del encabezado).
+    """
+    esquema, modelo, validar, con_id, clave = ENTIDADES[entidad]
+    inicio = time.perf_counter()
+
+    validas, errores = _validar_esquema(filas, esquema)
+    with SessionLocal() as db:
+        if validar is not None:
+            validar(db, validas, errores)
+        fin_validacion = time.perf_counter()
+
+        a_insertar = [fila for i, fila in enumerate(validas) if fila is not None and i not in errores]
+        ids: list = []
+        if a_insertar and (parcial or not errores):
+            _con_valores_por_defecto(modelo, a_insertar)
+            ids = _insertar(db, modelo, a_insertar, con_id)
+            if clave is not None:
+                ids = [clave(fila) for fila in a_insertar]
+            db.commit()
+            reportes.invalidar()
+        else:
+            a_insertar = []
+        fin = time.perf_counter()
+
+    return {
+        "entidad": entidad,
+        "filas": len(filas),
+        "insertadas": len(a_insertar),
+        "ids": ids,
+        "errores": [{"fila": i + 1, "errores": mensajes} for i, mensajes in sorted(errores.items())],
+        "tiempos_ms": {
+            "validacion": round((fin_validacion - inicio) * 1000, 1),
+            "insercion": round((fin - fin_validacion) * 1000, 1),
+            "total": round((fin - inicio) * 1000, 1),
+        },
+    }
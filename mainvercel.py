@@ -3,12 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import Base, engine
 import models
+from migraciones import aplicar_esquema
 
 # ---------------------------------------------------------
 # APSCHEDULER (NO funciona en Vercel, pero NO se elimina)
 # ---------------------------------------------------------
 from apscheduler.schedulers.background import BackgroundScheduler
 from tareas_recurrentes import generar_pagos_pendientes
+from recolector_fotos import recolectar_fotos
 
 # Detectar si estamos en Vercel (serverless)
 EN_VERCEL = os.environ.get("VERCEL") is not None
@@ -16,6 +18,7 @@ EN_VERCEL = os.environ.get("VERCEL") is not None
 if not EN_VERCEL:
     scheduler = BackgroundScheduler()
     scheduler.add_job(generar_pagos_pendientes, 'cron', hour=12, minute=24)
+    scheduler.add_job(recolectar_fotos, 'cron', hour=3, minute=30)
     scheduler.start()
 else:
     print("⛔ APScheduler desactivado (Vercel no permite tareas en segundo plano).")
@@ -33,7 +36,7 @@ from routes import (
 )
 
 # nuevos
-from routes import usuarios, auth
+from routes import usuarios, auth, importacion, reportes
 
 # ---------------------------------------------------------
 # Inicialización de la aplicación FastAPI
@@ -69,6 +72,7 @@ app.add_middleware(
 try:
     print("Creando tablas en Supabase (si no existen)...")
     Base.metadata.create_all(bind=engine)
+    aplicar_esquema()
 except Exception as e:
     print("⚠️ Error creando tablas:", e)
 
@@ -85,6 +89,8 @@ app.include_router(fotos.router)
 # nuevos
 app.include_router(usuarios.router)
 app.include_router(auth.router)
+app.include_router(importacion.router)
+app.include_router(reportes.router)
 from routes import tareas
 app.include_router(tareas.router)
 # ---------------------------------------------------------
@@ -0,0 +1,194 @@
+"""
+Migraciones manuales del esquema (create_all no agrega columnas a tablas existentes).
+
+Uso:
+    python migraciones.py esquema
+    python migraciones.py fotos --lote 50
+    python migraciones.py normalizar --lote 10
+"""
+import argparse
+import time
+
+from sqlalchemy import text, or_, exists, select, update, union
+from sqlalchemy.orm import undefer_group
+
+from database import SessionLocal, engine, Base
+import models
+import imagenes
+import resumen_pagos
+import servicio_fotos
+from almacenamiento import get_almacenamiento, BlobNoEncontrado
+
+# ---------------------------------------------------------
+# Cambios de esquema idempotentes (PostgreSQL)
+# ---------------------------------------------------------
+ESQUEMA = [
+    "ALTER TABLE fotos ADD COLUMN IF NOT EXISTS hash_parte1 VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE fotos ADD COLUMN IF NOT EXISTS hash_parte2 VARCHAR(64) REFERENCES blobs(hash)",
+    "ALTER TABLE fotos ADD COLUMN IF NOT EXISTS tamanno_parte1 INTEGER",
+    "ALTER TABLE fotos ADD COLUMN IF NOT EXISTS tamanno_parte2 INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_fotos_hash_parte1 ON fotos (hash_parte1)",
+    "CREATE INDEX IF NOT EXISTS ix_fotos_hash_parte2 ON fotos (hash_parte2)",
+    "ALTER TABLE blobs ADD COLUMN IF NOT EXISTS tamanno_original INTEGER",
+    # Las fotos existentes toman la fecha de la migración: su periodo de gracia empieza ahí
+    "ALTER TABLE fotos ADD COLUMN IF NOT EXISTS creado_en TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc')",
+    "CREATE INDEX IF NOT EXISTS ix_fotos_creado_en ON fotos (creado_en)",
+    "ALTER TABLE usuario ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_pagos_mensuales_contrato_anno_mes ON pagos_mensuales (contrato_id, anno, mes)",
+]
+
+
+def aplicar_esquema():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for sentencia in ESQUEMA:
+                conn.execute(text(sentencia))
+    # Tabla de resumen recién creada: se llena con los pagos existentes
+    resumen_pagos.reconstruir(solo_si_vacio=True)
+
+
+# ---------------------------------------------------------
+# Base64 heredado -> almacenamiento de blobs
+# ---------------------------------------------------------
+def migrar_fotos(lote: int = 50):
+    """
+    Recorre las fotos con contenido en las columnas base64 por lotes (paginación
+    por id), guarda cada parte en el almacenamiento y deja solo el hash.
+    Cada lote se confirma por separado: se puede interrumpir y reanudar.
+    """
+    ultimo_id = 0
+    migradas = fallidas = bytes_base64 = bytes_blobs = 0
+    inicio = time.perf_counter()
+
+    while True:
+        with SessionLocal() as db:
+            fotos = (
+                db.query(models.Foto)
+                .options(undefer_group("legado"))
+                .filter(models.Foto.id > ultimo_id)
+                .filter(or_(models.Foto.base64_parte1.isnot(None), models.Foto.base64_parte2.isnot(None)))
+                .order_by(models.Foto.id)
+                .limit(lote)
+                .all()
+            )
+            if not fotos:
+                break
+
+            for foto in fotos:
+                ultimo_id = foto.id
+                try:
+                    partes = servicio_fotos.decodificar_partes(foto.base64_parte1, foto.base64_parte2)
+                except ValueError:
+                    fallidas += 1
+                    print(f"⚠️ Foto {foto.id}: base64 inválido, se conserva sin migrar")
+                    continue
+
+                bytes_base64 += len(foto.base64_parte1 or "") + len(foto.base64_parte2 or "")
+                for parte, data in zip(servicio_fotos.PARTES, partes):
+                    if data:
+                        hash_hex, tamanno = servicio_fotos.guardar_contenido(db, data)
+                        servicio_fotos.asignar_parte(foto, parte, hash_hex, tamanno)
+                        bytes_blobs += tamanno
+                    else:
+                        servicio_fotos.asignar_parte(foto, parte, None, None)
+                foto.base64_parte1 = None
+                foto.base64_parte2 = None
+                migradas += 1
+
+            db.commit()
+            print(f"Lote hasta foto {ultimo_id}: {migradas} migradas, {fallidas} con error")
+
+    print(
+        f"✅ Migración terminada en {time.perf_counter() - inicio:.1f}s: {migradas} fotos, "
+        f"{bytes_base64} bytes base64 -> {bytes_blobs} bytes en blobs (antes de deduplicar)"
+    )
+
+
+# ---------------------------------------------------------
+# Normalización de blobs guardados antes de normalizar al subir
+# ---------------------------------------------------------
+def normalizar_existentes(lote: int = 10):
+    """
+    Recodifica por lotes los blobs de imagen que usan las fotos y aún no tienen
+    tamaño original registrado, y apunta las fotos al blob nuevo. El blob viejo
+    queda sin referencias. Cada lote se confirma por separado.
+    """
+    usados = union(select(models.Foto.hash_parte1), select(models.Foto.hash_parte2))
+    ultimo = ""
+    procesados = bytes_antes = bytes_despues = 0
+    inicio = time.perf_counter()
+
+    while True:
+        with SessionLocal() as db:
+            blobs = (
+                db.query(models.Blob)
+                .filter(models.Blob.hash > ultimo)
+                .filter(models.Blob.tamanno_original.is_(None))
+                .filter(models.Blob.tipo_contenido.like("image/%"))
+                .filter(models.Blob.hash.in_(usados))
+                .filter(~exists().where(models.BlobVariante.hash == models.Blob.hash))
+                .order_by(models.Blob.hash)
+                .limit(lote)
+                .all()
+            )
+            if not blobs:
+                break
+            ultimo = blobs[-1].hash
+
+            contenidos = []
+            for blob in blobs:
+                try:
+                    contenidos.append(get_almacenamiento().leer(blob.hash))
+                except BlobNoEncontrado:
+                    print(f"⚠️ Blob {blob.hash} no está en el almacenamiento")
+                    contenidos.append(None)
+
+            pendientes = [(b, c) for b, c in zip(blobs, contenidos) if c is not None]
+            resultados = imagenes.procesar_ingesta(*[c for _, c in pendientes])
+            nuevos = []
+            for (blob, _), r in zip(pendientes, resultados):
+                if r["hash"] == blob.hash or r["tamanno"] >= blob.tamanno:
+                    # Recodificar no ayuda: se conserva el original y se marca como procesado
+                    if r["hash"] != blob.hash and db.get(models.Blob, r["hash"]) is None:
+                        get_almacenamiento().eliminar(r["hash"])
+                    blob.tamanno_original = blob.tamanno
+                    continue
+                servicio_fotos.registrar_blob(db, r["hash"], r["tamanno"], r["tipo_contenido"], blob.tamanno)
+                for parte in servicio_fotos.PARTES:
+                    columna = getattr(models.Foto, f"hash_parte{parte}")
+                    db.execute(
+                        update(models.Foto)
+                        .where(columna == blob.hash)
+                        .values({columna: r["hash"], f"tamanno_parte{parte}": r["tamanno"]})
+                    )
+                nuevos.append(r["hash"])
+                procesados += 1
+                bytes_antes += blob.tamanno
+                bytes_despues += r["tamanno"]
+
+            db.commit()
+            servicio_fotos.programar_variantes(*nuevos)
+            print(f"Lote hasta blob {ultimo[:12]}…: {procesados} normalizados")
+
+    print(
+        f"✅ Normalización terminada en {time.perf_counter() - inicio:.1f}s: {procesados} blobs, "
+        f"{bytes_antes} -> {bytes_despues} bytes ({bytes_antes - bytes_despues} ahorrados)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones del sistema de alquileres")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("esquema", help="Crea tablas nuevas y agrega columnas faltantes")
+    p_fotos = sub.add_parser("fotos", help="Mueve el base64 heredado al almacenamiento de blobs")
+    p_fotos.add_argument("--lote", type=int, default=50)
+    p_norm = sub.add_parser("normalizar", help="Recodifica las imágenes guardadas antes de normalizar al subir")
+    p_norm.add_argument("--lote", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    aplicar_esquema()
+    if args.comando == "fotos":
+        migrar_fotos(lote=args.lote)
+    elif args.comando == "normalizar":
+        normalizar_existentes(lote=args.lote)
@@ -1,7 +1,7 @@
 from sqlalchemy import (
-    Column, Integer, String, Numeric, Boolean, ForeignKey, DateTime, Text, Enum
+    Column, Integer, String, Numeric, Boolean, ForeignKey, DateTime, Text, Enum, Index
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred, column_property
 from datetime import datetime
 import enum
 from database import Base
@@ -22,13 +22,42 @@ class TipoPagoEnum(enum.Enum):
 # MODELOS BASE
 # ---------------------------------------------------------
 
+class Blob(Base):
+    """Contenido binario guardado una sola vez en el almacenamiento, identificado por su SHA-256."""
+    __tablename__ = "blobs"
+
+    hash = Column(String(64), primary_key=True)
+    tamanno = Column(Integer, nullable=False)
+    tamanno_original = Column(Integer, nullable=True)  # bytes recibidos antes de normalizar
+    tipo_contenido = Column(String(100), nullable=True)
+    creado_en = Column(DateTime, default=datetime.utcnow)
+
+
+class BlobVariante(Base):
+    """Versión redimensionada (miniatura, mediana, ...) de un blob de imagen."""
+    __tablename__ = "blob_variantes"
+
+    hash_origen = Column(String(64), ForeignKey("blobs.hash", ondelete="CASCADE"), primary_key=True)
+    variante = Column(String(20), primary_key=True)
+    hash = Column(String(64), ForeignKey("blobs.hash"), nullable=False)
+    ancho = Column(Integer)
+    alto = Column(Integer)
+
+
 class Foto(Base):
     __tablename__ = "fotos"
 
     id = Column(Integer, primary_key=True, index=True)
-    base64_parte1 = Column(Text, nullable=True)
-    base64_parte2 = Column(Text, nullable=True)
+    # Columnas heredadas: solo conservan datos que aún no se migran al almacenamiento de blobs.
+    # Diferidas: ninguna consulta (ni relación) las trae salvo que se pidan explícitamente.
+    base64_parte1 = deferred(Column(Text, nullable=True), group="legado")
+    base64_parte2 = deferred(Column(Text, nullable=True), group="legado")
     contexto = Column(String(400), nullable=True)
+    hash_parte1 = Column(String(64), ForeignKey("blobs.hash"), nullable=True, index=True)
+    hash_parte2 = Column(String(64), ForeignKey("blobs.hash"), nullable=True, index=True)
+    tamanno_parte1 = Column(Integer, nullable=True)
+    tamanno_parte2 = Column(Integer, nullable=True)
+    creado_en = Column(DateTime, default=datetime.utcnow, index=True)  # periodo de gracia del recolector
 
     apartamento_fotos = relationship("ApartamentoFoto", back_populates="foto")
     contrato_fotos = relationship("ContratoFoto", back_populates="foto")
@@ -37,6 +66,22 @@ class Foto(Base):
     devoluciones = relationship("DevolucionDeposito", back_populates="foto")
 
 
+class CargaFoto(Base):
+    """Subida reanudable en curso; los bloques recibidos viven en el almacenamiento de blobs."""
+    __tablename__ = "cargas_foto"
+
+    id = Column(String(32), primary_key=True)
+    tamanno_total = Column(Integer, nullable=False)
+    hash_esperado = Column(String(64), nullable=True)  # SHA-256 que declara el cliente
+    creado_en = Column(DateTime, default=datetime.utcnow)
+    actualizado_en = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Indican si hay contenido heredado sin cargar las columnas base64
+Foto.legado_parte1 = column_property(Foto.__table__.c.base64_parte1.isnot(None))
+Foto.legado_parte2 = column_property(Foto.__table__.c.base64_parte2.isnot(None))
+
+
 class Apartamento(Base):
     __tablename__ = "apartamento"
 
@@ -181,6 +226,8 @@ class MontoActual(Base):
 
 class PagoMensual(Base):
     __tablename__ = "pagos_mensuales"
+    # Recalcular el resumen de un contrato y mes lee solo sus filas
+    __table_args__ = (Index("ix_pagos_mensuales_contrato_anno_mes", "contrato_id", "anno", "mes"),)
 
     id = Column(Integer, primary_key=True, index=True)
     fecha_pago = Column(DateTime, default=datetime.utcnow)
@@ -202,6 +249,26 @@ class PagoMensual(Base):
     fotos = relationship("PagoFoto", back_populates="pago")
 
 
+class ResumenPagoMensual(Base):
+    """
+    Totales de pagos_mensuales por contrato, tipo y mes (ver resumen_pagos.py).
+    Los cargos son las filas sin monto pagado; los pagos, las que tienen monto pagado.
+    """
+    __tablename__ = "resumen_pagos_mensual"
+
+    contrato_id = Column(Integer, ForeignKey("contrato.id", ondelete="CASCADE"), primary_key=True)
+    tipo = Column(Enum(TipoPagoEnum), primary_key=True)
+    anno = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    esperado = Column(Numeric(12, 3), nullable=False, default=0)    # monto esperado de los cargos
+    cobrado = Column(Numeric(12, 3), nullable=False, default=0)     # monto pagado
+    pendiente = Column(Numeric(12, 3), nullable=False, default=0)   # saldo de los cargos sin completar
+    cargos_pendientes = Column(Integer, nullable=False, default=0)
+    vence_pendiente = Column(DateTime, nullable=True)  # vencimiento más próximo de esos cargos
+    pagos = Column(Integer, nullable=False, default=0)
+    actualizado_en = Column(DateTime, default=datetime.utcnow)
+
+
 class PagoFoto(Base):
     __tablename__ = "pagos_fotos"
 
@@ -255,4 +322,18 @@ class Usuario(Base):
     celular = Column(String(50), nullable=True)
     rol = Column(Enum(RolEnum), nullable=False, default=RolEnum.usuario)
     activo = Column(Boolean, nullable=False, default=True)
+    # Se incrementa al desactivar, cambiar rol o clave: invalida los tokens emitidos antes
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    creado_en = Column(DateTime, default=datetime.utcnow)
+
+
+class RefreshToken(Base):
+    """Token de renovación emitido en un login; el JWT lleva su 'jti'."""
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    usuario_id = Column(Integer, ForeignKey("usuario.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_version = Column(Integer, nullable=False)
     creado_en = Column(DateTime, default=datetime.utcnow)
+    expira_en = Column(DateTime, nullable=False, index=True)
+    revocado_en = Column(DateTime, nullable=True)
@@ -0,0 +1,116 @@
+"""
+Datos del PDF del contrato de arrendamiento.
+
+El PDF se genera en fases para poder cachearlo y armarlo fuera del proceso web:
+  1. cargar_datos: lee de la base de datos todo lo que el PDF necesita (tipos simples).
+  2. clave_cache: hash del contenido que determina el PDF.
+  3. fuentes_imagenes: de dónde leer cada foto de cédula.
+  4. plantilla_contrato.generar_pdf: arma el documento en el pool de procesos.
+"""
+import hashlib
+import json
+from datetime import date
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import imagenes
+import models
+import servicio_fotos
+from plantilla_contrato import VERSION_PLANTILLA
+
+
+def _fila(obj) -> Optional[dict]:
+    if obj is None:
+        return None
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+# ---------------------------------------------------------
+# Fase 1: datos
+# ---------------------------------------------------------
+def cargar_datos(db: Session, id_contrato: int, cuerpo: dict) -> Optional[dict]:
+    """
+    Contrato, apartamento, datos del cuerpo de la petición y versiones de las
+    fotos de cédula de cada inquilino. None si el contrato no existe.
+    """
+    contrato = db.query(models.Contrato).filter(models.Contrato.id == id_contrato).first()
+    if not contrato:
+        return None
+    apto = None
+    if contrato.id_apartamento:
+        apto = db.query(models.Apartamento).filter(models.Apartamento.id == contrato.id_apartamento).first()
+
+    inquilinos = cuerpo.get("inquilinos", []) or []
+    cedulas = {i.get("cedula") for i in inquilinos if i.get("cedula")}
+    fotos = {ced: [] for ced in cedulas}
+    if cedulas:
+        filas = (
+            db.query(models.InquilinoFoto.cedula_inquilino, models.Foto)
+            .join(models.Foto, models.Foto.id == models.InquilinoFoto.id_foto)
+            .filter(models.InquilinoFoto.cedula_inquilino.in_(cedulas))
+            .order_by(models.Foto.id)
+            .all()
+        )
+        # Las fotos no se editan: id + hash identifican la versión del contenido
+        for ced, f in filas:
+            fotos[ced].append(
+                {"id": f.id, "hashes": [f.hash_parte1, f.hash_parte2], "legado": [f.legado_parte1, f.legado_parte2]}
+            )
+
+    return {
+        "id": id_contrato,
+        "contrato": _fila(contrato),
+        "apartamento": _fila(apto),
+        "propietarios": cuerpo.get("propietarios", []) or [],
+        "finca_info": cuerpo.get("fincaInfo", "") or "",
+        "inquilinos": inquilinos,
+        "fotos": fotos,
+        "fecha": date.today(),  # el cierre del contrato lleva la fecha en palabras
+    }
+
+
+def clave_cache(datos: dict) -> str:
+    """SHA-256 de todo lo que determina el PDF, incluida la versión de la plantilla."""
+    contenido = json.dumps({"version": VERSION_PLANTILLA, **datos}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------
+# Fase 2: fuentes de las imágenes de las cédulas
+# ---------------------------------------------------------
+def fuentes_imagenes(db: Session, datos: dict) -> dict:
+    """
+    {(id_foto, parte): {"hash": ..., "variante": bool}} para las partes en el
+    almacenamiento (el worker las lee directamente) o {"datos": bytes} para el
+    base64 heredado. Con "variante" el hash es el JPEG ya preparado para el PDF;
+    las que aún no lo tienen se encolan para la próxima vez.
+    """
+    fotos = {f["id"]: f for lista in datos["fotos"].values() for f in lista}
+    hashes = {h for f in fotos.values() for h in f["hashes"] if h}
+    variantes = {}
+    if hashes:
+        variantes = dict(
+            db.query(models.BlobVariante.hash_origen, models.BlobVariante.hash)
+            .filter(models.BlobVariante.hash_origen.in_(hashes),
+                    models.BlobVariante.variante == imagenes.VARIANTE_PDF)
+            .all()
+        )
+    ids_legado = [f["id"] for f in fotos.values() if any(f["legado"])]
+    legado = {}
+    if ids_legado:
+        legado = {f.id: f for f in db.query(models.Foto).filter(models.Foto.id.in_(ids_legado)).all()}
+
+    fuentes = {}
+    for f in fotos.values():
+        for parte, hash_hex, es_legado in zip(servicio_fotos.PARTES, f["hashes"], f["legado"]):
+            if hash_hex in variantes:
+                fuentes[(f["id"], parte)] = {"hash": variantes[hash_hex], "variante": True}
+            elif hash_hex:
+                fuentes[(f["id"], parte)] = {"hash": hash_hex, "variante": False}
+            elif es_legado and f["id"] in legado:
+                data = servicio_fotos.leer_parte(legado[f["id"]], parte)
+                if data:
+                    fuentes[(f["id"], parte)] = {"datos": data}
+    servicio_fotos.programar_variantes(*(hashes - variantes.keys()))
+    return fuentes
@@ -0,0 +1,484 @@
+"""
+Plantilla del contrato de arrendamiento (ReportLab).
+
+Este módulo no toca la base de datos: se ejecuta en el pool de procesos de
+procesos_pdf con los datos ya cargados por pdf_contrato.
+"""
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from string import Formatter
+from decimal import Decimal
+from datetime import datetime
+from typing import BinaryIO, Optional
+
+from decouple import config
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
+
+from imagenes import VARIANTE_PDF, VARIANTES, jpeg_variante, memoria_decodificada
+from almacenamiento import get_almacenamiento
+
+# Subir al cambiar el texto o el diseño del contrato: invalida los PDFs en caché
+VERSION_PLANTILLA = 2
+
+# Los PDFs se envían como binario: sin ASCII85 las imágenes JPEG van sin el ~25 % extra
+rl_config.useA85 = 0
+
+# Memoria máxima por documento (imágenes decodificadas + JPEG insertados + PDF final)
+PDF_MEMORIA_MAX_MB = config("PDF_MEMORIA_MAX_MB", default=256, cast=int)
+MB = 1024 * 1024
+
+
+class PDFExcedeMemoria(Exception):
+    def __init__(self, estimado: Optional[int], limite: int):
+        super().__init__(estimado, limite)  # args completos: se envía entre procesos con pickle
+        self.estimado = estimado
+        self.limite = limite
+
+    def __str__(self) -> str:
+        if self.estimado is None:
+            return f"El PDF superó la memoria disponible ({self.limite // MB} MB)"
+        return f"El PDF necesitaría unos {self.estimado // MB} MB y el máximo por documento es {self.limite // MB} MB"
+
+# --- utilidades locales (sin setlocale) ---
+SPANISH_MONTHS = {
+    1: "enero", 2: "febrero", 3: "marzo", 4: "abril", 5: "mayo", 6: "junio",
+    7: "julio", 8: "agosto", 9: "septiembre", 10: "octubre", 11: "noviembre", 12: "diciembre"
+}
+
+try:
+    from num2words import num2words
+except Exception:
+    num2words = None
+
+
+@lru_cache(maxsize=4096)
+def _num_to_words_es(n: int) -> str:
+    """Convierte un entero a palabras en español. Intenta usar num2words si está disponible."""
+    try:
+        return num2words(n, lang="es")
+    except Exception:
+        # fallback simple si num2words no está instalada
+        return str(n)
+
+@lru_cache(maxsize=1024)
+def _money_to_words_upper(amount: Decimal | float | int) -> str:
+    """Devuelve '₡1.234.000 (<b>UN MILLÓN DOSCIENTOS TREINTA Y CUATRO MIL COLONES</b>)'."""
+    amount = Decimal(str(amount or 0)).quantize(Decimal("1."))  # sin decimales
+    num = f"₡{int(amount):,}".replace(",", ".")
+    palabras = _num_to_words_es(int(amount)).upper()
+    return f"{num} (<b>{palabras} COLONES</b>)"
+
+@lru_cache(maxsize=1024)
+def _id_to_words_upper(idnum: str) -> str:
+    """Convierte una cédula como '112240621' a 'UNO UNO DOS DOS CUATRO CERO SEIS DOS UNO' en mayúsculas y negrita."""
+    try:
+        # Mantiene solo los dígitos
+        digits = [c for c in str(idnum) if c.isdigit()]
+        if not digits:
+            return f"{idnum} (<b>{idnum}</b>)"
+        # Mapa de números a palabras
+        mapa = {
+            "0": "CERO", "1": "UNO", "2": "DOS", "3": "TRES", "4": "CUATRO",
+            "5": "CINCO", "6": "SEIS", "7": "SIETE", "8": "OCHO", "9": "NUEVE"
+        }
+        # Construir texto uno a uno
+        texto = " ".join([mapa[d] for d in digits])
+        return f"{idnum} (<b>{texto}</b>)"
+    except Exception:
+        return f"{idnum} (<b>{idnum}</b>)"
+
+
+def _date_with_words_upper(dt: datetime | None) -> str:
+    if not dt:
+        return "___ (<b>___</b>)"
+    dia = dt.day
+    mes = SPANISH_MONTHS.get(dt.month, "")
+    anio = dt.year
+    fecha_str = f"{dia:02d}/{dt.month:02d}/{anio}"
+    dia_w = _num_to_words_es(dia).upper()
+    mes_w = mes.upper()
+    anio_w = _num_to_words_es(anio).upper()
+    return f"{fecha_str} (<b>{dia_w} DE {mes_w} DE {anio_w}</b>)"
+
+def _bold_upper(s: str) -> str:
+    return f"<b>{(s or '').upper()}</b>"
+
+
+# ---------------------------------------------------------
+# Imágenes de las cédulas
+# ---------------------------------------------------------
+def _verificar_memoria(estimado: int, limite: int) -> None:
+    if estimado > limite:
+        raise PDFExcedeMemoria(estimado, limite)
+
+
+def preparar_imagenes(fuentes: dict, directorio: str, limite: int = PDF_MEMORIA_MAX_MB * MB) -> dict:
+    """
+    fuentes: {(id_foto, parte): {"hash": ..., "variante": bool} o {"datos": bytes}}.
+    Escribe cada imagen lista para el PDF como JPEG en 'directorio' y devuelve
+    {(id_foto, parte): ruta}; ReportLab las abre al dibujarlas. Con "variante"
+    el blob se copia tal cual; el resto se decodifica de a una (reducida desde
+    el decodificador JPEG) y se libera. Las ilegibles se omiten.
+
+    Los JPEG quedan en memoria dentro del documento hasta escribirlo y el PDF
+    final se arma entero antes de guardarse: si con la imagen siguiente se
+    superaría 'limite', se lanza PDFExcedeMemoria antes de decodificarla.
+    """
+    almacenamiento = get_almacenamiento()
+    lado = VARIANTES[VARIANTE_PDF]
+    rutas = {}
+    por_origen = {}  # el mismo contenido (p. ej. frente y reverso iguales) se inserta una vez
+    insertado = 0
+    for n, (clave, fuente) in enumerate(fuentes.items()):
+        origen_hash = fuente.get("hash")
+        if origen_hash in por_origen:
+            rutas[clave] = por_origen[origen_hash]
+            continue
+        ruta = os.path.join(directorio, f"{n}.jpg")
+        try:
+            if fuente.get("variante"):
+                with almacenamiento.abrir(fuente["hash"]) as origen, open(ruta, "wb") as destino:
+                    shutil.copyfileobj(origen, destino)
+            else:
+                origen = fuente.get("datos")
+                if origen is None:
+                    origen = os.path.join(directorio, f"{n}.origen")
+                    with almacenamiento.abrir(fuente["hash"]) as blob, open(origen, "wb") as destino:
+                        shutil.copyfileobj(blob, destino)
+                _verificar_memoria(2 * insertado + memoria_decodificada(origen, lado), limite)
+                jpeg = jpeg_variante(origen, VARIANTE_PDF)
+                if isinstance(origen, str):
+                    os.remove(origen)
+                with open(ruta, "wb") as destino:
+                    destino.write(jpeg)
+                del jpeg
+        except PDFExcedeMemoria:
+            raise
+        except Exception:
+            continue
+        insertado += os.path.getsize(ruta)
+        _verificar_memoria(2 * insertado, limite)
+        rutas[clave] = ruta
+        if origen_hash:
+            por_origen[origen_hash] = ruta
+    return rutas
+
+
+# ---------------------------------------------------------
+# Texto del contrato
+# ---------------------------------------------------------
+class _Plantilla:
+    """Texto con campos {nombre}; se analiza una sola vez y por solicitud solo se rellenan los campos."""
+    __slots__ = ("partes",)
+
+    def __init__(self, texto: str):
+        self.partes = tuple((literal, campo) for literal, campo, _, _ in Formatter().parse(texto))
+
+    def rellenar(self, valores: dict) -> str:
+        return "".join(
+            literal if campo is None else f"{literal}{valores[campo]}"
+            for literal, campo in self.partes
+        )
+
+
+_INTRO = _Plantilla("""
+    Nosotros/as: {texto_propietarios}, dueños de la finca {finca_info}, en adelante conocidos como EL PROPIETARIO,
+    y {texto_inquilinos}, en carácter de arrendatario(s), hemos convenido en celebrar el presente CONTRATO DE ARRENDAMIENTO,
+    del inmueble sito en {direccion_fisica}, el cual se regirá por la Ley General No. 7527 de Arrendamientos Urbanos y Suburbanos
+    y por las siguientes cláusulas:
+    """)
+
+_CLAUSULAS = tuple(_Plantilla(texto) for texto in (
+    # 1) Inmueble, piso y ambientes — con TODAS las características del esquema del apartamento
+    "<b>PRIMERA:</b> El propietario da en arriendo al arrendatario la vivienda ubicada en el apartamento correspondiente, "
+    "en el <b>piso {num_piso}</b>, compuesta por <b>{num_cuartos}</b> dormitorio(s), <b>{num_bannos}</b> baño(s), "
+    "sala(s): <b>{num_salas}</b>, comedor(es): <b>{num_comedor}</b>, cocina(s): <b>{num_cocina}</b>, pilas: <b>{num_pilas}</b>, "
+    "clóset(s): <b>{num_closet}</b>, mueble(s) de cocina: <b>{num_mueble_cocina}</b>, <b>{num_ventanas}</b> ventana(s), "
+    "instalación eléctrica 220V: <b>{num_220}</b>, ducha: <b>{tiene_ducha_apto}</b>, color interno <b>{color_interno}</b> y color externo <b>{color_externo}</b>. "
+    "El inmueble se entrega en buen estado.",
+
+    # 2) Precio, día de pago y depósito (monto y fecha en texto y número)
+    "<b>SEGUNDA:</b> El precio del alquiler es de {monto_mensual_fmt}, pagadero por adelantado a más tardar el día "
+    "<b>{dia_pago_mes}</b> (<b>{dia_pago_mes_words}</b>) de cada mes. El depósito de garantía es de {deposito_fmt}, cuya "
+    "fecha máxima para pagar el <b>depósito</b> es {fecha_max_deposito}.",
+
+    # 2.b) Período de gracia y multa
+    "<b>TERCERA:</b> En casos excepcionales y de carácter urgente, se concede un período de gracia de cuatro (4) días; "
+    "a partir del quinto día se aplicará una multa de <b>₡1.000</b> diarios.",
+
+    # 3) Plazo y aumento anual por inflación
+    "<b>CUARTA:</b> El plazo del contrato es de un (1) año a partir del {fecha_inicio}. Si el arrendatario no desea renovar, deberá "
+    "avisar por escrito con un mes de anticipación. A partir del segundo año de arrendamiento se aplicará un aumento anual correspondiente "
+    "al porcentaje de inflación, según lo dispone la Ley N.º 7527, sobre el precio inmediato anterior.",
+
+    # 4) Mejoras y propiedad de mejoras
+    "<b>QUINTA:</b> El arrendatario no podrá realizar mejoras sin autorización expresa del propietario. Si no obstante las realizara, "
+    "aún útiles o de lujo, pasarán al vencimiento del plazo o terminación del contrato a formar parte del inmueble arrendado, "
+    "sin obligación de pago o indemnización por parte del propietario.",
+
+    # 5) Conservación y responsabilidad por daños
+    " <b>SEXTA:</b> El arrendatario se compromete a mantener el inmueble en buen estado de conservación y a devolverlo en similares condiciones. "
+    "Será responsable por cualquier deterioro, daño o desmejora atribuido a su culpa o negligencia, quedando obligado a indemnizar al propietario, "
+    "salvo el normal desgaste por uso racional, el transcurso del tiempo o fuerzas imprevisibles de la naturaleza.",
+
+    # 6) Servicios básicos: agua y luz (incluidos o no) + suspensión a 3 días
+    "<b>SÉPTIMA:</b> {servicios_txt}"
+    " El propietario enviará, días antes del pago, el detalle de consumo: m³ de agua y kWh de electricidad. "
+    "Los montos dependen de tarifas oficiales y pueden variar conforme leyes y reglamentos. "
+    "Si el arrendatario no paga estos servicios, a partir del <b>tercer</b> día de atraso los mismos podrán ser suspendidos.",
+
+    # 7) Internet y cable compartidos (si aplican)
+    "<b>OCTAVA:</b> {texto_internet}",
+
+    # 8) Sanitarios y fregaderos (mantenimiento/grasas)
+    "<b>NOVENA:</b> El arrendatario deberá conservar y dar mantenimiento, por su cuenta, a servicios sanitarios y fregaderos, "
+    "manteniéndolos limpios y libres de materiales que puedan obstruirlos. Deberá evitar que grasas u otras sustancias caigan al desagüe, "
+    "pues podrían obstruir tuberías y afectar apartamentos adyacentes.",
+
+    # 9) Destino y cesión
+    "<b>DÉCIMA:</b> El inmueble se destina exclusivamente a casa de habitación. El arrendatario no podrá, bajo ningún concepto, "
+    "variar el destino del arriendo ni traspasar la ocupación o uso a terceros, total o parcialmente.",
+
+    # 10) Responsabilidad general / accidentes / catastróficos
+    "<b>DÉCIMA PRIMERA:</b> El propietario no asume responsabilidad por accidentes de cualquier naturaleza dentro de la propiedad, "
+    "ni por daños a propiedad privada, ni por eventos catastróficos o de fuerza mayor.",
+
+    # 11) Cobro vía ejecutiva
+    "<b>DÉCIMA SEGUNDA:</b> Las sumas de plazo vencido adeudadas por alquileres o cualquier otro concepto podrán cobrarse por la vía ejecutiva, "
+    "sin necesidad de requerimiento previo.",
+
+    # 12) Incumplimientos y desahucio
+    "<b>DÉCIMA TERCERA:</b> El incumplimiento de cualquier obligación faculta a la otra parte para dar por vencido el contrato anticipadamente. "
+    "El propietario podrá promover la acción de desahucio cuando corresponda.",
+
+    # 13) Tolerancia ≠ modificación
+    "<b>DÉCIMA CUARTA:</b> Cualquier concesión eventual del propietario se interpretará como mera tolerancia y no modificará las condiciones pactadas. "
+    "Podrá exigirse el cumplimiento estricto en cualquier momento, sin que ello impida acciones legales.",
+
+    # 14) Conocimiento de la Ley
+    "<b>DÉCIMA QUINTA:</b> Ambas partes declaran conocer la Ley General de Arrendamientos Urbanos y Suburbanos N.º 7527.",
+
+    # 15) Inspecciones
+    "<b>DÉCIMA SEXTA:</b> El propietario podrá realizar inspecciones periódicas del inmueble con aviso razonable.",
+
+    # 16) No fumar / drogas / buenas costumbres
+    "<b>DÉCIMA SÉPTIMA:</b> Queda prohibido fumar, consumir drogas o realizar actividades contrarias a la ley o a las buenas costumbres dentro de la propiedad.",
+
+    # 17) Ruido y horario de silencio
+    "<b>DÉCIMA OCTAVA:</b> Horario de silencio para descanso: de <b>10:00 p.m.</b> a <b>9:00 a.m.</b>, incluidos fines de semana. "
+    "Se prohíben ruidos, fiestas o sonidos que perturben a terceros.",
+
+    # 18) Parqueo
+    "<b>DÉCIMA NOVENA:</b> {texto_parqueo} El propietario no se hace responsable por daños, pérdidas o robos de bienes dentro del área de parqueo.",
+
+    # 19) Mascotas
+    "<b>VIGÉSIMA:</b> {texto_mascota}",
+
+    # 20) Personas que habitarán
+    "<b>VIGÉSIMA PRIMERA:</b> La vivienda será habitada por <b>{cant_personas}</b> persona(s) (según las personas asociadas al contrato).",
+
+    # 21) Depósito: devolución y requisitos (incluye 1 año mínimo)
+    "<b>VIGÉSIMA SEGUNDA:</b> Para la devolución del depósito se requiere: "
+    "haber residido al menos <b>un (1) año</b> en el inmueble, estar al día con alquileres y servicios, "
+    "devolver llaves, y que el inmueble, inventario y mobiliario se encuentren en buen estado (salvo desgaste normal). "
+    "Los daños o faltantes podrán deducirse del depósito.",
+
+    # 22) Notificaciones
+    "<b>VIGÉSIMA TERCERA:</b> Para notificaciones se señalan las direcciones y correos reportados por las partes en este contrato.",
+
+    # 23) Estimación del contrato (monto anual, en número y texto)
+    "<b>VIGÉSIMA CUARTA:</b> Se estima el presente contrato en la suma equivalente a un año de alquiler: {monto_estimado_anual_fmt}. "
+    "Las partes quedan facultadas para comparecer ante Notario Público a poner <b>Fecha Cierta</b> a este documento.",
+))
+
+_CIERRE = _Plantilla("En fe de lo anterior, firmamos de conformidad en San José, a los {dia} días del mes de {mes} del {anio}.")
+
+# Cláusula SÉPTIMA según (agua_incluida, luz_incluida)
+_SERVICIOS = {
+    (True, True): ("El contrato incluye el pago de agua y electricidad. "
+                   "El arrendatario deberá hacer uso responsable y eficiente de dichos servicios."),
+    (True, False): "El contrato incluye el pago de agua. La electricidad se cobra por aparte según consumo en kWh registrado y la tarifa oficial del CNFL.",
+    (False, True): "El contrato incluye la electricidad. El agua se cobra por aparte según consumo en m³ registrado y las tarifas de AyA.",
+    (False, False): ("El contrato <b>no</b> incluye agua ni electricidad; ambos se cobran por aparte según consumos "
+                     "medidos (m³ para agua y kWh para electricidad) y a la tarifa oficial vigente (AyA y CNFL)."),
+}
+
+_CAMPOS_APARTAMENTO = (
+    "direccion_fisica", "num_piso", "num_cuartos", "num_bannos", "num_pilas", "num_salas", "num_cocina",
+    "num_comedor", "color_interno", "color_externo", "num_ventanas", "num_220", "num_closet", "num_mueble_cocina",
+)
+
+
+@lru_cache(maxsize=1)
+def _estilos() -> tuple[ParagraphStyle, ParagraphStyle]:
+    """(texto, título); se construyen una vez por proceso."""
+    styles = getSampleStyleSheet()
+    estilo_texto = ParagraphStyle("justificado", parent=styles["Normal"], alignment=TA_JUSTIFY, fontSize=11, leading=17)
+    estilo_titulo = ParagraphStyle("titulo", parent=styles["Heading1"], alignment=TA_CENTER, fontSize=14, spaceAfter=10)
+    return estilo_texto, estilo_titulo
+
+
+def _valores(datos: dict) -> dict:
+    """Campos variables de la plantilla a partir de los datos del contrato."""
+    contrato = datos["contrato"]
+    apto = datos["apartamento"]
+    inquilinos = datos["inquilinos"]
+
+    # -------- Datos del contrato (con defaults seguros) --------
+    monto_mensual = contrato.get("monto_mensual_inicial", 0) or 0
+    dia_pago_mes = contrato.get("dia_pago_mes", None) or "___"
+    valores = {
+        "fecha_inicio": _date_with_words_upper(contrato.get("fecha_inicio", None)),
+        "fecha_max_deposito": _date_with_words_upper(contrato.get("fecha_maxima_pago_deposito", None)),
+        "monto_mensual_fmt": _money_to_words_upper(monto_mensual),
+        "deposito_fmt": _money_to_words_upper(contrato.get("monto_deposito_inicial", 0) or 0),
+        "monto_estimado_anual_fmt": _money_to_words_upper((Decimal(str(monto_mensual)) * 12)),
+        "dia_pago_mes": dia_pago_mes,
+        "dia_pago_mes_words": _num_to_words_es(int(dia_pago_mes)).upper() if str(dia_pago_mes).isdigit() else "___",
+    }
+
+    # -------- Características del apartamento (de su esquema) --------
+    for campo in _CAMPOS_APARTAMENTO:
+        valores[campo] = apto.get(campo, "___") if apto else "___"
+    if apto:
+        valores["tiene_ducha_apto"] = "sí" if apto.get("tiene_ducha", False) else "no"
+    else:
+        valores["tiene_ducha_apto"] = "___"
+
+    # -------- Parqueo (si está en contrato o en el apto) --------
+    tiene_parqueo = (
+        contrato.get("tiene_parqueo", None)
+        if contrato.get("tiene_parqueo", None) is not None
+        else apto.get("tiene_parqueo", False) if apto else False
+    )
+    valores["texto_parqueo"] = "El contrato incluye 1 espacio de parqueo asignado." if tiene_parqueo else "El contrato se arrienda sin parqueo asignado."
+
+    # -------- servicios incluidos --------
+    valores["servicios_txt"] = _SERVICIOS[(bool(contrato.get("agua_incluida", False)), bool(contrato.get("luz_incluida", False)))]
+    partes = []
+    if contrato.get("internet_incluido", False):
+        partes.append("Internet")
+    if contrato.get("cable_incluido", False):
+        partes.append("televisión por cable")
+    if partes:
+        valores["texto_internet"] = (
+            f"Se incluye {' y '.join(partes)} de carácter compartido para todos los apartamentos. "
+            "Dado su uso comunitario, puede experimentar intermitencias o caídas ajenas al control del propietario; "
+            "no está pensado para fines profesionales de alta demanda."
+        )
+    else:
+        valores["texto_internet"] = "El contrato no incluye servicios de Internet ni televisión por cable."
+
+    # -------- mascotas --------
+    cant_mascotas = contrato.get("cantidad_mascotas", 0) or 0
+    valores["texto_mascota"] = (
+        f"Se autoriza la tenencia de {cant_mascotas} mascota(s). El arrendatario se compromete a evitar daños, olores, ruidos y a recoger desechos; responderá por todo daño ocasionado."
+        if cant_mascotas > 0 else
+        "El inmueble se arrienda sin mascotas."
+    )
+
+    # personas que habitarán = len(inquilinos)
+    valores["cant_personas"] = len(inquilinos)
+
+    # Texto de propietarios e inquilinos con cédula en número y texto en MAYÚSCULA/NEGRITA
+    valores["texto_propietarios"] = "; ".join(
+        [f"{_bold_upper(p['nombre'])}, {p.get('calidades','')}, CÉDULA {_id_to_words_upper(p.get('cedula',''))}" for p in datos["propietarios"]]
+    )
+    valores["texto_inquilinos"] = ", ".join(
+        [f"{_bold_upper(i['nombre'])}, CÉDULA {_id_to_words_upper(i.get('cedula',''))}" for i in inquilinos]
+    )
+    valores["finca_info"] = datos["finca_info"]
+    return valores
+
+
+# ---------------------------------------------------------
+# Documento
+# ---------------------------------------------------------
+def renderizar_pdf(datos: dict, imagenes: dict, destino: BinaryIO) -> None:
+    """Escribe el PDF en 'destino' (archivo abierto en modo binario); imagenes viene de preparar_imagenes."""
+    propietarios = datos["propietarios"]
+    inquilinos = datos["inquilinos"]
+    valores = _valores(datos)
+
+    # -------- Construcción del PDF --------
+    doc = SimpleDocTemplate(destino, pagesize=letter, title="Contrato de Arrendamiento")
+    estilo_texto, estilo_titulo = _estilos()
+
+    contenido = []
+    contenido.append(Paragraph("CONTRATO DE ARRENDAMIENTO", estilo_titulo))
+    contenido.append(Spacer(1, 10))
+
+    # Intro (manteniendo el texto original y agregando dirección si existe)
+    contenido.append(Paragraph(_INTRO.rellenar(valores), estilo_texto))
+    contenido.append(Spacer(1, 12))
+
+    # Añadimos todas las cláusulas
+    for clausula in _CLAUSULAS:
+        contenido.append(Paragraph(clausula.rellenar(valores), estilo_texto))
+        contenido.append(Spacer(1, 8))
+
+    # Cierre con fechas en palabras
+    hoy = datos["fecha"]
+    cierre = _CIERRE.rellenar({
+        "dia": _num_to_words_es(hoy.day).upper(),
+        "mes": SPANISH_MONTHS[hoy.month].upper(),
+        "anio": _num_to_words_es(hoy.year).upper(),
+    })
+    contenido.append(Paragraph(cierre, estilo_texto))
+    contenido.append(Spacer(1, 20))
+
+    # Firmas propietarios
+    for p in propietarios:
+        contenido.append(Paragraph("______________________________", estilo_texto))
+        contenido.append(Paragraph(f"{_bold_upper(p['nombre'])} - CÉDULA: {_id_to_words_upper(p.get('cedula',''))}", estilo_texto))
+        contenido.append(Spacer(1, 8))
+
+    # Firmas inquilinos
+    for i in inquilinos:
+        contenido.append(Paragraph("______________________________", estilo_texto))
+        contenido.append(Paragraph(f"{_bold_upper(i['nombre'])} - CÉDULA: {_id_to_words_upper(i.get('cedula',''))}", estilo_texto))
+        contenido.append(Spacer(1, 10))
+
+    # ----------------------
+    # Fotos de cédulas al final (frente y reverso)
+    # ----------------------
+    for i in inquilinos:
+        ced = i.get("cedula")
+        if not ced:
+            continue
+        for f in datos["fotos"].get(ced, []):
+            for parte, titulo, espacio in ((1, "Frente", 15), (2, "Reverso", 10)):
+                ruta = imagenes.get((f["id"], parte))
+                if ruta:
+                    contenido.append(Spacer(1, espacio))
+                    contenido.append(Paragraph(f"{titulo} de cédula de {_bold_upper(i['nombre'])}", estilo_texto))
+                    # lazy=2: se abre al dibujarla y se cierra después
+                    contenido.append(Image(ruta, width=300, height=200, lazy=2))
+
+    # Generar PDF
+    doc.build(contenido)
+
+
+def generar_pdf(datos: dict, fuentes: dict, ruta_destino: str) -> int:
+    """
+    Punto de entrada de los workers: prepara las imágenes en un directorio
+    temporal, escribe el PDF en ruta_destino y devuelve su tamaño. Lanza
+    PDFExcedeMemoria si el documento no cabe en PDF_MEMORIA_MAX_MB (o si el
+    worker se queda sin memoria con PDF_WORKER_MAX_MB).
+    """
+    limite = PDF_MEMORIA_MAX_MB * MB
+    with tempfile.TemporaryDirectory(prefix="pdf-imagenes-") as directorio:
+        try:
+            imagenes = preparar_imagenes(fuentes, directorio, limite)
+            with open(ruta_destino, "wb") as destino:
+                renderizar_pdf(datos, imagenes, destino)
+                return destino.tell()
+        except MemoryError:
+            raise PDFExcedeMemoria(None, limite)
@@ -0,0 +1,103 @@
+"""
+Plantilla del recibo de pago (ReportLab).
+
+Como plantilla_contrato, no toca la base de datos: recibe los datos ya
+cargados por recibos.py y se ejecuta en el pool de procesos de procesos_pdf.
+Reutiliza los estilos y las conversiones a palabras del contrato.
+"""
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+from plantilla_contrato import (
+    SPANISH_MONTHS,
+    _Plantilla,
+    _date_with_words_upper,
+    _estilos,
+    _id_to_words_upper,
+    _money_to_words_upper,
+)
+
+# Subir al cambiar el texto o el diseño del recibo: invalida los PDFs en caché
+VERSION_RECIBO = 1
+
+TIPOS = {
+    "mensualidad": "mensualidad",
+    "deposito": "depósito de garantía",
+    "agua": "servicio de agua",
+    "luz": "servicio de electricidad",
+    "parqueo": "parqueo",
+}
+
+_RECIBIMOS = _Plantilla(
+    "Recibimos de {inquilino}, CÉDULA {cedula}, la suma de {monto}, por concepto de <b>{concepto}</b>."
+)
+_FECHA = _Plantilla("Fecha de pago: {fecha}.")
+_CONTRATO = _Plantilla("Contrato N.º <b>{contrato_id}</b>{apartamento}.")
+_COMPLETO = _Plantilla("El pago cubre la totalidad del monto esperado de {esperado}.")
+_PARCIAL = _Plantilla("Pago parcial: queda un saldo pendiente de {adeudado} sobre el monto esperado de {esperado}.")
+_DETALLE = _Plantilla("Detalle: {detalle}")
+
+
+def _concepto(datos: dict) -> str:
+    concepto = TIPOS.get(datos["tipo"], "pago")
+    if datos["mes"] in SPANISH_MONTHS and datos["anno"]:
+        concepto += f" de {SPANISH_MONTHS[datos['mes']]} de {datos['anno']}"
+    return concepto
+
+
+def _parrafos(datos: dict) -> list[str]:
+    inquilino = datos["inquilino"]
+    parrafos = [
+        _RECIBIMOS.rellenar({
+            # Se escapa después de pasar a mayúsculas: "&amp;" no sobrevive a upper()
+            "inquilino": f"<b>{escape((inquilino['nombre'] or '').upper())}</b>",
+            "cedula": _id_to_words_upper(escape(inquilino["cedula"] or "")),
+            "monto": _money_to_words_upper(datos["monto_pagado"]),
+            "concepto": _concepto(datos),
+        }),
+        _FECHA.rellenar({"fecha": _date_with_words_upper(datos["fecha_pago"])}),
+    ]
+
+    apto = datos["apartamento"]
+    texto_apto = ""
+    if apto:
+        texto_apto = f", apartamento <b>{escape(apto['nombre'] or '___')}</b>"
+        if apto["direccion_fisica"]:
+            texto_apto += f" ({escape(apto['direccion_fisica'])})"
+    parrafos.append(_CONTRATO.rellenar({"contrato_id": datos["contrato_id"], "apartamento": texto_apto}))
+
+    if datos["monto_esperado"] is not None:
+        valores = {
+            "esperado": _money_to_words_upper(datos["monto_esperado"]),
+            "adeudado": _money_to_words_upper(datos["monto_adeudado"]),
+        }
+        if datos["es_pago_completo"]:
+            parrafos.append(_COMPLETO.rellenar(valores))
+        elif datos["monto_adeudado"]:
+            parrafos.append(_PARCIAL.rellenar(valores))
+    if datos["detalle"]:
+        parrafos.append(_DETALLE.rellenar({"detalle": escape(datos["detalle"])}))
+    return parrafos
+
+
+def generar_recibo(datos: dict, ruta_destino: str) -> int:
+    """Punto de entrada de los workers: escribe el recibo y devuelve su tamaño."""
+    estilo_texto, estilo_titulo = _estilos()
+    contenido = [
+        Paragraph("RECIBO DE PAGO", estilo_titulo),
+        Paragraph(f"N.º {datos['id']:06d}", estilo_titulo),
+        Spacer(1, 12),
+    ]
+    for parrafo in _parrafos(datos):
+        contenido.append(Paragraph(parrafo, estilo_texto))
+        contenido.append(Spacer(1, 8))
+    contenido.append(Spacer(1, 30))
+    contenido.append(Paragraph("______________________________", estilo_texto))
+    contenido.append(Paragraph("Recibido por EL PROPIETARIO", estilo_texto))
+
+    with open(ruta_destino, "wb") as destino:
+        doc = SimpleDocTemplate(destino, pagesize=letter, title=f"Recibo de pago {datos['id']}")
+        doc.build(contenido)
+        return destino.tell()
@@ -0,0 +1,275 @@
+"""
+Pool de procesos acotado para generar PDFs.
+
+El armado con ReportLab y la decodificación con Pillow son CPU y retienen el
+GIL: en el threadpool de las peticiones bloquearían a todos los demás endpoints.
+Aquí se ejecutan en procesos aparte con un máximo de trabajos en vuelo
+(PDF_WORKERS ejecutándose + PDF_COLA_MAX esperando); por encima de eso se
+rechaza con ColaPDFLlena para que la ruta responda 503 con Retry-After.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from decouple import config
+from pypdf import PdfWriter
+
+PDF_WORKERS = config("PDF_WORKERS", default=2, cast=int)
+PDF_COLA_MAX = config("PDF_COLA_MAX", default=8, cast=int)
+PDF_RETRY_AFTER = config("PDF_RETRY_AFTER", default=5, cast=int)  # segundos
+PDF_TIMEOUT = config("PDF_TIMEOUT", default=120, cast=int)  # segundos
+PDF_LOTE_MAX = config("PDF_LOTE_MAX", default=100, cast=int)  # documentos por lote
+# Memoria virtual por worker (RLIMIT_AS); 0 = sin límite. Debe cubrir también las
+# bibliotecas cargadas: por debajo de ~300 MB el worker ni siquiera arranca.
+PDF_WORKER_MAX_MB = config("PDF_WORKER_MAX_MB", default=0, cast=int)
+
+
+class ColaPDFLlena(Exception):
+    def __init__(self):
+        super().__init__("Hay demasiados PDFs en generación, intente de nuevo en unos segundos")
+        self.retry_after = PDF_RETRY_AFTER
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(PDF_WORKERS + PDF_COLA_MAX)
+
+# ---------------------------------------------------------
+# Métricas (en memoria, por proceso web)
+# ---------------------------------------------------------
+_metricas = {
+    "en_vuelo": 0,
+    "max_en_vuelo": 0,
+    "completados": 0,
+    "fallidos": 0,
+    "rechazados": 0,
+}
+_tiempos_espera: deque = deque(maxlen=200)
+_tiempos_render: deque = deque(maxlen=200)
+
+
+def _percentil(valores: list[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))], 3)
+
+
+def metricas() -> dict:
+    with _lock:
+        espera, render = list(_tiempos_espera), list(_tiempos_render)
+        datos = dict(_metricas)
+    datos.update({
+        "workers": PDF_WORKERS,
+        "capacidad": PDF_WORKERS + PDF_COLA_MAX,
+        "en_cola": max(datos["en_vuelo"] - PDF_WORKERS, 0),
+        "espera_p50_s": _percentil(espera, 0.5),
+        "espera_p95_s": _percentil(espera, 0.95),
+        "render_p50_s": _percentil(render, 0.5),
+        "render_p95_s": _percentil(render, 0.95),
+        "render_max_s": round(max(render), 3) if render else None,
+    })
+    return datos
+
+
+def _limitar_memoria(max_mb: int) -> None:
+    """
+    Inicializador de los workers: con RLIMIT_AS una asignación que no cabe
+    lanza MemoryError (el PDF falla limpio) en lugar de que el sistema mate el proceso.
+    """
+    if not max_mb:
+        return
+    try:
+        import resource  # solo Unix
+
+        limite = max_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+    except (ImportError, ValueError, OSError) as e:
+        print("⚠️ No se pudo limitar la memoria del worker de PDFs:", e)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool propio (no el de imágenes) para que un lote de PDFs no frene las miniaturas."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_limitar_memoria,
+                    initargs=(PDF_WORKER_MAX_MB,),
+                )
+    return _pool
+
+
+def _descartar_pool() -> None:
+    global _pool
+    with _lock:
+        _pool = None
+
+
+def _medido(funcion, args: tuple):
+    """Se ejecuta en el worker: devuelve (inicio, fin, resultado) con el reloj de pared."""
+    inicio = time.time()
+    resultado = funcion(*args)
+    return inicio, time.time(), resultado
+
+
+def _enviar(funcion, args: tuple):
+    """submit() falla con BrokenProcessPool si un worker murió antes: se reintenta en un pool nuevo."""
+    try:
+        return get_pool().submit(_medido, funcion, args)
+    except BrokenProcessPool:
+        _descartar_pool()
+        return get_pool().submit(_medido, funcion, args)
+
+
+def _liberar(enviado: float, inicio: Optional[float] = None, fin: Optional[float] = None) -> None:
+    """Devuelve el cupo y registra el trabajo; sin inicio/fin cuenta como fallido."""
+    _cupos.release()
+    with _lock:
+        _metricas["en_vuelo"] -= 1
+        if inicio is None:
+            _metricas["fallidos"] += 1
+            return
+        _metricas["completados"] += 1
+        _tiempos_espera.append(max(inicio - enviado, 0))
+        _tiempos_render.append(fin - inicio)
+
+
+def ejecutar(funcion, *args, espera_cupo: float = 0):
+    """
+    Ejecuta funcion(*args) en el pool y espera el resultado. La función y sus
+    argumentos deben poder serializarse (funciones de módulo, tipos simples).
+    Lanza ColaPDFLlena si no hay cupo (tras esperar hasta espera_cupo segundos)
+    y TimeoutError si supera PDF_TIMEOUT.
+    """
+    if not (_cupos.acquire(timeout=espera_cupo) if espera_cupo else _cupos.acquire(blocking=False)):
+        with _lock:
+            _metricas["rechazados"] += 1
+        raise ColaPDFLlena()
+
+    enviado = time.time()
+    with _lock:
+        _metricas["en_vuelo"] += 1
+        _metricas["max_en_vuelo"] = max(_metricas["max_en_vuelo"], _metricas["en_vuelo"])
+
+    try:
+        futuro = _enviar(funcion, args)
+    except (OSError, ImportError, NotImplementedError) as e:
+        # Sin procesos disponibles (p. ej. entorno serverless): se genera aquí, con el mismo cupo
+        print("⚠️ Pool de PDFs no disponible, se genera en el proceso web:", e)
+        try:
+            inicio, fin, resultado = _medido(funcion, args)
+        except Exception:
+            _liberar(enviado)
+            raise
+        _liberar(enviado, inicio, fin)
+        return resultado
+    except Exception:
+        _liberar(enviado)
+        raise
+
+    def _al_terminar(f):
+        # El cupo se libera cuando el worker termina, aunque la petición ya haya expirado
+        if f.cancelled() or f.exception() is not None:
+            _liberar(enviado)
+        else:
+            inicio, fin, _ = f.result()
+            _liberar(enviado, inicio, fin)
+
+    futuro.add_done_callback(_al_terminar)
+    try:
+        return futuro.result(timeout=PDF_TIMEOUT)[2]
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. sin memoria): el siguiente PDF usa un pool nuevo
+        _descartar_pool()
+        raise
+
+
+
+def generar_en_cache(cache, clave: str, funcion, *args, espera_cupo: float = 0):
+    """
+    funcion(*args, ruta_destino) escribe el PDF en un worker (y devuelve su
+    tamaño); el archivo se publica en 'cache' con 'clave'. Devuelve
+    (archivo abierto en la posición 0, tamaño).
+    """
+    ruta_tmp = cache.ruta_temporal()
+    try:
+        tamanno = ejecutar(funcion, *args, ruta_tmp, espera_cupo=espera_cupo)
+        archivo = open(ruta_tmp, "rb")  # abierto antes de publicar: el LRU no puede quitárnoslo
+        try:
+            cache.publicar(clave, ruta_tmp)
+        except OSError as e:
+            print("⚠️ No se pudo guardar el PDF en caché:", e)
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+    return archivo, tamanno
+
+# ---------------------------------------------------------
+# Lotes
+# ---------------------------------------------------------
+def en_paralelo(funcion: Callable, elementos: Iterable, hilos: int = PDF_WORKERS) -> Iterator[tuple]:
+    """
+    Llama funcion(elemento) desde 'hilos' hilos a la vez (cada uno espera a un
+    worker del pool vía ejecutar) y entrega (elemento, resultado o excepción)
+    en el orden en que terminan. Solo hay 'hilos' trabajos en curso: los
+    siguientes se envían a medida que se consumen los resultados. Si el
+    consumidor cierra el generador, los resultados que no llegó a recibir se
+    cierran (si tienen close()).
+    """
+    pendientes = iter(elementos)
+    ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="lote-pdf")
+    en_curso = {}
+
+    def enviar():
+        for elemento in islice(pendientes, hilos - len(en_curso)):
+            en_curso[ejecutor.submit(funcion, elemento)] = elemento
+
+    try:
+        enviar()
+        while en_curso:
+            hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                elemento = en_curso.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    resultado = e
+                yield elemento, resultado
+            enviar()
+    finally:
+        # Si el consumidor abandona (cliente desconectado) no se envían más trabajos;
+        # los que ya corren terminan igual y su resultado se cierra al terminar
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+        for futuro in en_curso:
+            futuro.add_done_callback(_descartar_resultado)
+
+
+def _descartar_resultado(futuro) -> None:
+    """Cierra el resultado no entregado de un trabajo (p. ej. el PDF abierto de generar_en_cache)."""
+    if futuro.cancelled() or futuro.exception() is not None:
+        return
+    cerrar = getattr(futuro.result(), "close", None)
+    if callable(cerrar):
+        try:
+            cerrar()
+        except Exception as e:
+            print("⚠️ No se pudo cerrar un resultado descartado:", e)
+
+
+def unir_pdfs(archivos: Iterable, destino) -> None:
+    """Concatena PDFs abiertos (los cierra) en 'destino', un archivo binario con seek."""
+    escritor = PdfWriter()
+    for archivo in archivos:
+        with archivo:
+            escritor.append(archivo)
+    escritor.write(destino)
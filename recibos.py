@@ -0,0 +1,83 @@
+"""
+Datos de los recibos de pago (PagoMensual).
+
+Igual que el PDF del contrato: aquí solo se lee la base de datos y se calcula
+la clave de caché; el documento lo arma plantilla_recibo en el pool de
+procesos de procesos_pdf.
+"""
+import hashlib
+import json
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import models
+from plantilla_recibo import VERSION_RECIBO
+
+
+def _consulta(db: Session):
+    return (
+        db.query(
+            models.PagoMensual,
+            models.Inquilino.nombre,
+            models.Inquilino.p_apellido,
+            models.Inquilino.s_apellido,
+            models.Apartamento.nombre,
+            models.Apartamento.direccion_fisica,
+        )
+        .outerjoin(models.Inquilino, models.Inquilino.cedula == models.PagoMensual.inquilino_cedula)
+        .outerjoin(models.Contrato, models.Contrato.id == models.PagoMensual.contrato_id)
+        .outerjoin(models.Apartamento, models.Apartamento.id == models.Contrato.id_apartamento)
+    )
+
+
+def _datos(fila) -> dict:
+    pago, nombre, p_apellido, s_apellido, apartamento, direccion = fila
+    return {
+        "id": pago.id,
+        "fecha_pago": pago.fecha_pago,
+        "monto_pagado": pago.monto_pagado,
+        "monto_esperado": pago.monto_esperado,
+        "monto_adeudado": pago.monto_adeudado_de_este_pago,
+        "es_pago_completo": pago.es_pago_completo,
+        "tipo": pago.tipo.name if pago.tipo else None,
+        "mes": pago.mes,
+        "anno": pago.anno,
+        "detalle": pago.detalle,
+        "contrato_id": pago.contrato_id,
+        "inquilino": {
+            "cedula": pago.inquilino_cedula,
+            "nombre": " ".join(p for p in (nombre, p_apellido, s_apellido) if p),
+        },
+        "apartamento": {"nombre": apartamento, "direccion_fisica": direccion} if apartamento or direccion else None,
+    }
+
+
+def cargar_recibo(db: Session, id_pago: int) -> Optional[dict]:
+    """Datos del recibo de un pago; None si el pago no existe."""
+    fila = _consulta(db).filter(models.PagoMensual.id == id_pago).first()
+    return _datos(fila) if fila else None
+
+
+def cargar_recibos(db: Session, mes: Optional[int] = None, anno: Optional[int] = None,
+                   contrato_id: Optional[int] = None, ids: Optional[list[int]] = None) -> list[dict]:
+    """
+    Recibos de los pagos con algún monto pagado que cumplen los filtros, en una
+    sola consulta y ordenados por id.
+    """
+    consulta = _consulta(db).filter(models.PagoMensual.monto_pagado > 0)
+    if mes is not None:
+        consulta = consulta.filter(models.PagoMensual.mes == mes)
+    if anno is not None:
+        consulta = consulta.filter(models.PagoMensual.anno == anno)
+    if contrato_id is not None:
+        consulta = consulta.filter(models.PagoMensual.contrato_id == contrato_id)
+    if ids is not None:
+        consulta = consulta.filter(models.PagoMensual.id.in_(ids))
+    return [_datos(fila) for fila in consulta.order_by(models.PagoMensual.id).all()]
+
+
+def clave_cache(datos: dict) -> str:
+    """SHA-256 de todo lo que determina el recibo, incluida la versión de la plantilla."""
+    contenido = json.dumps({"recibo": VERSION_RECIBO, **datos}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
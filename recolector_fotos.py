@@ -0,0 +1,230 @@
+"""
+Recolector de fotos huérfanas.
+
+Eliminar un vínculo (apartamento_fotos, contrato_foto, ...) solo borra esa fila:
+la foto y su contenido quedan. Este proceso borra por lotes las fotos que ninguna
+tabla referencia y luego los blobs (con sus variantes) que ya no usa ninguna foto.
+También descarta las subidas reanudables abandonadas.
+
+Uso:
+    python recolector_fotos.py [--dry-run] [--lote 200] [--gracia-horas 24]
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from decouple import config
+from sqlalchemy import delete, exists, func, select
+
+from database import SessionLocal
+import models
+import servicio_fotos
+from almacenamiento import get_almacenamiento
+
+GC_GRACIA_HORAS = config("GC_GRACIA_HORAS", default=24, cast=int)
+GC_LOTE = config("GC_LOTE", default=200, cast=int)
+GC_MAX_LOTES = config("GC_MAX_LOTES", default=50, cast=int)  # por fase y ejecución (límite de tiempo en Vercel)
+CARGA_EXPIRA_HORAS = config("CARGA_EXPIRA_HORAS", default=24, cast=int)
+
+
+def _referencias_foto() -> list:
+    """Columnas que apuntan a fotos: todas las tablas de vínculo y la devolución del depósito."""
+    return [modelo.id_foto for modelo, _, _ in servicio_fotos.ENLACES.values()] + [models.DevolucionDeposito.id_foto]
+
+
+def _condiciones_foto_huerfana(limite: datetime) -> list:
+    return [~exists().where(columna == models.Foto.id) for columna in _referencias_foto()] + [
+        models.Foto.creado_en < limite,
+    ]
+
+
+def _condiciones_blob_huerfano() -> list:
+    return [
+        ~exists().where(models.Foto.hash_parte1 == models.Blob.hash),
+        ~exists().where(models.Foto.hash_parte2 == models.Blob.hash),
+        ~exists().where(models.BlobVariante.hash == models.Blob.hash),
+    ]
+
+
+def _bytes_legado(db, ids: list[int]) -> int:
+    """Tamaño del base64 heredado que todavía guardan esas fotos en la base de datos."""
+    largo = func.coalesce(func.length(models.Foto.base64_parte1), 0) + \
+        func.coalesce(func.length(models.Foto.base64_parte2), 0)
+    return int(db.query(func.coalesce(func.sum(largo), 0)).filter(models.Foto.id.in_(ids)).scalar())
+
+
+# ---------------------------------------------------------
+# Fase 0: subidas reanudables sin actividad
+# ---------------------------------------------------------
+def _recolectar_cargas(reporte: dict, lote: int, dry_run: bool):
+    limite = datetime.utcnow() - timedelta(hours=CARGA_EXPIRA_HORAS)
+    almacenamiento = get_almacenamiento()
+    with SessionLocal() as db:
+        cargas = (
+            db.query(models.CargaFoto)
+            .filter(models.CargaFoto.actualizado_en < limite)
+            .limit(lote)
+            .all()
+        )
+        for carga in cargas:
+            reporte["bytes_cargas"] += almacenamiento.tamanno_parcial(carga.id)
+            if not dry_run:
+                db.delete(carga)
+        reporte["cargas"] += len(cargas)
+        db.commit()
+    if not dry_run:
+        for carga in cargas:
+            almacenamiento.eliminar_parcial(carga.id)
+
+
+# ---------------------------------------------------------
+# Fase 1: fotos sin referencias
+# ---------------------------------------------------------
+def _recolectar_fotos(reporte: dict, limite: datetime, lote: int, max_lotes: Optional[int], dry_run: bool):
+    condiciones = _condiciones_foto_huerfana(limite)
+    ultimo_id = 0
+    lotes = 0
+    while True:
+        if max_lotes and lotes >= max_lotes:
+            reporte["completo"] = False
+            return
+        with SessionLocal() as db:
+            ids = db.scalars(
+                select(models.Foto.id)
+                .where(models.Foto.id > ultimo_id, *condiciones)
+                .order_by(models.Foto.id)
+                .limit(lote)
+            ).all()
+            if not ids:
+                return
+            ultimo_id = ids[-1]
+            lotes += 1
+            reporte["bytes_legado"] += _bytes_legado(db, ids)
+            if dry_run:
+                reporte["fotos"] += len(ids)
+                continue
+            # Se repiten las condiciones: un vínculo creado mientras tanto salva la foto
+            borradas = db.execute(
+                delete(models.Foto)
+                .where(models.Foto.id.in_(ids), *condiciones)
+                .execution_options(synchronize_session=False)
+            )
+            reporte["fotos"] += borradas.rowcount
+            db.commit()
+
+
+# ---------------------------------------------------------
+# Fase 2: blobs que ya no usa ninguna foto (y sus variantes)
+# ---------------------------------------------------------
+def _recolectar_blobs(reporte: dict, limite: datetime, lote: int, max_lotes: Optional[int], dry_run: bool):
+    condiciones = _condiciones_blob_huerfano()
+    ultimo = ""
+    lotes = 0
+    while True:
+        if max_lotes and lotes >= max_lotes:
+            reporte["completo"] = False
+            return
+        with SessionLocal() as db:
+            origenes = db.scalars(
+                select(models.Blob.hash)
+                .where(models.Blob.hash > ultimo, models.Blob.creado_en < limite, *condiciones)
+                .order_by(models.Blob.hash)
+                .limit(lote)
+            ).all()
+            if not origenes:
+                return
+            ultimo = origenes[-1]
+            lotes += 1
+            variantes = db.scalars(
+                select(models.BlobVariante.hash).where(models.BlobVariante.hash_origen.in_(origenes))
+            ).all()
+            candidatos = list(origenes) + list(variantes)
+
+            if dry_run:
+                tamannos = db.query(func.count(models.Blob.hash), func.coalesce(func.sum(models.Blob.tamanno), 0)) \
+                    .filter(models.Blob.hash.in_(candidatos)).one()
+                reporte["blobs"] += tamannos[0]
+                reporte["bytes_blobs"] += int(tamannos[1])
+                continue
+
+            db.execute(delete(models.BlobVariante).where(models.BlobVariante.hash_origen.in_(origenes)))
+            # Una variante compartida con otro origen, o un blob usado de nuevo, no se borra
+            borrados = db.execute(
+                delete(models.Blob)
+                .where(models.Blob.hash.in_(candidatos), *condiciones)
+                .returning(models.Blob.hash, models.Blob.tamanno, models.Blob.tipo_contenido,
+                           models.Blob.tamanno_original)
+                .execution_options(synchronize_session=False)
+            ).mappings().all()
+            db.commit()
+
+        if borrados:
+            _eliminar_contenido(reporte, limite, borrados)
+
+
+def _eliminar_contenido(reporte: dict, limite: datetime, borrados: list) -> None:
+    """
+    Borra del almacenamiento el contenido de blobs ya eliminados de la base de
+    datos, después de confirmar la transacción. Una subida con el mismo
+    contenido puede haber llegado mientras tanto: registrar_blobs vuelve a
+    insertar la fila y guardar_stream republica el archivo. Por eso se omiten
+    los hashes registrados de nuevo y el almacenamiento solo borra lo que no
+    se publicó dentro del periodo de gracia; lo conservado se vuelve a
+    registrar para no dejar contenido sin fila.
+    """
+    with SessionLocal() as db:
+        registrados = set(db.scalars(
+            select(models.Blob.hash).where(models.Blob.hash.in_([b["hash"] for b in borrados]))
+        ))
+    almacenamiento = get_almacenamiento()
+    limite_epoch = limite.replace(tzinfo=timezone.utc).timestamp()
+    conservados = []
+    for blob in borrados:
+        if blob["hash"] in registrados:
+            continue
+        try:
+            if not almacenamiento.eliminar_si_anterior(blob["hash"], limite_epoch):
+                conservados.append(dict(blob))
+                continue
+        except Exception as e:
+            print(f"⚠️ No se pudo eliminar el blob {blob['hash']}:", e)
+            continue
+        reporte["blobs"] += 1
+        reporte["bytes_blobs"] += blob["tamanno"]
+    if conservados:
+        with SessionLocal() as db:
+            servicio_fotos.registrar_blobs(db, conservados)
+            db.commit()
+
+
+def recolectar_fotos(dry_run: bool = False, lote: int = GC_LOTE, gracia_horas: int = GC_GRACIA_HORAS,
+                     max_lotes: Optional[int] = GC_MAX_LOTES) -> dict:
+    """
+    Borra fotos y blobs huérfanos más antiguos que el periodo de gracia.
+    Cada lote se confirma por separado. Con dry_run solo se cuenta; en ese modo
+    los blobs que quedarían huérfanos al borrar las fotos no se incluyen.
+    'completo' es False si se alcanzó max_lotes y quedan pendientes.
+    """
+    limite = datetime.utcnow() - timedelta(hours=gracia_horas)
+    reporte = {"dry_run": dry_run, "cargas": 0, "bytes_cargas": 0, "fotos": 0, "bytes_legado": 0,
+               "blobs": 0, "bytes_blobs": 0, "completo": True}
+    _recolectar_cargas(reporte, lote, dry_run)
+    _recolectar_fotos(reporte, limite, lote, max_lotes, dry_run)
+    _recolectar_blobs(reporte, limite, lote, max_lotes, dry_run)
+    reporte["bytes_recuperados"] = reporte["bytes_cargas"] + reporte["bytes_legado"] + reporte["bytes_blobs"]
+    print(
+        f"🧹 Recolector de fotos{' (simulación)' if dry_run else ''}: {reporte['fotos']} fotos, "
+        f"{reporte['blobs']} blobs, {reporte['cargas']} cargas, {reporte['bytes_recuperados']} bytes recuperados"
+    )
+    return reporte
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elimina fotos y blobs sin referencias")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta, no borra nada")
+    parser.add_argument("--lote", type=int, default=GC_LOTE)
+    parser.add_argument("--gracia-horas", type=int, default=GC_GRACIA_HORAS)
+    parser.add_argument("--max-lotes", type=int, default=0, help="0 = sin límite")
+    args = parser.parse_args()
+    recolectar_fotos(dry_run=args.dry_run, lote=args.lote, gracia_horas=args.gracia_horas,
+                     max_lotes=args.max_lotes or None)
@@ -0,0 +1,135 @@
+"""
+Indicadores del portafolio para el tablero: ocupación, ingresos cobrados
+contra esperados del mes y morosidad.
+
+Se calculan con agregados en SQL (dos consultas) sobre resumen_pagos_mensual,
+que tiene una fila por (contrato, tipo, año, mes) con lo esperado, cobrado y
+pendiente ya sumado (ver resumen_pagos.py), en lugar de recorrer
+pagos_mensuales. El resultado se guarda unos segundos en memoria
+(REPORTES_CACHE_TTL) y se invalida al escribir pagos o contratos.
+
+La morosidad se decide por grupo, no por cargo: si el vencimiento más próximo
+(vence_pendiente) de un (contrato, tipo, año, mes) ya pasó, todo su saldo
+pendiente y todos sus cargos pendientes cuentan como vencidos, aunque alguno
+de ellos venza más tarde. Es exacta cuando cada grupo tiene un solo
+vencimiento, el caso habitual: un cargo por tipo y mes.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from decouple import config
+from sqlalchemy import and_, case, distinct, func, select
+
+from cache_ttl import CacheTTL
+from database import SessionLocal
+import models
+
+REPORTES_CACHE_TTL = config("REPORTES_CACHE_TTL", default=60, cast=float)  # segundos (0 = sin caché)
+ESTADO_CONTRATO_ACTIVO = 1
+
+_cache = CacheTTL(REPORTES_CACHE_TTL, 64)
+
+
+def invalidar() -> None:
+    """Llamar después de confirmar cambios en pagos o contratos."""
+    _cache.limpiar()
+
+
+def estadisticas_cache() -> dict:
+    return _cache.estadisticas()
+
+
+def _numero(valor) -> float:
+    return float(valor or 0)
+
+
+def _ocupacion(db, hoy: datetime) -> dict:
+    """Una consulta: conteos de apartamentos y contratos, y contratos con cargos vencidos."""
+    C, R = models.Contrato, models.ResumenPagoMensual
+    activo = C.estado == ESTADO_CONTRATO_ACTIVO
+    fila = db.execute(
+        select(
+            select(func.count()).select_from(models.Apartamento).scalar_subquery().label("apartamentos"),
+            select(func.count()).where(activo).scalar_subquery().label("contratos_activos"),
+            select(func.count(distinct(C.id_apartamento))).where(activo, C.id_apartamento.isnot(None))
+            .scalar_subquery().label("ocupados"),
+            select(func.count(distinct(R.contrato_id))).where(R.vence_pendiente < hoy)
+            .scalar_subquery().label("contratos_morosos"),
+        )
+    ).one()
+    total = fila.apartamentos or 0
+    ocupados = fila.ocupados or 0
+    return {
+        "apartamentos": total,
+        "ocupados": ocupados,
+        "disponibles": max(total - ocupados, 0),
+        "tasa_ocupacion": round(ocupados / total, 4) if total else None,
+        "contratos_activos": fila.contratos_activos or 0,
+        "contratos_morosos": fila.contratos_morosos or 0,
+    }
+
+
+def _montos(db, mes: int, anno: int, hoy: datetime) -> dict:
+    """Una consulta agrupada por tipo: esperado y cobrado del mes, y saldo vencido acumulado."""
+    R = models.ResumenPagoMensual
+    del_mes = and_(R.mes == mes, R.anno == anno)
+    # vence_pendiente solo tiene valor si quedan cargos con saldo en ese mes
+    vencido = R.vence_pendiente < hoy
+    cero = Decimal(0)
+    filas = db.execute(
+        select(
+            R.tipo,
+            func.sum(case((del_mes, R.esperado), else_=cero)).label("esperado"),
+            func.sum(case((del_mes, R.cobrado), else_=cero)).label("cobrado"),
+            func.sum(case((del_mes, R.pendiente), else_=cero)).label("pendiente"),
+            func.sum(case((vencido, R.pendiente), else_=cero)).label("vencido"),
+            func.sum(case((vencido, R.cargos_pendientes), else_=0)).label("cargos_vencidos"),
+        )
+        .group_by(R.tipo)
+    ).all()
+
+    por_tipo = {}
+    for fila in filas:
+        nombre = fila.tipo.name if fila.tipo is not None else "sin_tipo"
+        por_tipo[nombre] = {
+            "esperado": _numero(fila.esperado),
+            "cobrado": _numero(fila.cobrado),
+            "pendiente": _numero(fila.pendiente),
+            "vencido": _numero(fila.vencido),
+            "cargos_vencidos": fila.cargos_vencidos or 0,
+        }
+    esperado = sum(t["esperado"] for t in por_tipo.values())
+    cobrado = sum(t["cobrado"] for t in por_tipo.values())
+    return {
+        "ingresos": {
+            "mes": mes,
+            "anno": anno,
+            "esperado": esperado,
+            "cobrado": cobrado,
+            "pendiente": sum(t["pendiente"] for t in por_tipo.values()),
+            "porcentaje_cobrado": round(cobrado / esperado, 4) if esperado else None,
+        },
+        "morosidad": {
+            "vencido": sum(t["vencido"] for t in por_tipo.values()),
+            "cargos_vencidos": sum(t["cargos_vencidos"] for t in por_tipo.values()),
+        },
+        "por_tipo": por_tipo,
+    }
+
+
+def dashboard(mes: Optional[int] = None, anno: Optional[int] = None) -> dict:
+    hoy = date.today()
+    mes, anno = mes or hoy.month, anno or hoy.year
+    clave = (mes, anno, hoy)
+    datos = _cache.obtener(clave)
+    if datos is not None:
+        return datos
+
+    inicio_hoy = datetime(hoy.year, hoy.month, hoy.day)
+    with SessionLocal() as db:
+        datos = {"ocupacion": _ocupacion(db, inicio_hoy), **_montos(db, mes, anno, inicio_hoy)}
+    datos["morosidad"]["contratos_morosos"] = datos["ocupacion"].pop("contratos_morosos")
+    datos["generado_en"] = datetime.utcnow().isoformat()
+    _cache.guardar(clave, datos)
+    return datos
@@ -0,0 +1,149 @@
+"""
+Resumen de pagos_mensuales por (contrato, tipo, año, mes) en la tabla
+resumen_pagos_mensual, para que los reportes no recorran todos los pagos.
+
+Quien escribe pagos llama a refrescar() con los (contrato, año, mes) que tocó,
+dentro de su misma transacción: solo esos meses se recalculan desde
+pagos_mensuales. reconstruir() lo recalcula todo: migraciones.aplicar_esquema
+lo llama al arrancar si la tabla está vacía (carga inicial), y se puede
+ejecutar a mano si se escribió en pagos_mensuales por fuera de la API.
+
+Las filas sin contrato, tipo, mes o año no entran en el resumen.
+
+Uso:
+    python resumen_pagos.py          # reconstrucción completa
+"""
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, or_, select, text, tuple_
+
+from database import SessionLocal
+import models
+
+
+def _es_cargo():
+    """Cargo generado por tareas_recurrentes: sin monto pagado."""
+    P = models.PagoMensual
+    return or_(P.monto_pagado == 0, P.monto_pagado.is_(None))
+
+
+def _con_saldo():
+    P = models.PagoMensual
+    return and_(_es_cargo(), P.es_pago_completo.isnot(True), P.monto_adeudado_de_este_pago > 0)
+
+
+_COLUMNAS = ["contrato_id", "tipo", "anno", "mes", "esperado", "cobrado", "pendiente",
+             "cargos_pendientes", "vence_pendiente", "pagos", "actualizado_en"]
+_CLAVE = ["contrato_id", "tipo", "anno", "mes"]
+
+
+def _agregado(*condiciones):
+    P = models.PagoMensual
+    pagado = P.monto_pagado > 0
+    return (
+        select(
+            P.contrato_id,
+            P.tipo,
+            P.anno,
+            P.mes,
+            func.coalesce(func.sum(case((_es_cargo(), P.monto_esperado))), 0),
+            func.coalesce(func.sum(case((pagado, P.monto_pagado))), 0),
+            func.coalesce(func.sum(case((_con_saldo(), P.monto_adeudado_de_este_pago))), 0),
+            func.count(case((_con_saldo(), 1))),
+            func.min(case((_con_saldo(), P.fecha_vence))),
+            func.count(case((pagado, 1))),
+            literal(datetime.utcnow(), models.ResumenPagoMensual.actualizado_en.type),
+        )
+        .where(P.contrato_id.isnot(None), P.tipo.isnot(None), P.anno.isnot(None), P.mes.isnot(None),
+               *condiciones)
+        .group_by(P.contrato_id, P.tipo, P.anno, P.mes)
+    )
+
+
+def _insertar_o_actualizar(db, consulta) -> None:
+    """
+    INSERT ... SELECT con ON CONFLICT DO UPDATE: dos transacciones que
+    refrescan el mismo mes no chocan por la clave primaria.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    sentencia = insert_dialecto(models.ResumenPagoMensual.__table__).from_select(_COLUMNAS, consulta)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=_CLAVE,
+        set_={c: sentencia.excluded[c] for c in _COLUMNAS if c not in _CLAVE},
+    )
+    db.execute(sentencia)
+
+
+def claves(pagos: Iterable) -> set[tuple]:
+    """(contrato_id, anno, mes) de pagos (modelos o diccionarios) para pasar a refrescar."""
+    resultado = set()
+    for pago in pagos:
+        valores = (pago["contrato_id"], pago["anno"], pago["mes"]) if isinstance(pago, dict) else \
+            (pago.contrato_id, pago.anno, pago.mes)
+        if None not in valores:
+            resultado.add(valores)
+    return resultado
+
+
+def refrescar(db, claves_meses: Iterable[tuple]) -> None:
+    """
+    Recalcula el resumen de los (contrato_id, anno, mes) indicados en la sesión
+    'db', sin confirmar: el llamador lo confirma junto con sus propios cambios.
+    """
+    claves_meses = set(claves_meses)
+    if not claves_meses:
+        return
+    db.flush()
+    P, R = models.PagoMensual, models.ResumenPagoMensual
+    _insertar_o_actualizar(db, _agregado(tuple_(P.contrato_id, P.anno, P.mes).in_(claves_meses)))
+    # Tipos que ya no tienen filas en ese mes (pagos borrados o movidos)
+    db.execute(
+        delete(R)
+        .where(
+            tuple_(R.contrato_id, R.anno, R.mes).in_(claves_meses),
+            ~exists().where(P.contrato_id == R.contrato_id, P.tipo == R.tipo, P.anno == R.anno, P.mes == R.mes),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _sin_poblar(db) -> bool:
+    """Hay pagos que deberían estar resumidos y la tabla está vacía (recién creada)."""
+    P = models.PagoMensual
+    return not db.scalar(select(exists().select_from(models.ResumenPagoMensual))) and db.scalar(
+        select(exists().where(P.contrato_id.isnot(None), P.tipo.isnot(None), P.anno.isnot(None), P.mes.isnot(None)))
+    )
+
+
+def reconstruir(solo_si_vacio: bool = False) -> Optional[dict]:
+    """
+    Vacía y recalcula toda la tabla en una transacción. Con solo_si_vacio
+    solo lo hace si la tabla nunca se llenó (al desplegar) y si no devuelve None.
+    """
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        # En cada arranque la tabla ya suele estar poblada: se comprueba sin bloquear
+        if solo_si_vacio and not _sin_poblar(db):
+            return None
+        if db.get_bind().dialect.name == "postgresql":
+            # Los refrescos incrementales (y otro arranque) esperan a que termine
+            db.execute(text("LOCK TABLE resumen_pagos_mensual IN EXCLUSIVE MODE"))
+            # Otro arranque pudo poblarla mientras se esperaba el bloqueo (READ COMMITTED)
+            if solo_si_vacio and not _sin_poblar(db):
+                return None
+        db.execute(delete(models.ResumenPagoMensual))
+        db.execute(insert(models.ResumenPagoMensual.__table__).from_select(_COLUMNAS, _agregado()))
+        filas = db.scalar(select(func.count()).select_from(models.ResumenPagoMensual))
+        db.commit()
+    reporte = {"filas": filas, "segundos": round(time.perf_counter() - inicio, 3)}
+    print(f"📊 Resumen de pagos reconstruido: {reporte['filas']} filas en {reporte['segundos']} s")
+    return reporte
+
+
+if __name__ == "__main__":
+    reconstruir()
@@ -1,66 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+import time
+from typing import Optional
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Request, Response, status
 from datetime import timedelta
+from starlette.concurrency import run_in_threadpool
 from database import SessionLocal
 import models, schemas
-from security import get_user_by_correo, verify_password, create_access_token, get_current_user
+import hash_claves
+from security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS,
+    aplicar_revocacion_refresh, crear_refresh_token, crear_token_acceso, get_current_user,
+    get_user_by_correo, invalidar_usuario, leer_refresh_token, require_roles,
+    revocar_refresh_token, usar_refresh_token,
+)
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 COOKIE_NAME = "access_token"
+COOKIE_REFRESH = "refresh_token"
+
+
+def _guardar_cookies(response: Response, token: str, refresh: str) -> None:
+    """Cookies para navegadores; la de renovación solo viaja a /auth."""
+    response.set_cookie(
+        key=COOKIE_NAME,
+        value=token,
+        httponly=True,
+        samesite="lax",  # Cambiar a 'none' si frontend está en dominio diferente (https)
+        secure=False,    # Cambiar a True en producción con HTTPS
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        path="/"
+    )
+    response.set_cookie(
+        key=COOKIE_REFRESH,
+        value=refresh,
+        httponly=True,
+        samesite="lax",
+        secure=False,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+        path="/auth"
+    )
 
 # ---------------------------------------------------------
 # LOGIN
 # ---------------------------------------------------------
+def _buscar_usuario(correo: str):
+    with SessionLocal() as db:
+        user = get_user_by_correo(db, correo)
+        if user is not None:
+            db.expunge(user)
+        return user
+
+
+def _actualizar_hash(user: models.Usuario, nuevo_hash: str) -> None:
+    """Guarda el hash con los parámetros actuales, salvo que la clave haya cambiado mientras tanto."""
+    with SessionLocal() as db:
+        db.query(models.Usuario).filter(
+            models.Usuario.id == user.id, models.Usuario.clave_hash == user.clave_hash
+        ).update({models.Usuario.clave_hash: nuevo_hash}, synchronize_session=False)
+        db.commit()
+    invalidar_usuario(user.correo)
+
+
+def _emitir_tokens(user: models.Usuario) -> tuple[str, str]:
+    with SessionLocal() as db:
+        refresh = crear_refresh_token(db, user)
+        db.commit()
+    return crear_token_acceso(user), refresh
+
+
+# Asíncrona para que la espera del hash (en su propio pool) no ocupe un hilo de peticiones
 @router.post("/login")
-def login(payload: schemas.LoginRequest, response: Response):
+async def login(payload: schemas.LoginRequest, request: Request, response: Response):
+    inicio = time.perf_counter()
     try:
-        with SessionLocal() as db:
-            user = get_user_by_correo(db, payload.correo)
-            if not user or not user.activo:
-                raise HTTPException(status_code=401, detail="Credenciales inválidas")
-
-            if not verify_password(payload.clave, user.salt, user.clave_hash):
-                raise HTTPException(status_code=401, detail="Credenciales inválidas")
-
-            token = create_access_token({"sub": user.correo, "rol": user.rol.value})
-
-            # Guarda cookie para navegadores
-            response.set_cookie(
-                key=COOKIE_NAME,
-                value=token,
-                httponly=True,
-                samesite="lax",  # Cambiar a 'none' si frontend está en dominio diferente (https)
-                secure=False,    # Cambiar a True en producción con HTTPS
-                max_age=60 * 60,  # 1 hora
-                path="/"
-            )
-
-            return {
-                "mensaje": "Login correcto",
-                "access_token": token,
-                "token_type": "bearer",
-                "usuario": {
-                    "id": user.id,
-                    "correo": user.correo,
-                    "nombre": user.nombre,
-                    "rol": user.rol.value,
-                    "activo": user.activo
-                }
+        hash_claves.comprobar_intentos(hash_claves.ip_cliente(request), payload.correo)
+
+        user = await run_in_threadpool(_buscar_usuario, payload.correo)
+        if not user or not user.activo:
+            hash_claves.registrar_fallo(payload.correo)
+            hash_claves.registrar_login(inicio, False)
+            raise HTTPException(status_code=401, detail="Credenciales inválidas")
+
+        valida, nuevo_hash = await hash_claves.verificar(payload.clave, user.salt, user.clave_hash)
+        if not valida:
+            hash_claves.registrar_fallo(payload.correo)
+            hash_claves.registrar_login(inicio, False)
+            raise HTTPException(status_code=401, detail="Credenciales inválidas")
+        if nuevo_hash:
+            await run_in_threadpool(_actualizar_hash, user, nuevo_hash)
+        hash_claves.registrar_exito(payload.correo)
+
+        token, refresh = await run_in_threadpool(_emitir_tokens, user)
+        _guardar_cookies(response, token, refresh)
+
+        hash_claves.registrar_login(inicio, True, rehash=bool(nuevo_hash))
+        return {
+            "mensaje": "Login correcto",
+            "access_token": token,
+            "refresh_token": refresh,
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            "usuario": {
+                "id": user.id,
+                "correo": user.correo,
+                "nombre": user.nombre,
+                "rol": user.rol.value,
+                "activo": user.activo
             }
+        }
 
+    except hash_claves.DemasiadosIntentos as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except hash_claves.ColaClavesLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al iniciar sesión: {str(e)}")
 
 
+# ---------------------------------------------------------
+# RENOVAR TOKEN DE ACCESO
+# ---------------------------------------------------------
+@router.post("/refresh")
+def renovar_token(
+    response: Response,
+    datos: Optional[schemas.RefreshRequest] = None,
+    refresh_token: Optional[str] = Cookie(None),
+):
+    """Cambia un refresh token válido por un token de acceso nuevo y otro refresh token (rotación)."""
+    try:
+        token = (datos.refresh_token if datos else None) or refresh_token
+        jti = leer_refresh_token(token) if token else None
+        if jti is None:
+            raise HTTPException(status_code=401, detail="Token de renovación inválido o expirado")
+
+        with SessionLocal() as db:
+            user = usar_refresh_token(db, jti)
+            if user is None:
+                db.rollback()
+                raise HTTPException(status_code=401, detail="Token de renovación inválido o expirado")
+            nuevo_refresh = crear_refresh_token(db, user)
+            nuevo_token = crear_token_acceso(user)
+            db.commit()
+        aplicar_revocacion_refresh(jti)
+
+        _guardar_cookies(response, nuevo_token, nuevo_refresh)
+        return {
+            "access_token": nuevo_token,
+            "refresh_token": nuevo_refresh,
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al renovar token: {str(e)}")
+
+
 # ---------------------------------------------------------
 # LOGOUT
 # ---------------------------------------------------------
 @router.post("/logout")
-def logout(response: Response):
+def logout(
+    response: Response,
+    datos: Optional[schemas.RefreshRequest] = None,
+    refresh_token: Optional[str] = Cookie(None),
+):
     try:
+        token = (datos.refresh_token if datos else None) or refresh_token
+        jti = leer_refresh_token(token) if token else None
+        if jti is not None:
+            with SessionLocal() as db:
+                revocar_refresh_token(db, jti)
+                db.commit()
+            aplicar_revocacion_refresh(jti)
+
         response.delete_cookie(key=COOKIE_NAME, path="/")
+        response.delete_cookie(key=COOKIE_REFRESH, path="/auth")
         return {"mensaje": "Logout correcto"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al cerrar sesión: {str(e)}")
@@ -70,8 +188,25 @@ def logout(response: Response):
 # QUIÉN SOY
 # ---------------------------------------------------------
 @router.get("/me", response_model=schemas.UsuarioResponse)
-def quien_soy(user: models.Usuario = Depends(get_current_user)):
+def quien_soy(user=Depends(get_current_user)):
+    # El token solo trae los datos de autorización: el perfil se lee de la base de datos
     try:
-        return user
+        with SessionLocal() as db:
+            perfil = db.get(models.Usuario, user.id)
+            if not perfil:
+                raise HTTPException(status_code=404, detail="Usuario no encontrado")
+            perfil.rol = perfil.rol.value
+            return perfil
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener usuario: {str(e)}")
+
+
+# ---------------------------------------------------------
+# MÉTRICAS DEL LOGIN (solo admin)
+# ---------------------------------------------------------
+@router.get("/metricas", dependencies=[Depends(require_roles("admin"))])
+def metricas_login():
+    """Pool de hash (cola, tiempos de bcrypt), latencia de los logins y rechazos por límite."""
+    return hash_claves.metricas()
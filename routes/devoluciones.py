@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import tuple_, update
 from database import SessionLocal
 import models, schemas
+import imagenes
+import servicio_fotos
 from security import get_current_user
 
 router = APIRouter(
@@ -173,8 +176,7 @@ def agregar_foto_devolucion(id_contrato: int, cedula: str, fecha: str, foto: sch
             if not devolucion:
                 raise HTTPException(status_code=404, detail="Devolución no encontrada")
 
-            nueva_foto = models.Foto(**foto.dict())
-            db.add(nueva_foto)
+            nueva_foto = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva_foto)
 
@@ -182,6 +184,63 @@ def agregar_foto_devolucion(id_contrato: int, cedula: str, fecha: str, foto: sch
             db.commit()
             db.refresh(devolucion)
 
-            return nueva_foto
+            return servicio_fotos.foto_respuesta(nueva_foto)
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al agregar foto a devolución: {str(e)}")
+
+
+# ---------------------------------------------------------
+# Adjuntar comprobantes a varias devoluciones en una sola transacción
+# ---------------------------------------------------------
+@router.post("/fotos/lote", response_model=schemas.FotoLoteResponse)
+def agregar_fotos_devoluciones_lote(items: list[schemas.DevolucionFotoLoteItem]):
+    if not items:
+        raise HTTPException(status_code=400, detail="El lote está vacío")
+    if len(items) > servicio_fotos.FOTOS_LOTE_MAX:
+        raise HTTPException(
+            status_code=400, detail=f"Máximo {servicio_fotos.FOTOS_LOTE_MAX} fotos por lote"
+        )
+
+    try:
+        with SessionLocal() as db:
+            claves = {(i.contrato_id, i.inquilino_cedula, i.fecha_devolucion) for i in items}
+            if len(claves) != len(items):
+                raise HTTPException(status_code=400, detail="Hay devoluciones repetidas en el lote")
+
+            columnas = (
+                models.DevolucionDeposito.contrato_id,
+                models.DevolucionDeposito.inquilino_cedula,
+                models.DevolucionDeposito.fecha_devolucion,
+            )
+            existentes = set(
+                db.query(*columnas).filter(tuple_(*columnas).in_(list(claves))).all()
+            )
+            faltantes = claves - {tuple(e) for e in existentes}
+            if faltantes:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Devoluciones no encontradas: " + ", ".join(
+                        f"{c}/{ced}/{fecha.isoformat()}" for c, ced, fecha in sorted(faltantes)
+                    ),
+                )
+
+            ids = servicio_fotos.insertar_fotos(db, [i.foto for i in items])
+            db.execute(update(models.DevolucionDeposito), [
+                {
+                    "contrato_id": i.contrato_id,
+                    "inquilino_cedula": i.inquilino_cedula,
+                    "fecha_devolucion": i.fecha_devolucion,
+                    "id_foto": id_foto,
+                }
+                for i, id_foto in zip(items, ids)
+            ])
+            db.commit()
+            return {"ids": ids}
+    except HTTPException:
+        raise
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al agregar fotos a devoluciones: {str(e)}")
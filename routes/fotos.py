@@ -1,6 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import re
+import tempfile
+from typing import Optional
+from decouple import config
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
 from database import SessionLocal
 import models, schemas
+import servicio_fotos
+import imagenes
+from almacenamiento import (
+    BlobDemasiadoGrande, BlobNoEncontrado, DesplazamientoInvalido, HashNoCoincide, get_almacenamiento
+)
 from security import get_current_user
 
 router = APIRouter(
@@ -17,24 +33,34 @@ router = APIRouter(
 def crear_foto(foto: schemas.FotoCreate):
     try:
         with SessionLocal() as db:
-            nueva = models.Foto(**foto.dict())
-            db.add(nueva)
+            nueva = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva)
-            return nueva
+            return servicio_fotos.foto_respuesta(nueva)
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear foto: {str(e)}")
 
 
-@router.get("/", response_model=list[schemas.FotoResponse])
+@router.get("/", response_model=list[schemas.FotoListadoResponse])
 def listar_fotos():
     try:
         with SessionLocal() as db:
-            return db.query(models.Foto).all()
+            return servicio_fotos.fotos_listado(db, db.query(models.Foto).all())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar fotos: {str(e)}")
 
 
+@router.get("/estadisticas/almacenamiento", response_model=schemas.EstadisticasAlmacenamientoResponse)
+def estadisticas_almacenamiento():
+    try:
+        with SessionLocal() as db:
+            return servicio_fotos.estadisticas_almacenamiento(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas: {str(e)}")
+
+
 @router.get("/{id}", response_model=schemas.FotoResponse)
 def obtener_foto(id: int):
     try:
@@ -42,11 +68,139 @@ def obtener_foto(id: int):
             foto = db.query(models.Foto).filter(models.Foto.id == id).first()
             if not foto:
                 raise HTTPException(status_code=404, detail="Foto no encontrada")
-            return foto
+            return servicio_fotos.foto_respuesta(foto)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener foto: {str(e)}")
 
 
+# ---------------------------------------------------------
+# DESCARGA BINARIA con caché HTTP (ETag = hash) y soporte de Range
+# ---------------------------------------------------------
+# Las fotos incluyen cédulas: solo el navegador del usuario las guarda. "public"
+# (CDN y cachés compartidas) solo si la URL del blob no se expone fuera de la app.
+FOTOS_CACHE_PUBLICO = config("FOTOS_CACHE_PUBLICO", default=False, cast=bool)
+CACHE_INMUTABLE = f"{'public' if FOTOS_CACHE_PUBLICO else 'private'}, max-age=31536000, immutable"
+CACHE_POR_ID = "private, max-age=86400"
+HASH_VALIDO = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _rango_solicitado(cabecera: Optional[str], tamanno: int) -> Optional[tuple[int, int]]:
+    """Interpreta 'Range: bytes=a-b' (un solo rango). None = se responde completo."""
+    if not cabecera or not cabecera.startswith("bytes=") or "," in cabecera:
+        return None
+    inicio_txt, _, fin_txt = cabecera[len("bytes="):].strip().partition("-")
+    try:
+        if inicio_txt == "":
+            sufijo = int(fin_txt)  # últimos N bytes; "bytes=-0" no es satisfacible
+            inicio = max(tamanno - sufijo, 0) if sufijo > 0 else tamanno
+            fin = tamanno - 1
+        else:
+            inicio = int(inicio_txt)
+            fin = min(int(fin_txt), tamanno - 1) if fin_txt else tamanno - 1
+    except ValueError:
+        return None
+    if inicio >= tamanno or fin < inicio:
+        raise HTTPException(
+            status_code=416,
+            detail="Rango no satisfacible",
+            headers={"Content-Range": f"bytes */{tamanno}"},
+        )
+    return inicio, fin
+
+
+def _respuesta_blob(request: Request, hash_hex: str, tipo_contenido: Optional[str], cache_control: str):
+    almacen = get_almacenamiento()
+    try:
+        tamanno = almacen.tamanno(hash_hex)
+    except BlobNoEncontrado:
+        raise HTTPException(status_code=404, detail="Contenido no encontrado")
+
+    etag = f'"{hash_hex}"'
+    cabeceras = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [v.strip().removeprefix("W/") for v in if_none_match.split(",")]:
+        return Response(status_code=304, headers=cabeceras)
+
+    rango = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        rango = _rango_solicitado(request.headers.get("range"), tamanno)
+
+    media_type = tipo_contenido or "application/octet-stream"
+    if rango is None:
+        cabeceras["Content-Length"] = str(tamanno)
+        return StreamingResponse(almacen.leer_bloques(hash_hex), media_type=media_type, headers=cabeceras)
+
+    inicio, fin = rango
+    cabeceras["Content-Range"] = f"bytes {inicio}-{fin}/{tamanno}"
+    cabeceras["Content-Length"] = str(fin - inicio + 1)
+    return StreamingResponse(
+        almacen.leer_bloques(hash_hex, inicio, fin), status_code=206, media_type=media_type, headers=cabeceras
+    )
+
+
+@router.get("/blob/{hash_hex}")
+def descargar_blob(hash_hex: str, request: Request):
+    """Contenido crudo por hash: inmutable, el navegador lo guarda sin volver a pedirlo."""
+    if not HASH_VALIDO.match(hash_hex):
+        raise HTTPException(status_code=404, detail="Contenido no encontrado")
+    try:
+        with SessionLocal() as db:
+            blob = db.query(models.Blob).filter(models.Blob.hash == hash_hex).first()
+            if not blob:
+                raise HTTPException(status_code=404, detail="Contenido no encontrado")
+            tipo_contenido = blob.tipo_contenido
+        return _respuesta_blob(request, hash_hex, tipo_contenido, CACHE_INMUTABLE)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al descargar contenido: {str(e)}")
+
+
+# ---------------------------------------------------------
+# Imagen de una foto (original o variante) bajo demanda
+# ---------------------------------------------------------
+@router.get("/{id}/imagen")
+def obtener_imagen_foto(
+    id: int,
+    request: Request,
+    parte: int = Query(1, ge=1, le=2),
+    variante: str = Query(imagenes.VARIANTE_ORIGINAL),
+):
+    if variante != imagenes.VARIANTE_ORIGINAL and variante not in imagenes.VARIANTES:
+        raise HTTPException(status_code=400, detail="Variante no válida")
+    try:
+        with SessionLocal() as db:
+            foto = db.query(models.Foto).filter(models.Foto.id == id).first()
+            if not foto:
+                raise HTTPException(status_code=404, detail="Foto no encontrada")
+
+            hash_origen = getattr(foto, f"hash_parte{parte}")
+            if not hash_origen:
+                # Foto aún no migrada: solo se puede servir el contenido heredado
+                data = servicio_fotos.leer_parte(foto, parte)
+                if data is None:
+                    raise HTTPException(status_code=404, detail="La foto no tiene esa parte")
+                return Response(content=data, media_type=servicio_fotos.detectar_tipo_contenido(data[:16]))
+
+            if variante != imagenes.VARIANTE_ORIGINAL:
+                origen = db.get(models.Blob, hash_origen)
+                if origen is not None and not imagenes.es_imagen(origen.tipo_contenido):
+                    raise imagenes.NoEsImagen()
+            hash_hex = servicio_fotos.hash_variante(db, hash_origen, variante)
+            blob = db.query(models.Blob).filter(models.Blob.hash == hash_hex).first()
+            tipo_contenido = blob.tipo_contenido if blob else None
+        return _respuesta_blob(request, hash_hex, tipo_contenido, CACHE_POR_ID)
+    except HTTPException:
+        raise
+    except imagenes.NoEsImagen:
+        raise HTTPException(status_code=415, detail="El contenido no es una imagen: pida la variante original")
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=422, detail=f"No se pueden generar variantes: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener imagen: {str(e)}")
+
+
 @router.delete("/{id}")
 def eliminar_foto(id: int):
     try:
@@ -61,15 +215,336 @@ def eliminar_foto(id: int):
         raise HTTPException(status_code=500, detail=f"Error al eliminar foto: {str(e)}")
 
 
+# ---------------------------------------------------------
+# SUBIDA BINARIA (multipart) — el cuerpo se lee por trozos a medida que
+# llega: cada archivo va a un temporal con el límite de tamaño aplicado al
+# vuelo (413 apenas se supera), sin que Starlette lo guarde antes entero
+# ---------------------------------------------------------
+CAMPOS_ARCHIVO = ("parte1", "parte2")
+CAMPO_TEXTO_MAX = 64 * 1024
+
+_CUERPO_SUBIDA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["parte1"],
+            "properties": {
+                "parte1": {"type": "string", "format": "binary"},
+                "parte2": {"type": "string", "format": "binary"},
+                "contexto": {"type": "string"},
+            },
+        }}},
+    }
+}
+
+
+class _LectorMultipart:
+    """Callbacks de python-multipart: archivos a temporales y campos de texto en memoria, con límites."""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.rutas: dict[str, str] = {}
+        self.campos: dict[str, str] = {}
+        self._cabecera = b""
+        self._valor = b""
+        self._cabeceras: dict[bytes, bytes] = {}
+        self._nombre: Optional[str] = None
+        self._archivo = None
+        self._texto = bytearray()
+        self._tamanno = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._inicio_parte,
+            "on_header_field": lambda data, inicio, fin: self._acumular("_cabecera", data[inicio:fin]),
+            "on_header_value": lambda data, inicio, fin: self._acumular("_valor", data[inicio:fin]),
+            "on_header_end": self._fin_cabecera,
+            "on_headers_finished": self._fin_cabeceras,
+            "on_part_data": self._datos,
+            "on_part_end": self._fin_parte,
+        }
+
+    def _acumular(self, atributo: str, data: bytes) -> None:
+        setattr(self, atributo, getattr(self, atributo) + data)
+
+    def _inicio_parte(self) -> None:
+        self._cabeceras = {}
+        self._nombre = None
+        self._archivo = None
+        self._texto = bytearray()
+        self._tamanno = 0
+
+    def _fin_cabecera(self) -> None:
+        self._cabeceras[self._cabecera.lower()] = self._valor
+        self._cabecera = self._valor = b""
+
+    def _fin_cabeceras(self) -> None:
+        _, opciones = parse_options_header(self._cabeceras.get(b"content-disposition", b""))
+        self._nombre = opciones.get(b"name", b"").decode("utf-8", "replace")
+        if self._nombre in CAMPOS_ARCHIVO:
+            if self._nombre in self.rutas:
+                raise HTTPException(status_code=422, detail=f"Campo repetido: {self._nombre}")
+            fd, self.rutas[self._nombre] = tempfile.mkstemp(prefix="subida-")
+            self._archivo = os.fdopen(fd, "wb")
+        elif self._nombre != "contexto":
+            raise HTTPException(status_code=422, detail=f"Campo desconocido: {self._nombre}")
+
+    def _datos(self, data: bytes, inicio: int, fin: int) -> None:
+        self._tamanno += fin - inicio
+        if self._archivo is not None:
+            if self._tamanno > self.limite:
+                raise BlobDemasiadoGrande(self.limite)
+            self._archivo.write(data[inicio:fin])
+        else:
+            if self._tamanno > CAMPO_TEXTO_MAX:
+                raise HTTPException(status_code=413, detail=f"El campo {self._nombre} es demasiado largo")
+            self._texto.extend(data[inicio:fin])
+
+    def _fin_parte(self) -> None:
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+        else:
+            self.campos[self._nombre] = self._texto.decode("utf-8", "replace")
+
+    def descartar(self) -> None:
+        if self._archivo is not None:
+            self._archivo.close()
+        for ruta in self.rutas.values():
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+async def _leer_subida(request: Request) -> _LectorMultipart:
+    """Lee el multipart del cuerpo trozo a trozo. El llamador descarta los temporales."""
+    tipo, opciones = parse_options_header(request.headers.get("content-type", ""))
+    if tipo != b"multipart/form-data" or b"boundary" not in opciones:
+        raise HTTPException(status_code=415, detail="Se esperaba multipart/form-data")
+    limite = servicio_fotos.FOTO_MAX_BYTES
+    longitud = request.headers.get("content-length", "")
+    # Dos archivos al límite más los campos de texto y las cabeceras de cada parte
+    if longitud.isdigit() and int(longitud) > 2 * limite + 4 * CAMPO_TEXTO_MAX:
+        raise HTTPException(status_code=413, detail=str(BlobDemasiadoGrande(limite)))
+
+    lector = _LectorMultipart(limite)
+    try:
+        parser = MultipartParser(opciones[b"boundary"], lector.callbacks())
+        async for trozo in request.stream():
+            parser.write(trozo)
+        parser.finalize()
+    except BlobDemasiadoGrande as e:
+        lector.descartar()
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        lector.descartar()
+        raise
+    except Exception as e:
+        lector.descartar()
+        raise HTTPException(status_code=400, detail=f"Cuerpo multipart inválido: {str(e)}")
+    if "parte1" not in lector.rutas:
+        lector.descartar()
+        raise HTTPException(status_code=422, detail="Falta el archivo parte1")
+    return lector
+
+
+def _guardar_subida(lector: _LectorMultipart, tipo: Optional[str], id_entidad) -> models.Foto:
+    with SessionLocal() as db:
+        if tipo and db.get(servicio_fotos.ENTIDADES[tipo], id_entidad) is None:
+            raise HTTPException(status_code=404, detail=f"{tipo.capitalize()} no existe")
+
+        foto = servicio_fotos.crear_foto_desde_rutas(
+            db, lector.campos.get("contexto"), lector.rutas["parte1"], lector.rutas.get("parte2")
+        )
+        db.flush()
+        if tipo:
+            servicio_fotos.vincular_fotos(db, tipo, id_entidad, [foto.id])
+        db.commit()
+        db.refresh(foto)
+        return foto
+
+
+async def _subir(request: Request, tipo: Optional[str] = None, id_entidad=None) -> models.Foto:
+    """Sube una foto (parte1, parte2 opcional, contexto) y la vincula a la entidad si se indica."""
+    lector = await _leer_subida(request)
+    try:
+        # Normalizar la imagen y la base de datos son bloqueantes: fuera del event loop
+        return await run_in_threadpool(_guardar_subida, lector, tipo, id_entidad)
+    except HTTPException:
+        raise
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al subir foto: {str(e)}")
+    finally:
+        lector.descartar()
+
+
+@router.post("/subir", response_model=schemas.FotoMetadataResponse, openapi_extra=_CUERPO_SUBIDA)
+async def subir_foto(request: Request):
+    return await _subir(request)
+
+
+@router.post("/apartamento/{id_apto}/subir", response_model=schemas.FotoMetadataResponse,
+             openapi_extra=_CUERPO_SUBIDA)
+async def subir_foto_apartamento(id_apto: int, request: Request):
+    return await _subir(request, "apartamento", id_apto)
+
+
+@router.post("/contrato/{id_contrato}/subir", response_model=schemas.FotoMetadataResponse,
+             openapi_extra=_CUERPO_SUBIDA)
+async def subir_foto_contrato(id_contrato: int, request: Request):
+    return await _subir(request, "contrato", id_contrato)
+
+
+@router.post("/inquilino/{cedula}/subir", response_model=schemas.FotoMetadataResponse,
+             openapi_extra=_CUERPO_SUBIDA)
+async def subir_foto_inquilino(cedula: str, request: Request):
+    return await _subir(request, "inquilino", cedula)
+
+
+@router.post("/pago/{id_pago}/subir", response_model=schemas.FotoMetadataResponse,
+             openapi_extra=_CUERPO_SUBIDA)
+async def subir_foto_pago(id_pago: int, request: Request):
+    return await _subir(request, "pago", id_pago)
+
+
+# ---------------------------------------------------------
+# SUBIDA REANUDABLE — sesión, bloques por desplazamiento y finalización.
+# Si la conexión se corta, el cliente consulta lo recibido y sigue desde ahí.
+# ---------------------------------------------------------
+
+def _obtener_carga(db, id_carga: str) -> models.CargaFoto:
+    carga = db.get(models.CargaFoto, id_carga)
+    if not carga:
+        raise HTTPException(status_code=404, detail="Carga no existe")
+    return carga
+
+
+@router.post("/cargas", response_model=schemas.CargaFotoEstado)
+def crear_carga(datos: schemas.CargaFotoCreate):
+    try:
+        with SessionLocal() as db:
+            carga = servicio_fotos.crear_carga(db, datos.tamanno_total, datos.hash_sha256)
+            db.commit()
+            return servicio_fotos.estado_carga(carga)
+    except BlobDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear carga: {str(e)}")
+
+
+@router.get("/cargas/{id_carga}", response_model=schemas.CargaFotoEstado)
+def obtener_carga(id_carga: str):
+    try:
+        with SessionLocal() as db:
+            return servicio_fotos.estado_carga(_obtener_carga(db, id_carga))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener carga: {str(e)}")
+
+
+def _escribir_bloque(id_carga: str, inicio: int, data: bytes) -> dict:
+    try:
+        with SessionLocal() as db:
+            estado = servicio_fotos.escribir_bloque(db, _obtener_carga(db, id_carga), inicio, data)
+            db.commit()
+            return estado
+    except HTTPException:
+        raise
+    except DesplazamientoInvalido as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.recibido)})
+    except BlobDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al recibir bloque: {str(e)}")
+
+
+@router.put("/cargas/{id_carga}", response_model=schemas.CargaFotoEstado)
+async def enviar_bloque(id_carga: str, request: Request, inicio: int = Query(..., ge=0)):
+    """Cuerpo: bytes crudos del bloque (application/octet-stream) a partir de 'inicio'."""
+    data = bytearray()
+    async for trozo in request.stream():
+        data.extend(trozo)
+        if len(data) > servicio_fotos.CARGA_MAX_BLOQUE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El bloque excede el límite de {servicio_fotos.CARGA_MAX_BLOQUE} bytes",
+            )
+    # La escritura y la base de datos son bloqueantes: fuera del event loop
+    return await run_in_threadpool(_escribir_bloque, id_carga, inicio, bytes(data))
+
+
+@router.post("/cargas/{id_carga}/finalizar", response_model=schemas.FotoMetadataResponse)
+def finalizar_carga(id_carga: str, datos: schemas.CargaFotoFinalizar):
+    """Crea la Foto con la carga como parte 1 (y opcionalmente otra como parte 2) y la vincula si se indica."""
+    try:
+        with SessionLocal() as db:
+            carga1 = _obtener_carga(db, id_carga)
+            carga2 = None
+            if datos.id_carga_parte2:
+                if datos.id_carga_parte2 == id_carga:
+                    raise HTTPException(status_code=400, detail="Las dos partes no pueden ser la misma carga")
+                carga2 = _obtener_carga(db, datos.id_carga_parte2)
+
+            id_entidad = None
+            if datos.tipo:
+                try:
+                    id_entidad = servicio_fotos.clave_entidad(datos.tipo, datos.id_entidad)
+                except (KeyError, TypeError, ValueError):
+                    raise HTTPException(status_code=400, detail="Tipo o id de entidad inválido")
+                if db.get(servicio_fotos.ENTIDADES[datos.tipo], id_entidad) is None:
+                    raise HTTPException(status_code=404, detail=f"{datos.tipo.capitalize()} no existe")
+
+            foto = servicio_fotos.finalizar_cargas(db, datos.contexto, carga1, carga2)
+            db.flush()
+            if datos.tipo:
+                servicio_fotos.vincular_fotos(db, datos.tipo, id_entidad, [foto.id], [datos.detalle])
+            db.commit()
+            servicio_fotos.eliminar_contenido_cargas(id_carga, datos.id_carga_parte2)
+            db.refresh(foto)
+            return foto
+    except HTTPException:
+        raise
+    except servicio_fotos.CargaIncompleta as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HashNoCoincide as e:
+        raise HTTPException(status_code=422, detail=f"{str(e)}; la carga se reinicia desde el byte 0")
+    except BlobDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al finalizar carga: {str(e)}")
+
+
+@router.delete("/cargas/{id_carga}")
+def cancelar_carga(id_carga: str):
+    try:
+        with SessionLocal() as db:
+            db.delete(_obtener_carga(db, id_carga))
+            db.commit()
+        servicio_fotos.eliminar_contenido_cargas(id_carga)
+        return {"mensaje": "Carga cancelada"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cancelar carga: {str(e)}")
+
+
 # ---------------------------------------------------------
 # BÚSQUEDAS POR CONTEXTO
 # ---------------------------------------------------------
 
-@router.get("/buscar/{contexto}", response_model=list[schemas.FotoResponse])
+@router.get("/buscar/{contexto}", response_model=list[schemas.FotoListadoResponse])
 def buscar_fotos_por_contexto(contexto: str):
     try:
         with SessionLocal() as db:
-            return db.query(models.Foto).filter(models.Foto.contexto.ilike(f"%{contexto}%")).all()
+            fotos = db.query(models.Foto).filter(models.Foto.contexto.ilike(f"%{contexto}%")).all()
+            return servicio_fotos.fotos_listado(db, fotos)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar fotos: {str(e)}")
 
@@ -77,29 +552,32 @@ def buscar_fotos_por_contexto(contexto: str):
 # ---------------------------------------------------------
 # RELACIONES: APARTAMENTO - FOTOS
 # ---------------------------------------------------------
+def _validar_lote(fotos: list) -> None:
+    if not fotos:
+        raise HTTPException(status_code=400, detail="El lote está vacío")
+    if len(fotos) > servicio_fotos.FOTOS_LOTE_MAX:
+        raise HTTPException(
+            status_code=400, detail=f"Máximo {servicio_fotos.FOTOS_LOTE_MAX} fotos por lote"
+        )
+
 
 @router.post("/apartamento/{id_apto}")
 def agregar_fotos_apartamento(id_apto: int, fotos: list[schemas.FotoCreate]):
+    _validar_lote(fotos)
     try:
         with SessionLocal() as db:
-            for f in fotos:
-                nueva_foto = models.Foto(
-                    contexto=f.contexto,
-                    base64_parte1=f.base64_parte1,
-                    base64_parte2=f.base64_parte2,
-                )
-                db.add(nueva_foto)
-                db.flush()
-                enlace = models.ApartamentoFoto(id_apto=id_apto, id_foto=nueva_foto.id)
-                db.add(enlace)
+            ids = servicio_fotos.insertar_fotos(db, fotos)
+            servicio_fotos.vincular_fotos(db, "apartamento", id_apto, ids)
             db.commit()
-            return {"mensaje": "Todas las fotos guardadas correctamente"}
+            return {"mensaje": "Todas las fotos guardadas correctamente", "ids": ids}
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar fotos: {str(e)}")
 
 
-@router.get("/apartamento/{id_apto}", response_model=list[schemas.FotoResponse])
-def listar_fotos_apartamento(id_apto: int):
+@router.get("/apartamento/{id_apto}", response_model=list[schemas.FotoListadoResponse])
+def listar_fotos_apartamento(id_apto: int, contenido: bool = False):
     try:
         with SessionLocal() as db:
             fotos = (
@@ -108,7 +586,7 @@ def listar_fotos_apartamento(id_apto: int):
                 .filter(models.ApartamentoFoto.id_apto == id_apto)
                 .all()
             )
-            return fotos
+            return servicio_fotos.fotos_listado(db, fotos, contenido)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar fotos: {str(e)}")
 
@@ -144,8 +622,7 @@ def agregar_foto_contrato(id_contrato: int, foto: schemas.FotoCreate):
             if not contrato:
                 raise HTTPException(status_code=404, detail="Contrato no existe")
 
-            nueva_foto = models.Foto(**foto.dict())
-            db.add(nueva_foto)
+            nueva_foto = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva_foto)
 
@@ -153,21 +630,46 @@ def agregar_foto_contrato(id_contrato: int, foto: schemas.FotoCreate):
             db.add(relacion)
             db.commit()
             db.refresh(nueva_foto)
-            return nueva_foto
+            return servicio_fotos.foto_respuesta(nueva_foto)
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar foto: {str(e)}")
 
 
-@router.get("/contrato/{id_contrato}", response_model=list[schemas.FotoResponse])
-def listar_fotos_contrato(id_contrato: int):
+@router.post("/contrato/{id_contrato}/lote", response_model=schemas.FotoLoteResponse)
+def agregar_fotos_contrato_lote(id_contrato: int, fotos: list[schemas.FotoLoteCreate]):
+    """Inserta N fotos y N vínculos en una sola transacción."""
+    _validar_lote(fotos)
+    try:
+        with SessionLocal() as db:
+            existe = db.query(models.Contrato).filter(models.Contrato.id == id_contrato).first()
+            if not existe:
+                raise HTTPException(status_code=404, detail="Contrato no existe")
+
+            ids = servicio_fotos.insertar_fotos(db, fotos)
+            servicio_fotos.vincular_fotos(db, "contrato", id_contrato, ids, [f.detalle for f in fotos])
+            db.commit()
+            return {"ids": ids}
+    except HTTPException:
+        raise
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar fotos: {str(e)}")
+
+
+@router.get("/contrato/{id_contrato}", response_model=list[schemas.FotoListadoResponse])
+def listar_fotos_contrato(id_contrato: int, contenido: bool = False):
     try:
         with SessionLocal() as db:
-            return (
+            fotos = (
                 db.query(models.Foto)
                 .join(models.ContratoFoto)
                 .filter(models.ContratoFoto.id_contrato == id_contrato)
                 .all()
             )
+            return servicio_fotos.fotos_listado(db, fotos, contenido)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar fotos: {str(e)}")
 
@@ -203,8 +705,7 @@ def agregar_foto_inquilino(cedula: str, foto: schemas.FotoCreate):
             if not inq:
                 raise HTTPException(status_code=404, detail="Inquilino no existe")
 
-            nueva_foto = models.Foto(**foto.dict())
-            db.add(nueva_foto)
+            nueva_foto = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva_foto)
 
@@ -212,21 +713,46 @@ def agregar_foto_inquilino(cedula: str, foto: schemas.FotoCreate):
             db.add(relacion)
             db.commit()
             db.refresh(nueva_foto)
-            return nueva_foto
+            return servicio_fotos.foto_respuesta(nueva_foto)
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar foto: {str(e)}")
 
 
-@router.get("/inquilino/{cedula}", response_model=list[schemas.FotoResponse])
-def listar_fotos_inquilino(cedula: str):
+@router.post("/inquilino/{cedula}/lote", response_model=schemas.FotoLoteResponse)
+def agregar_fotos_inquilino_lote(cedula: str, fotos: list[schemas.FotoLoteCreate]):
+    """Inserta N fotos y N vínculos en una sola transacción."""
+    _validar_lote(fotos)
+    try:
+        with SessionLocal() as db:
+            existe = db.query(models.Inquilino).filter(models.Inquilino.cedula == cedula).first()
+            if not existe:
+                raise HTTPException(status_code=404, detail="Inquilino no existe")
+
+            ids = servicio_fotos.insertar_fotos(db, fotos)
+            servicio_fotos.vincular_fotos(db, "inquilino", cedula, ids, [f.detalle for f in fotos])
+            db.commit()
+            return {"ids": ids}
+    except HTTPException:
+        raise
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar fotos: {str(e)}")
+
+
+@router.get("/inquilino/{cedula}", response_model=list[schemas.FotoListadoResponse])
+def listar_fotos_inquilino(cedula: str, contenido: bool = False):
     try:
         with SessionLocal() as db:
-            return (
+            fotos = (
                 db.query(models.Foto)
                 .join(models.InquilinoFoto)
                 .filter(models.InquilinoFoto.cedula_inquilino == cedula)
                 .all()
             )
+            return servicio_fotos.fotos_listado(db, fotos, contenido)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar fotos: {str(e)}")
 
@@ -262,8 +788,7 @@ def agregar_foto_pago(id_pago: int, foto: schemas.FotoCreate):
             if not pago:
                 raise HTTPException(status_code=404, detail="Pago no existe")
 
-            nueva_foto = models.Foto(**foto.dict())
-            db.add(nueva_foto)
+            nueva_foto = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva_foto)
 
@@ -271,21 +796,46 @@ def agregar_foto_pago(id_pago: int, foto: schemas.FotoCreate):
             db.add(relacion)
             db.commit()
             db.refresh(nueva_foto)
-            return nueva_foto
+            return servicio_fotos.foto_respuesta(nueva_foto)
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar foto: {str(e)}")
 
 
-@router.get("/pago/{id_pago}", response_model=list[schemas.FotoResponse])
-def listar_fotos_pago(id_pago: int):
+@router.post("/pago/{id_pago}/lote", response_model=schemas.FotoLoteResponse)
+def agregar_fotos_pago_lote(id_pago: int, fotos: list[schemas.FotoLoteCreate]):
+    """Inserta N fotos y N vínculos en una sola transacción."""
+    _validar_lote(fotos)
+    try:
+        with SessionLocal() as db:
+            existe = db.query(models.PagoMensual).filter(models.PagoMensual.id == id_pago).first()
+            if not existe:
+                raise HTTPException(status_code=404, detail="Pago no existe")
+
+            ids = servicio_fotos.insertar_fotos(db, fotos)
+            servicio_fotos.vincular_fotos(db, "pago", id_pago, ids, [f.detalle for f in fotos])
+            db.commit()
+            return {"ids": ids}
+    except HTTPException:
+        raise
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar fotos: {str(e)}")
+
+
+@router.get("/pago/{id_pago}", response_model=list[schemas.FotoListadoResponse])
+def listar_fotos_pago(id_pago: int, contenido: bool = False):
     try:
         with SessionLocal() as db:
-            return (
+            fotos = (
                 db.query(models.Foto)
                 .join(models.PagoFoto)
                 .filter(models.PagoFoto.id_pago == id_pago)
                 .all()
             )
+            return servicio_fotos.fotos_listado(db, fotos, contenido)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar fotos: {str(e)}")
 
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+import importacion
+from security import get_current_user
+
+router = APIRouter(
+    prefix="/importacion",
+    tags=["Importación"],
+    dependencies=[Depends(get_current_user)]  # 🔒 todos los endpoints requieren login
+)
+
+
+# ---------------------------------------------------------
+# Importar un lote (JSON o CSV)
+# ---------------------------------------------------------
+# entidad: apartamentos | inquilinos | contratos | contratos-inquilinos
+# Cuerpo: arreglo JSON de objetos, o CSV con encabezado (Content-Type: text/csv)
+# con las mismas columnas que el POST individual de cada entidad.
+# Asíncrona solo para leer el cuerpo; la validación e inserción van al threadpool.
+@router.post("/{entidad}")
+async def importar_lote(
+    entidad: str,
+    request: Request,
+    parcial: bool = Query(False, description="Insertar las filas válidas aunque otras tengan errores"),
+):
+    if entidad not in importacion.ENTIDADES:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Entidad desconocida; use una de: {', '.join(importacion.ENTIDADES)}",
+        )
+    try:
+        contenido = await request.body()
+        filas = importacion.leer_filas(contenido, request.headers.get("content-type", ""), importacion.campos(entidad))
+        resultado = await run_in_threadpool(importacion.importar, entidad, filas, parcial)
+    except importacion.ImportacionInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al importar {entidad}: {str(e)}")
+
+    # Con errores y sin 'parcial' no se insertó nada
+    if resultado["errores"] and not parcial:
+        return JSONResponse(status_code=422, content=resultado)
+    return resultado
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from database import SessionLocal
 import models, schemas
+import reportes
+import resumen_pagos
 from security import get_current_user
 
 router = APIRouter(
@@ -88,8 +90,16 @@ def eliminar_inquilino(cedula: str):
             if not inq:
                 raise HTTPException(status_code=404, detail="Inquilino no encontrado")
 
+            # Sus pagos se van con él: los meses que tocaban se recalculan en el resumen
+            meses = resumen_pagos.claves(
+                db.query(models.PagoMensual.contrato_id, models.PagoMensual.anno, models.PagoMensual.mes)
+                .filter(models.PagoMensual.inquilino_cedula == cedula)
+                .all()
+            )
             db.delete(inq)
+            resumen_pagos.refrescar(db, meses)
             db.commit()
+            reportes.invalidar()
             return {"mensaje": "Inquilino eliminado correctamente"}
     except Exception as e:
         print(str(e))
@@ -1,9 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import tempfile
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from decouple import config
+from sqlalchemy import insert, or_, select, tuple_, update
 from sqlalchemy.orm import joinedload
 from database import SessionLocal
 import models, schemas
+import reportes
+import resumen_pagos
+import imagenes
+import servicio_fotos
+import plantilla_recibo
+import procesos_pdf
+import recibos
+from cache_pdf import get_cache_pdf, iterar_y_cerrar
+from zip_flujo import zip_en_flujo
 from security import get_current_user
 
+PAGOS_LOTE_MAX = config("PAGOS_LOTE_MAX", default=1000, cast=int)
+
 router = APIRouter(
     prefix="/pagos",
     tags=["Pagos Mensuales"],
@@ -27,13 +44,127 @@ def registrar_pago(pago: schemas.PagoMensualCreate):
 
             nuevo_pago = models.PagoMensual(**pago.dict())
             db.add(nuevo_pago)
+            resumen_pagos.refrescar(db, resumen_pagos.claves([nuevo_pago]))
             db.commit()
+            reportes.invalidar()
             db.refresh(nuevo_pago)
             return nuevo_pago
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al registrar pago: {str(e)}")
 
 
+# ---------------------------------------------------------
+# Registrar pagos en lote (caja del día)
+# ---------------------------------------------------------
+def _clave_cargo(pago) -> tuple:
+    return (pago.contrato_id, pago.tipo, pago.mes, pago.anno)
+
+
+def _cargos_pendientes(db, claves: set) -> dict:
+    """
+    Cargo pendiente generado por tareas_recurrentes (sin monto pagado y sin
+    completar) de cada (contrato, tipo, mes, año), en una consulta. Las filas
+    quedan bloqueadas hasta confirmar para que dos lotes no descuenten a la vez.
+    """
+    if not claves:
+        return {}
+    P = models.PagoMensual
+    cargos = db.scalars(
+        select(P)
+        .where(
+            tuple_(P.contrato_id, P.tipo, P.mes, P.anno).in_(claves),
+            or_(P.monto_pagado == 0, P.monto_pagado.is_(None)),
+            P.es_pago_completo.isnot(True),
+            P.monto_adeudado_de_este_pago.isnot(None),
+        )
+        .order_by(P.id)
+        .with_for_update()
+    ).all()
+    por_clave = {}
+    for cargo in cargos:
+        por_clave.setdefault(_clave_cargo(cargo), cargo)
+    return por_clave
+
+
+@router.post("/lote", response_model=schemas.PagoMensualLoteResponse, status_code=201)
+def registrar_pagos_lote(lote: schemas.PagoMensualLote):
+    """
+    Registra varios pagos en una transacción: valida contratos e inquilinos con
+    una consulta cada uno, inserta todos los pagos en una sentencia y descuenta
+    lo pagado del cargo pendiente del mismo contrato, tipo, mes y año.
+    Si alguna fila es inválida no se registra ninguna (422 con los errores por fila).
+    """
+    pagos = lote.pagos
+    if not pagos:
+        raise HTTPException(status_code=400, detail="El lote está vacío")
+    if len(pagos) > PAGOS_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {PAGOS_LOTE_MAX} pagos por lote")
+
+    try:
+        with SessionLocal() as db:
+            ids_contrato = {p.contrato_id for p in pagos}
+            cedulas = {p.inquilino_cedula for p in pagos}
+            contratos = set(db.scalars(select(models.Contrato.id).where(models.Contrato.id.in_(ids_contrato))))
+            inquilinos = set(db.scalars(select(models.Inquilino.cedula).where(models.Inquilino.cedula.in_(cedulas))))
+
+            errores = []
+            for fila, pago in enumerate(pagos, start=1):
+                mensajes = []
+                if pago.contrato_id not in contratos:
+                    mensajes.append(f"Contrato no existe: {pago.contrato_id}")
+                if pago.inquilino_cedula not in inquilinos:
+                    mensajes.append(f"Inquilino no existe: {pago.inquilino_cedula}")
+                if mensajes:
+                    errores.append({"fila": fila, "errores": mensajes})
+            if errores:
+                raise HTTPException(status_code=422, detail=errores)
+
+            # Lo pagado se aplica a los cargos en el orden del lote; cada pago sin
+            # saldo propio queda con lo que resta del cargo después de él
+            cargos = _cargos_pendientes(db, {_clave_cargo(p) for p in pagos if p.tipo and p.mes and p.anno})
+            saldos = {clave: cargo.monto_adeudado_de_este_pago for clave, cargo in cargos.items()}
+            filas = []
+            for pago in pagos:
+                datos = pago.dict()
+                clave = _clave_cargo(pago)
+                if clave in saldos:
+                    saldos[clave] -= pago.monto_pagado or 0
+                    if datos["monto_adeudado_de_este_pago"] is None:
+                        datos["monto_adeudado_de_este_pago"] = max(saldos[clave], 0)
+                    if datos["es_pago_completo"] is None:
+                        datos["es_pago_completo"] = saldos[clave] <= 0
+                filas.append(datos)
+
+            nuevos = db.scalars(
+                insert(models.PagoMensual).returning(models.PagoMensual, sort_by_parameter_order=True),
+                filas,
+            ).all()
+
+            actualizaciones = [
+                {
+                    "id": cargo.id,
+                    "monto_adeudado_de_este_pago": max(saldos[clave], 0),
+                    "es_pago_completo": saldos[clave] <= 0,
+                }
+                for clave, cargo in cargos.items()
+            ]
+            if actualizaciones:
+                db.execute(update(models.PagoMensual), actualizaciones)
+            # Los cargos comparten (contrato, mes, año) con sus pagos
+            resumen_pagos.refrescar(db, resumen_pagos.claves(nuevos))
+
+            # Fuera de la sesión antes de confirmar: conservan lo que devolvió el INSERT
+            for nuevo in nuevos:
+                db.expunge(nuevo)
+            db.commit()
+            reportes.invalidar()
+            return {"pagos": nuevos, "cargos_actualizados": len(actualizaciones)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al registrar pagos: {str(e)}")
+
+
 # ---------------------------------------------------------
 # Listar todos los pagos
 # ---------------------------------------------------------
@@ -72,10 +203,13 @@ def actualizar_pago(id: int, datos: schemas.PagoMensualCreate):
             if not pago:
                 raise HTTPException(status_code=404, detail="Pago no encontrado")
 
+            meses = resumen_pagos.claves([pago])
             for campo, valor in datos.dict(exclude_unset=True).items():
                 setattr(pago, campo, valor)
+            resumen_pagos.refrescar(db, meses | resumen_pagos.claves([pago]))
 
             db.commit()
+            reportes.invalidar()
             db.refresh(pago)
             return pago
     except Exception as e:
@@ -92,8 +226,11 @@ def eliminar_pago(id: int):
             pago = db.query(models.PagoMensual).filter(models.PagoMensual.id == id).first()
             if not pago:
                 raise HTTPException(status_code=404, detail="Pago no encontrado")
+            meses = resumen_pagos.claves([pago])
             db.delete(pago)
+            resumen_pagos.refrescar(db, meses)
             db.commit()
+            reportes.invalidar()
             return {"mensaje": "Pago eliminado correctamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar pago: {str(e)}")
@@ -161,8 +298,7 @@ def agregar_foto_a_pago(id_pago: int, foto: schemas.FotoCreate):
             if not pago:
                 raise HTTPException(status_code=404, detail="Pago no encontrado")
 
-            nueva_foto = models.Foto(**foto.dict())
-            db.add(nueva_foto)
+            nueva_foto = servicio_fotos.crear_foto(db, foto.contexto, foto.base64_parte1, foto.base64_parte2)
             db.commit()
             db.refresh(nueva_foto)
 
@@ -171,6 +307,8 @@ def agregar_foto_a_pago(id_pago: int, foto: schemas.FotoCreate):
             db.commit()
             db.refresh(relacion)
             return relacion
+    except imagenes.ImagenDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al agregar foto al pago: {str(e)}")
 
@@ -178,8 +316,8 @@ def agregar_foto_a_pago(id_pago: int, foto: schemas.FotoCreate):
 # ---------------------------------------------------------
 # Obtener todas las fotos de un pago
 # ---------------------------------------------------------
-@router.get("/{id_pago}/fotos", response_model=list[schemas.FotoResponse])
-def obtener_fotos_pago(id_pago: int):
+@router.get("/{id_pago}/fotos", response_model=list[schemas.FotoListadoResponse])
+def obtener_fotos_pago(id_pago: int, contenido: bool = False):
     try:
         with SessionLocal() as db:
             fotos = (
@@ -188,6 +326,139 @@ def obtener_fotos_pago(id_pago: int):
                 .filter(models.PagoFoto.id_pago == id_pago)
                 .all()
             )
-            return fotos
+            return servicio_fotos.fotos_listado(db, fotos, contenido)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener fotos del pago: {str(e)}")
+
+
+# ---------------------------------------------------------
+# Recibos de pago (PDF)
+# ---------------------------------------------------------
+def _archivo_recibo(datos: dict, espera_cupo: float = 0):
+    """(archivo abierto, tamaño, acierto_de_cache) del recibo; se genera en el pool si no está en caché."""
+    cache = get_cache_pdf()
+    clave = recibos.clave_cache(datos)
+    archivo = cache.abrir(clave)
+    if archivo is not None:
+        return archivo, os.fstat(archivo.fileno()).st_size, True
+    try:
+        archivo, tamanno = procesos_pdf.generar_en_cache(
+            cache, clave, plantilla_recibo.generar_recibo, datos, espera_cupo=espera_cupo
+        )
+    except procesos_pdf.ColaPDFLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="La generación del recibo tardó demasiado")
+    return archivo, tamanno, False
+
+
+def _archivo_recibo_lote(datos: dict):
+    # Un lote espera su turno en la cola en lugar de rechazarse con 503
+    return _archivo_recibo(datos, espera_cupo=procesos_pdf.PDF_TIMEOUT)[0]
+
+
+def _entradas_zip(lista: list):
+    errores = []
+    for datos, resultado in procesos_pdf.en_paralelo(_archivo_recibo_lote, lista):
+        if isinstance(resultado, Exception):
+            detalle = resultado.detail if isinstance(resultado, HTTPException) else str(resultado)
+            errores.append(f"pago {datos['id']}: {detalle}")
+            continue
+        yield f"recibo-{datos['id']}.pdf", resultado
+    if errores:
+        yield "errores.txt", "\n".join(errores).encode("utf-8")
+
+
+def _pdf_unido(lista: list):
+    """Genera los recibos en paralelo y los une en orden de id en un temporal (abierto en 0)."""
+    archivos = {}
+    try:
+        for datos, resultado in procesos_pdf.en_paralelo(_archivo_recibo_lote, lista):
+            if isinstance(resultado, Exception):
+                raise resultado
+            archivos[datos["id"]] = resultado
+        destino = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        procesos_pdf.unir_pdfs((archivos.pop(datos["id"]) for datos in lista), destino)
+    finally:
+        for archivo in archivos.values():
+            archivo.close()
+    tamanno = destino.tell()
+    destino.seek(0)
+    return destino, tamanno
+
+
+@router.get("/recibos/lote")
+def descargar_recibos(
+    mes: Optional[int] = Query(None, ge=1, le=12),
+    anno: Optional[int] = None,
+    contrato_id: Optional[int] = None,
+    formato: Literal["pdf", "zip"] = "pdf",
+):
+    """
+    Recibos de todos los pagos con monto pagado que cumplen los filtros (p. ej.
+    los de un mes: ?mes=3&anno=2025). Se generan en paralelo en el pool de PDFs;
+    formato=pdf los une en un solo documento y formato=zip los envía en un ZIP
+    a medida que terminan (los fallidos se listan en errores.txt).
+    """
+    if contrato_id is None and (mes is None or anno is None):
+        raise HTTPException(status_code=400, detail="Indique mes y año, o un contrato")
+    try:
+        with SessionLocal() as db:
+            lista = recibos.cargar_recibos(db, mes=mes, anno=anno, contrato_id=contrato_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar recibos: {str(e)}")
+    if not lista:
+        raise HTTPException(status_code=404, detail="No hay pagos para los filtros indicados")
+    if len(lista) > procesos_pdf.PDF_LOTE_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote tiene {len(lista)} recibos; el máximo es {procesos_pdf.PDF_LOTE_MAX}",
+        )
+
+    if formato == "zip":
+        return StreamingResponse(
+            zip_en_flujo(_entradas_zip(lista)),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="recibos.zip"'},
+        )
+
+    try:
+        archivo, tamanno = _pdf_unido(lista)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar recibos: {str(e)}")
+    return StreamingResponse(
+        iterar_y_cerrar(archivo),
+        media_type="application/pdf",
+        headers={
+            "Content-Length": str(tamanno),
+            "Content-Disposition": 'attachment; filename="recibos.pdf"',
+        },
+    )
+
+
+@router.get("/{id}/recibo")
+def descargar_recibo(id: int, inline: bool = False):
+    """Recibo en PDF de un pago (application/pdf); se sirve desde la caché si no cambió."""
+    try:
+        with SessionLocal() as db:
+            datos = recibos.cargar_recibo(db, id)
+        if datos is None:
+            raise HTTPException(status_code=404, detail="Pago no encontrado")
+        archivo, tamanno, acierto = _archivo_recibo(datos)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar recibo: {str(e)}")
+
+    disposicion = "inline" if inline else "attachment"
+    return StreamingResponse(
+        iterar_y_cerrar(archivo),
+        media_type="application/pdf",
+        headers={
+            "Content-Length": str(tamanno),
+            "Content-Disposition": f'{disposicion}; filename="recibo-{id}.pdf"',
+            "X-Cache": "HIT" if acierto else "MISS",
+        },
+    )
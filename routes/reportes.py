@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+import reportes
+from security import get_current_user
+
+router = APIRouter(
+    prefix="/reportes",
+    tags=["Reportes"],
+    dependencies=[Depends(get_current_user)]  # 🔒 todos los endpoints requieren login
+)
+
+
+# ---------------------------------------------------------
+# Tablero del portafolio
+# ---------------------------------------------------------
+@router.get("/dashboard")
+def obtener_dashboard(
+    mes: Optional[int] = Query(None, ge=1, le=12),
+    anno: Optional[int] = Query(None, ge=2000, le=2100),
+):
+    """
+    Ocupación, ingresos esperados y cobrados del mes (por defecto el actual),
+    y morosidad acumulada. Se guarda en caché unos segundos.
+    """
+    try:
+        return reportes.dashboard(mes, anno)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar el tablero: {str(e)}")
@@ -1,8 +1,27 @@
-from fastapi import APIRouter
+import hmac
+from typing import Optional
+from decouple import config
+from fastapi import APIRouter, Depends, Header, HTTPException
 from tareas_recurrentes import generar_pagos_pendientes
+from recolector_fotos import recolectar_fotos
+from resumen_pagos import reconstruir as reconstruir_resumen_pagos
 
 router = APIRouter()
 
+CRON_SECRET = config("CRON_SECRET", default="")
+
+
+def verificar_cron(authorization: Optional[str] = Header(None)):
+    """
+    Vercel envía CRON_SECRET como 'Authorization: Bearer <secreto>'. Sin
+    CRON_SECRET configurado las tareas protegidas no se pueden ejecutar.
+    """
+    if not CRON_SECRET:
+        raise HTTPException(status_code=503, detail="CRON_SECRET no está configurado")
+    if not hmac.compare_digest(authorization or "", f"Bearer {CRON_SECRET}"):
+        raise HTTPException(status_code=401, detail="No autorizado")
+
+
 @router.get("/tareas/generar-pagos")
 def ejecutar_generacion_pagos():
     """
@@ -14,3 +33,29 @@ def ejecutar_generacion_pagos():
         return {"mensaje": "Tarea ejecutada correctamente"}
     except Exception as e:
         return {"error": str(e)}
+
+
+@router.get("/tareas/recolectar-fotos", dependencies=[Depends(verificar_cron)])
+def ejecutar_recolector_fotos(dry_run: bool = False):
+    """
+    Borra fotos sin vínculos y blobs sin uso (ver recolector_fotos.py).
+    Con dry_run=true solo informa cuánto se recuperaría.
+    """
+    try:
+        reporte = recolectar_fotos(dry_run=dry_run)
+        return {"mensaje": "Tarea ejecutada correctamente", **reporte}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/tareas/reconstruir-resumen-pagos", dependencies=[Depends(verificar_cron)])
+def ejecutar_reconstruir_resumen_pagos():
+    """
+    Recalcula toda la tabla resumen_pagos_mensual (ver resumen_pagos.py).
+    Corrige lo que haya cambiado en pagos_mensuales por fuera de la API.
+    """
+    try:
+        reporte = reconstruir_resumen_pagos()
+        return {"mensaje": "Tarea ejecutada correctamente", **reporte}
+    except Exception as e:
+        return {"error": str(e)}
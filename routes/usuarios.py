@@ -1,44 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
 from database import SessionLocal
 import models, schemas
-from security import make_password_hash, require_roles
+import hash_claves
+from security import aplicar_revocacion, invalidar_usuario, require_roles, revocar_sesiones
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
 # ---------------------------------------------------------
 # Registro público (nuevo usuario con rol "usuario")
 # ---------------------------------------------------------
+def _correo_registrado(correo: str) -> bool:
+    with SessionLocal() as db:
+        return db.query(models.Usuario.id).filter(models.Usuario.correo == correo).first() is not None
+
+
+def _insertar_registro(data: schemas.UsuarioCreate, salt: str, hashed: str):
+    with SessionLocal() as db:
+        nuevo = models.Usuario(
+            correo=data.correo,
+            clave_hash=hashed,
+            salt=salt,
+            nombre=data.nombre,
+            p_apellido=data.p_apellido,
+            s_apellido=data.s_apellido,
+            celular=data.celular,
+            rol=models.RolEnum("usuario"),
+            activo=True
+        )
+
+        db.add(nuevo)
+        db.commit()
+        db.refresh(nuevo)
+
+        # Convertir Enum a string antes de devolver
+        nuevo.rol = nuevo.rol.value
+        return nuevo
+
+
+# Asíncrona como el login: el hash se espera sin ocupar un hilo de peticiones
 @router.post("/registro", response_model=schemas.UsuarioResponse, status_code=201)
-def registro_publico(data: schemas.UsuarioCreate):
+async def registro_publico(data: schemas.UsuarioCreate, request: Request):
     try:
-        with SessionLocal() as db:
-            existente = db.query(models.Usuario).filter(models.Usuario.correo == data.correo).first()
-            if existente:
-                raise HTTPException(status_code=400, detail="El correo ya está registrado")
-
-            salt = uuid4().hex
-            hashed = make_password_hash(data.clave, salt)
-
-            nuevo = models.Usuario(
-                correo=data.correo,
-                clave_hash=hashed,
-                salt=salt,
-                nombre=data.nombre,
-                p_apellido=data.p_apellido,
-                s_apellido=data.s_apellido,
-                celular=data.celular,
-                rol=models.RolEnum("usuario"),
-                activo=True
-            )
-
-            db.add(nuevo)
-            db.commit()
-            db.refresh(nuevo)
-
-            # Convertir Enum a string antes de devolver
-            nuevo.rol = nuevo.rol.value
-            return nuevo
+        hash_claves.comprobar_intentos(hash_claves.ip_cliente(request))
+        if await run_in_threadpool(_correo_registrado, data.correo):
+            raise HTTPException(status_code=400, detail="El correo ya está registrado")
+
+        salt = uuid4().hex
+        hashed = await hash_claves.hashear(data.clave, salt)
+        return await run_in_threadpool(_insertar_registro, data, salt, hashed)
+    except hash_claves.DemasiadosIntentos as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except hash_claves.ColaClavesLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al registrar usuario: {str(e)}")
 
@@ -55,7 +72,7 @@ def crear_usuario(data: schemas.UsuarioCreate):
                 raise HTTPException(status_code=400, detail="El correo ya está registrado")
 
             salt = uuid4().hex
-            hashed = make_password_hash(data.clave, salt)
+            hashed = hash_claves.hashear_bloqueante(data.clave, salt)
 
             nuevo = models.Usuario(
                 correo=data.correo,
@@ -74,6 +91,8 @@ def crear_usuario(data: schemas.UsuarioCreate):
             db.refresh(nuevo)
             nuevo.rol = nuevo.rol.value
             return nuevo
+    except hash_claves.ColaClavesLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear usuario: {str(e)}")
 
@@ -128,6 +147,7 @@ def actualizar_usuario(usuario_id: int, data: schemas.UsuarioUpdate):
                 user.s_apellido = data.s_apellido
             if data.celular is not None:
                 user.celular = data.celular
+            rol_anterior, activo_anterior = user.rol, user.activo
             if data.rol is not None:
                 user.rol = models.RolEnum(data.rol)
             if data.activo is not None:
@@ -135,12 +155,22 @@ def actualizar_usuario(usuario_id: int, data: schemas.UsuarioUpdate):
             if data.clave:
                 salt = uuid4().hex
                 user.salt = salt
-                user.clave_hash = make_password_hash(data.clave, salt)
+                user.clave_hash = hash_claves.hashear_bloqueante(data.clave, salt)
+
+            # Los tokens emitidos llevan rol y estado: si cambian (o la clave), dejan de valer
+            revocar = user.rol != rol_anterior or user.activo != activo_anterior or bool(data.clave)
+            if revocar:
+                revocar_sesiones(db, user)
 
             db.commit()
+            invalidar_usuario(user.correo)
+            if revocar:
+                aplicar_revocacion(user.id, user.token_version)
             db.refresh(user)
             user.rol = user.rol.value
             return user
+    except hash_claves.ColaClavesLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar usuario: {str(e)}")
 
@@ -155,8 +185,11 @@ def eliminar_usuario(usuario_id: int):
             user = db.query(models.Usuario).get(usuario_id)
             if not user:
                 raise HTTPException(status_code=404, detail="Usuario no encontrado")
+            correo, version = user.correo, (user.token_version or 0) + 1
             db.delete(user)
             db.commit()
+            invalidar_usuario(correo)
+            aplicar_revocacion(usuario_id, version)
             return
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar usuario: {str(e)}")
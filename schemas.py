@@ -17,15 +17,73 @@ class FotoCreate(FotoBase):
     base64_parte2: Optional[str] = None
 
 
+class FotoLoteCreate(FotoCreate):
+    detalle: Optional[str] = None  # se guarda en la columna de detalle del vínculo
+
+
+class FotoLoteResponse(BaseModel):
+    ids: List[int]
+
+
 class FotoResponse(FotoBase):
     id: int
     base64_parte1: Optional[str]
     base64_parte2: Optional[str]
+    hash_parte1: Optional[str] = None
+    hash_parte2: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class FotoMetadataResponse(FotoBase):
+    id: int
+    hash_parte1: Optional[str] = None
+    hash_parte2: Optional[str] = None
+    tamanno_parte1: Optional[int] = None
+    tamanno_parte2: Optional[int] = None
 
     class Config:
         orm_mode = True
 
 
+class FotoListadoResponse(FotoMetadataResponse):
+    miniatura_parte1: Optional[str] = None
+    miniatura_parte2: Optional[str] = None
+    base64_parte1: Optional[str] = None
+    base64_parte2: Optional[str] = None
+
+
+class CargaFotoCreate(BaseModel):
+    tamanno_total: int
+    hash_sha256: Optional[str] = None  # si se envía, se verifica al finalizar
+
+
+class CargaFotoEstado(BaseModel):
+    id: str
+    tamanno_total: int
+    recibido: int
+    completa: bool
+
+
+class CargaFotoFinalizar(BaseModel):
+    contexto: Optional[str] = None
+    id_carga_parte2: Optional[str] = None
+    # Vínculo opcional: apartamento | contrato | inquilino | pago
+    tipo: Optional[str] = None
+    id_entidad: Optional[str] = None
+    detalle: Optional[str] = None
+
+
+class EstadisticasAlmacenamientoResponse(BaseModel):
+    blobs: int
+    normalizados: int
+    bytes_originales: int
+    bytes_almacenados: int
+    bytes_ahorrados: int
+    factor_reduccion: Optional[float] = None
+
+
 # ---------------------------------------------------------
 # APARTAMENTO
 # ---------------------------------------------------------
@@ -191,6 +249,15 @@ class PagoMensualResponse(PagoMensualBase):
         orm_mode = True
 
 
+class PagoMensualLote(BaseModel):
+    pagos: List[PagoMensualCreate]
+
+
+class PagoMensualLoteResponse(BaseModel):
+    pagos: List[PagoMensualResponse]
+    cargos_actualizados: int
+
+
 
 
 
@@ -249,6 +316,13 @@ class DevolucionDepositoResponse(DevolucionDepositoBase):
         orm_mode = True
 
 
+class DevolucionFotoLoteItem(BaseModel):
+    contrato_id: int
+    inquilino_cedula: str
+    fecha_devolucion: datetime
+    foto: FotoCreate
+
+
 # ---------------------------------------------------------
 # RESPUESTAS ANIDADAS (para listar con detalle)
 # ---------------------------------------------------------
@@ -258,6 +332,22 @@ class ContratoDetalleResponse(ContratoResponse):
     montos: Optional[List[MontoActualResponse]] = None
     devoluciones: Optional[List[DevolucionDepositoResponse]] = None
 
+
+# ---------------------------------------------------------
+# PDF DE CONTRATOS EN LOTE
+# ---------------------------------------------------------
+
+class ContratoPDFLoteItem(BaseModel):
+    # Mismos datos que el cuerpo de POST /contratos/{id}/pdf
+    id: int
+    propietarios: List[dict]
+    fincaInfo: str
+    inquilinos: List[dict]
+
+
+class ContratoPDFLote(BaseModel):
+    contratos: List[ContratoPDFLoteItem]
+
 from typing import Literal
 from pydantic import BaseModel, EmailStr, Field
 
@@ -292,6 +382,10 @@ class LoginRequest(BaseModel):
     correo: EmailStr
     clave: str
 
+class RefreshRequest(BaseModel):
+    # Clientes sin cookies; en el navegador viaja en la cookie 'refresh_token'
+    refresh_token: str | None = None
+
 class TokenData(BaseModel):
     sub: str
     rol: str
@@ -1,6 +1,7 @@
 import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from uuid import uuid4
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -9,15 +10,25 @@ from sqlalchemy.orm import Session
 
 from database import get_db
 import models
+from cache_ttl import CacheTTL
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# Los tokens de acceso se validan sin consultar la base de datos: su vida corta
+# acota lo que tarda en notarse un cambio hecho desde otro proceso
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+REVOCADOS_MAX = int(os.getenv("REVOCADOS_MAX", "10000"))
+# Usuarios autenticados en memoria por 'sub' (0 = sin caché)
+USUARIO_CACHE_TTL = float(os.getenv("USUARIO_CACHE_TTL", "30"))
+USUARIO_CACHE_MAX = int(os.getenv("USUARIO_CACHE_MAX", "1024"))
 
 import hashlib
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Al subir BCRYPT_ROUNDS los hashes anteriores se actualizan en el siguiente login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def make_password_hash(plain_password: str, salt: str) -> str:
     # Mezclamos password y salt en una forma corta antes de pasar a bcrypt
@@ -28,6 +39,11 @@ def verify_password(plain_password: str, salt: str, hashed_password: str) -> boo
     combined = hashlib.sha256((plain_password + salt).encode()).hexdigest()
     return pwd_context.verify(combined, hashed_password)
 
+def verify_and_update_password(plain_password: str, salt: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Como verify_password, pero si el hash usa parámetros anteriores devuelve también el nuevo."""
+    combined = hashlib.sha256((plain_password + salt).encode()).hexdigest()
+    return pwd_context.verify_and_update(combined, hashed_password)
+
 
 def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> str:
     to_encode = data.copy()
@@ -38,6 +54,130 @@ def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> st
 def get_user_by_correo(db: Session, correo: str) -> Optional[models.Usuario]:
     return db.query(models.Usuario).filter(models.Usuario.correo == correo).first()
 
+# ======================================================
+# Tokens de acceso y de renovación
+# ======================================================
+class Principal:
+    """Usuario autenticado reconstruido desde los datos del token de acceso."""
+    __slots__ = ("id", "correo", "rol", "activo", "token_version")
+
+    def __init__(self, id: int, correo: str, rol: models.RolEnum, activo: bool, token_version: int):
+        self.id = id
+        self.correo = correo
+        self.rol = rol
+        self.activo = activo
+        self.token_version = token_version
+
+
+def crear_token_acceso(user: models.Usuario) -> str:
+    """Lleva todo lo que la autorización necesita: get_current_user no consulta la base de datos."""
+    return create_access_token({
+        "typ": "access",
+        "sub": user.correo,
+        "uid": user.id,
+        "rol": user.rol.value,
+        "act": user.activo,
+        "ver": user.token_version or 0,
+    })
+
+
+def crear_refresh_token(db: Session, user: models.Usuario) -> str:
+    """Registra el token en refresh_tokens (el llamador confirma) y devuelve el JWT."""
+    jti = uuid4().hex
+    expira = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    # Los tokens ya vencidos del usuario se limpian aquí, sin tarea aparte
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.usuario_id == user.id,
+        models.RefreshToken.expira_en < datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    db.add(models.RefreshToken(
+        jti=jti,
+        usuario_id=user.id,
+        token_version=user.token_version or 0,
+        expira_en=expira.replace(tzinfo=None),
+    ))
+    return jwt.encode({"typ": "refresh", "sub": str(user.id), "jti": jti, "exp": expira}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def leer_refresh_token(token: str) -> Optional[str]:
+    """'jti' de un refresh token con firma válida, vigente y no revocado en este proceso."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    jti = payload.get("jti")
+    if payload.get("typ") != "refresh" or not jti or _refresh_revocados.obtener(jti):
+        return None
+    return jti
+
+
+def usar_refresh_token(db: Session, jti: str) -> Optional[models.Usuario]:
+    """
+    Revoca el token (cada uno sirve una sola vez: se rota en cada renovación) y
+    devuelve su usuario si seguía válido. La revocación es condicional, así que
+    de dos renovaciones simultáneas con el mismo token solo una lo consigue.
+    """
+    ahora = datetime.utcnow()
+    registro = db.get(models.RefreshToken, jti)
+    if registro is None or registro.revocado_en is not None or registro.expira_en <= ahora:
+        return None
+    user = db.get(models.Usuario, registro.usuario_id)
+    if not user or not user.activo or registro.token_version != (user.token_version or 0):
+        return None
+    usado = db.query(models.RefreshToken).filter(
+        models.RefreshToken.jti == jti, models.RefreshToken.revocado_en.is_(None)
+    ).update({models.RefreshToken.revocado_en: ahora}, synchronize_session=False)
+    if usado != 1:
+        return None
+    return user
+
+
+def revocar_refresh_token(db: Session, jti: str) -> None:
+    """Cierre de sesión: el llamador confirma y luego llama a aplicar_revocacion_refresh."""
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.jti == jti, models.RefreshToken.revocado_en.is_(None)
+    ).update({models.RefreshToken.revocado_en: datetime.utcnow()}, synchronize_session=False)
+
+
+def revocar_sesiones(db: Session, user: models.Usuario) -> None:
+    """
+    Invalida todos los tokens del usuario: sube token_version y revoca sus
+    refresh tokens. Tras confirmar, llamar a aplicar_revocacion(user.id, user.token_version).
+    """
+    user.token_version = (user.token_version or 0) + 1
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.usuario_id == user.id, models.RefreshToken.revocado_en.is_(None)
+    ).update({models.RefreshToken.revocado_en: datetime.utcnow()}, synchronize_session=False)
+
+# ------------------------------------------------------
+# Revocaciones en memoria
+# ------------------------------------------------------
+# Versión mínima aceptada por usuario: basta guardarla mientras viva un token de
+# acceso, después los anteriores ya vencieron. Los refresh tokens revocados se
+# recuerdan también para rechazarlos sin consultar la base de datos.
+_versiones_minimas = CacheTTL(ACCESS_TOKEN_EXPIRE_MINUTES * 60, REVOCADOS_MAX)
+_refresh_revocados = CacheTTL(REFRESH_TOKEN_EXPIRE_DAYS * 86400, REVOCADOS_MAX)
+
+def aplicar_revocacion(usuario_id: int, version_minima: int) -> None:
+    _versiones_minimas.guardar(usuario_id, version_minima)
+
+def aplicar_revocacion_refresh(jti: str) -> None:
+    _refresh_revocados.guardar(jti, True)
+
+# ======================================================
+# Caché de usuarios autenticados
+# ======================================================
+# Solo guarda usuarios activos, ya desligados de su sesión (solo lectura).
+# Quien modifique o borre un usuario debe llamar a invalidar_usuario; en otros
+# procesos el cambio se aplica cuando vence la entrada (USUARIO_CACHE_TTL).
+_usuarios = CacheTTL(USUARIO_CACHE_TTL, USUARIO_CACHE_MAX)
+
+def invalidar_usuario(correo: str) -> None:
+    _usuarios.invalidar(correo)
+
+def estadisticas_cache_usuarios() -> dict:
+    return _usuarios.estadisticas()
+
 # ======================================================
 # Función para obtener el usuario actual (cookie o header)
 # ======================================================
@@ -61,17 +201,41 @@ def get_current_user(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         correo = payload.get("sub")
-        if correo is None:
+        if correo is None or payload.get("typ") == "refresh":
             raise HTTPException(status_code=401, detail="Token inválido")
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
-    user = db.query(models.Usuario).filter(models.Usuario.correo == correo).first()
-    if not user or not user.activo:
-        raise HTTPException(status_code=401, detail="Usuario no autorizado")
+    if payload.get("typ") == "access":
+        return _principal(payload)
+
+    # Tokens emitidos antes de los tokens de acceso (sin 'typ'): se busca el usuario
+    user = _usuarios.obtener(correo)
+    if user is None:
+        user = get_user_by_correo(db, correo)
+        if not user or not user.activo:
+            raise HTTPException(status_code=401, detail="Usuario no autorizado")
+        db.expunge(user)
+        _usuarios.guardar(correo, user)
 
     return user
 
+def _principal(payload: dict) -> Principal:
+    try:
+        principal = Principal(
+            id=int(payload["uid"]),
+            correo=payload["sub"],
+            rol=models.RolEnum(payload["rol"]),
+            activo=bool(payload["act"]),
+            token_version=int(payload["ver"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Token inválido")
+    minima = _versiones_minimas.obtener(principal.id)
+    if not principal.activo or (minima is not None and principal.token_version < minima):
+        raise HTTPException(status_code=401, detail="Usuario no autorizado")
+    return principal
+
 def require_roles(*roles_permitidos: str):
     def checker(user: models.Usuario = Depends(get_current_user)):
         if user.rol.value not in roles_permitidos:
@@ -0,0 +1,516 @@
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Iterable, Optional
+
+from decouple import config
+from sqlalchemy import and_, insert, func, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+import imagenes
+from database import SessionLocal
+from almacenamiento import get_almacenamiento, BlobNoEncontrado, BlobDemasiadoGrande, HashNoCoincide
+from imagenes import detectar_tipo_contenido
+
+PARTES = (1, 2)
+FOTO_MAX_BYTES = config("FOTO_MAX_BYTES", default=15 * 1024 * 1024, cast=int)
+CARGA_MAX_BLOQUE = config("CARGA_MAX_BLOQUE", default=4 * 1024 * 1024, cast=int)
+FOTOS_LOTE_MAX = config("FOTOS_LOTE_MAX", default=50, cast=int)
+
+# ---------------------------------------------------------
+# Decodificación de las partes base64 heredadas
+# ---------------------------------------------------------
+def _b64(texto: Optional[str]) -> Optional[bytes]:
+    if not texto:
+        return None
+    if texto.startswith("data:") and "," in texto:
+        texto = texto.split(",", 1)[1]
+    return base64.b64decode(texto, validate=False)
+
+
+def decodificar_partes(parte1: Optional[str], parte2: Optional[str]) -> list[Optional[bytes]]:
+    """
+    Cada parte es normalmente una imagen independiente (frente y reverso de la
+    cédula). Si la parte 1 no es base64 válido por sí sola, se asume que ambas
+    son mitades de una misma imagen y se decodifican concatenadas.
+    """
+    try:
+        data1, data2 = _b64(parte1), _b64(parte2)
+    except (binascii.Error, ValueError):
+        if parte1 and parte2:
+            return [_b64(parte1 + parte2), None]
+        raise ValueError("Contenido base64 inválido")
+    # Corte justo en múltiplo de 4: la segunda parte no tiene cabecera de imagen propia
+    if data1 and data2 and detectar_tipo_contenido(data2[:16]) == "application/octet-stream" \
+            and detectar_tipo_contenido(data1[:16]) != "application/octet-stream":
+        return [data1 + data2, None]
+    return [data1, data2]
+
+
+# ---------------------------------------------------------
+# Registro de blobs en la base de datos
+# ---------------------------------------------------------
+def _insert_dialecto(db: Session, modelo):
+    dialecto = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    return dialecto.insert(modelo)
+
+
+def _insertar_ignorando(db: Session, modelo, valores, claves: list[str]) -> None:
+    """INSERT ... ON CONFLICT DO NOTHING de una fila (dict) o de varias (lista, executemany)."""
+    sentencia = _insert_dialecto(db, modelo).on_conflict_do_nothing(index_elements=claves)
+    if isinstance(valores, dict):
+        db.execute(sentencia.values(**valores))
+    elif valores:
+        db.execute(sentencia, valores)
+
+
+def registrar_blobs(db: Session, filas: list[dict]) -> None:
+    """
+    Registra blobs (hash, tamanno, tipo_contenido, tamanno_original). Si ya
+    existían solo se completa el tamaño original: el callback de variantes
+    puede registrar el origen antes de que se confirme la subida.
+    """
+    if not filas:
+        return
+    sentencia = _insert_dialecto(db, models.Blob)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=["hash"],
+        set_={"tamanno_original": func.coalesce(models.Blob.tamanno_original,
+                                                sentencia.excluded.tamanno_original)},
+    )
+    db.execute(sentencia, filas)
+
+
+def registrar_blob(db: Session, hash_hex: str, tamanno: int, tipo_contenido: str,
+                   tamanno_original: Optional[int] = None) -> None:
+    registrar_blobs(db, [{"hash": hash_hex, "tamanno": tamanno, "tipo_contenido": tipo_contenido,
+                          "tamanno_original": tamanno_original}])
+
+
+def _fila_blob(resultado: dict) -> dict:
+    return {
+        "hash": resultado["hash"],
+        "tamanno": resultado["tamanno"],
+        "tipo_contenido": resultado["tipo_contenido"],
+        "tamanno_original": resultado["tamanno_original"],
+    }
+
+
+def guardar_contenido(db: Session, data: bytes) -> tuple[str, int]:
+    """Normaliza el contenido en el pool de imágenes, lo guarda y registra el blob."""
+    resultado = imagenes.procesar_ingesta(data)[0]
+    registrar_blobs(db, [_fila_blob(resultado)])
+    return resultado["hash"], resultado["tamanno"]
+
+
+def guardar_bloques(db: Session, bloques: Iterable[bytes], limite: int = FOTO_MAX_BYTES,
+                    hash_esperado: Optional[str] = None) -> tuple[str, int]:
+    """
+    Copia los bloques a un temporal (nunca más de un bloque en memoria) y el
+    worker lo normaliza desde ahí; el original no llega al almacenamiento.
+    Lanza BlobDemasiadoGrande si se supera el límite y HashNoCoincide si el
+    SHA-256 del contenido recibido no es el esperado.
+    """
+    fd, ruta = tempfile.mkstemp(prefix="subida-")
+    try:
+        sha = hashlib.sha256()
+        total = 0
+        with os.fdopen(fd, "wb") as tmp:
+            for bloque in bloques:
+                total += len(bloque)
+                if total > limite:
+                    raise BlobDemasiadoGrande(limite)
+                sha.update(bloque)
+                tmp.write(bloque)
+        if hash_esperado and sha.hexdigest() != hash_esperado.lower():
+            raise HashNoCoincide(hash_esperado, sha.hexdigest())
+        return guardar_ruta(db, ruta)
+    finally:
+        os.remove(ruta)
+
+
+def guardar_ruta(db: Session, ruta: str) -> tuple[str, int]:
+    """Normaliza y registra un archivo temporal ya recibido (y ya limitado en tamaño); no lo borra."""
+    resultado = imagenes.procesar_ingesta(ruta)[0]
+    registrar_blobs(db, [_fila_blob(resultado)])
+    return resultado["hash"], resultado["tamanno"]
+
+
+def asignar_parte(foto: models.Foto, parte: int, hash_hex: Optional[str], tamanno: Optional[int]) -> None:
+    setattr(foto, f"hash_parte{parte}", hash_hex)
+    setattr(foto, f"tamanno_parte{parte}", tamanno)
+
+
+# ---------------------------------------------------------
+# Variantes (miniatura / mediana / pdf) generadas en el pool de procesos
+# ---------------------------------------------------------
+def registrar_variantes(db: Session, resultado: dict) -> None:
+    # El origen puede no estar confirmado aún por la transacción que lo subió
+    registrar_blob(db, resultado["hash_origen"], resultado["tamanno_origen"], resultado["tipo_origen"])
+    for v in resultado["variantes"]:
+        registrar_blob(db, v["hash"], v["tamanno"], "image/jpeg")
+        _insertar_ignorando(
+            db, models.BlobVariante,
+            {"hash_origen": resultado["hash_origen"], "variante": v["variante"],
+             "hash": v["hash"], "ancho": v["ancho"], "alto": v["alto"]},
+            ["hash_origen", "variante"],
+        )
+
+
+def _al_terminar_variantes(futuro) -> None:
+    try:
+        resultado = futuro.result()
+        with SessionLocal() as db:
+            registrar_variantes(db, resultado)
+            db.commit()
+    except BrokenProcessPool as e:
+        # Sin reintento: se generan bajo demanda, ya en un pool nuevo
+        imagenes._descartar_pool()
+        print("⚠️ Pool de imágenes caído, no se generaron variantes:", e)
+    except Exception as e:
+        print("⚠️ No se pudieron generar variantes:", e)
+
+
+def _es_imagen_almacenada(hash_hex: str) -> bool:
+    """Por la firma de los primeros bytes: los PDF y otros documentos no tienen variantes."""
+    try:
+        cabecera = b"".join(get_almacenamiento().leer_bloques(hash_hex, 0, 15))
+    except BlobNoEncontrado:
+        return False
+    return imagenes.es_imagen(detectar_tipo_contenido(cabecera))
+
+
+def programar_variantes(*hashes: Optional[str]) -> None:
+    """Encola la generación de variantes sin bloquear el hilo de la petición."""
+    for hash_hex in hashes:
+        if not hash_hex or not _es_imagen_almacenada(hash_hex):
+            continue
+        try:
+            imagenes.enviar_variantes(hash_hex).add_done_callback(_al_terminar_variantes)
+        except Exception as e:
+            # Las variantes se generan bajo demanda si el pool no está disponible
+            print("⚠️ No se pudieron programar variantes:", e)
+
+
+def hash_variante(db: Session, hash_origen: str, variante: str) -> str:
+    """
+    Hash del blob de la variante pedida; si aún no existe se genera y se espera.
+    Lanza imagenes.NoEsImagen si el origen no es una imagen.
+    """
+    if variante == imagenes.VARIANTE_ORIGINAL:
+        return hash_origen
+    fila = (
+        db.query(models.BlobVariante)
+        .filter(models.BlobVariante.hash_origen == hash_origen,
+                models.BlobVariante.variante == variante)
+        .first()
+    )
+    if fila:
+        return fila.hash
+    try:
+        resultado = imagenes.enviar_variantes(hash_origen).result()
+    except BrokenProcessPool:
+        # Un worker muerto deja el pool roto para siempre: uno nuevo y un solo reintento
+        imagenes._descartar_pool()
+        try:
+            resultado = imagenes.enviar_variantes(hash_origen).result()
+        except BrokenProcessPool:
+            imagenes._descartar_pool()
+            raise
+    registrar_variantes(db, resultado)
+    db.commit()
+    return next(v["hash"] for v in resultado["variantes"] if v["variante"] == variante)
+
+
+# ---------------------------------------------------------
+# Creación y lectura de fotos
+# ---------------------------------------------------------
+def crear_foto(db: Session, contexto: Optional[str], base64_parte1: Optional[str] = None,
+               base64_parte2: Optional[str] = None) -> models.Foto:
+    """Guarda las partes en el almacenamiento y agrega la Foto (solo metadatos) a la sesión."""
+    foto = models.Foto(contexto=contexto)
+    for parte, data in zip(PARTES, decodificar_partes(base64_parte1, base64_parte2)):
+        if data:
+            asignar_parte(foto, parte, *guardar_contenido(db, data))
+    db.add(foto)
+    programar_variantes(foto.hash_parte1, foto.hash_parte2)
+    return foto
+
+
+def crear_foto_desde_rutas(db: Session, contexto: Optional[str], ruta1: str,
+                           ruta2: Optional[str] = None) -> models.Foto:
+    foto = models.Foto(contexto=contexto)
+    for parte, ruta in zip(PARTES, (ruta1, ruta2)):
+        if ruta is not None:
+            asignar_parte(foto, parte, *guardar_ruta(db, ruta))
+    db.add(foto)
+    programar_variantes(foto.hash_parte1, foto.hash_parte2)
+    return foto
+
+
+# ---------------------------------------------------------
+# Subidas reanudables: sesión + bloques por desplazamiento
+# ---------------------------------------------------------
+class CargaIncompleta(Exception):
+    def __init__(self, recibido: int, total: int):
+        super().__init__(f"Carga incompleta: {recibido} de {total} bytes recibidos")
+
+
+def crear_carga(db: Session, tamanno_total: int, hash_esperado: Optional[str] = None) -> models.CargaFoto:
+    if tamanno_total <= 0:
+        raise ValueError("El tamaño total debe ser mayor que cero")
+    if tamanno_total > FOTO_MAX_BYTES:
+        raise BlobDemasiadoGrande(FOTO_MAX_BYTES)
+    carga = models.CargaFoto(id=uuid.uuid4().hex, tamanno_total=tamanno_total, hash_esperado=hash_esperado)
+    db.add(carga)
+    return carga
+
+
+def estado_carga(carga: models.CargaFoto) -> dict:
+    """Forma de schemas.CargaFotoEstado; lo recibido se lee del almacenamiento."""
+    recibido = get_almacenamiento().tamanno_parcial(carga.id)
+    return {
+        "id": carga.id,
+        "tamanno_total": carga.tamanno_total,
+        "recibido": recibido,
+        "completa": recibido == carga.tamanno_total,
+    }
+
+
+def escribir_bloque(db: Session, carga: models.CargaFoto, inicio: int, data: bytes) -> dict:
+    """Lanza DesplazamientoInvalido si el bloque deja un hueco y BlobDemasiadoGrande si se pasa del total."""
+    if inicio < 0 or inicio + len(data) > carga.tamanno_total:
+        raise BlobDemasiadoGrande(carga.tamanno_total)
+    get_almacenamiento().escribir_parcial(carga.id, inicio, data)
+    carga.actualizado_en = datetime.utcnow()
+    return estado_carga(carga)
+
+
+def finalizar_cargas(db: Session, contexto: Optional[str], carga1: models.CargaFoto,
+                     carga2: Optional[models.CargaFoto] = None) -> models.Foto:
+    """
+    Verifica el hash de cada carga completa, crea la Foto y borra las sesiones.
+    Si el hash no coincide se descarta lo recibido para que el cliente reinicie.
+    Los bloques parciales se borran con eliminar_contenido_cargas tras confirmar.
+    """
+    almacenamiento = get_almacenamiento()
+    foto = models.Foto(contexto=contexto)
+    for parte, carga in zip(PARTES, (carga1, carga2)):
+        if carga is None:
+            continue
+        recibido = almacenamiento.tamanno_parcial(carga.id)
+        if recibido != carga.tamanno_total:
+            raise CargaIncompleta(recibido, carga.tamanno_total)
+        try:
+            asignar_parte(foto, parte, *guardar_bloques(
+                db, almacenamiento.leer_parcial(carga.id), hash_esperado=carga.hash_esperado
+            ))
+        except HashNoCoincide:
+            almacenamiento.eliminar_parcial(carga.id)
+            raise
+        db.delete(carga)
+    db.add(foto)
+    programar_variantes(foto.hash_parte1, foto.hash_parte2)
+    return foto
+
+
+def eliminar_contenido_cargas(*ids_carga: Optional[str]) -> None:
+    for id_carga in ids_carga:
+        if id_carga:
+            get_almacenamiento().eliminar_parcial(id_carga)
+
+
+# ---------------------------------------------------------
+# Inserción en lote y vínculos con las entidades
+# ---------------------------------------------------------
+# tipo -> (modelo de enlace, columna de la entidad, columna de detalle)
+ENLACES = {
+    "apartamento": (models.ApartamentoFoto, "id_apto", "descripcion"),
+    "contrato": (models.ContratoFoto, "id_contrato", "detalle"),
+    "inquilino": (models.InquilinoFoto, "cedula_inquilino", "contexto"),
+    "pago": (models.PagoFoto, "id_pago", "detalle"),
+}
+
+
+def insertar_fotos(db: Session, fotos: list) -> list[int]:
+    """
+    Guarda el contenido de todas las fotos (objetos con contexto y base64_parte1/2)
+    y las inserta con un solo INSERT ... RETURNING. Devuelve los ids en el mismo
+    orden de entrada. No confirma la transacción.
+    """
+    if not fotos:
+        return []
+    decodificadas = [decodificar_partes(f.base64_parte1, f.base64_parte2) for f in fotos]
+    # Todas las partes se normalizan en paralelo en el pool
+    resultados = iter(imagenes.procesar_ingesta(*[d for partes in decodificadas for d in partes if d]))
+
+    filas, blobs = [], {}
+    for f, partes in zip(fotos, decodificadas):
+        fila = {"contexto": f.contexto}
+        for parte, data in zip(PARTES, partes):
+            hash_hex = tamanno = None
+            if data:
+                resultado = next(resultados)
+                hash_hex, tamanno = resultado["hash"], resultado["tamanno"]
+                blobs[hash_hex] = _fila_blob(resultado)
+            fila[f"hash_parte{parte}"] = hash_hex
+            fila[f"tamanno_parte{parte}"] = tamanno
+        filas.append(fila)
+
+    registrar_blobs(db, list(blobs.values()))
+    ids = db.scalars(
+        insert(models.Foto).returning(models.Foto.id, sort_by_parameter_order=True), filas
+    ).all()
+    programar_variantes(*blobs.keys())
+    return list(ids)
+
+
+# tipo -> (modelo de la entidad vinculada)
+ENTIDADES = {
+    "apartamento": models.Apartamento,
+    "contrato": models.Contrato,
+    "inquilino": models.Inquilino,
+    "pago": models.PagoMensual,
+}
+
+
+def clave_entidad(tipo: str, id_entidad):
+    """Convierte el id recibido como texto al tipo de la clave primaria de la entidad."""
+    clave = ENTIDADES[tipo].__table__.primary_key.columns[0]
+    return clave.type.python_type(id_entidad)
+
+
+def vincular_fotos(db: Session, tipo: str, id_entidad, ids_foto: list[int],
+                   detalles: Optional[list[Optional[str]]] = None) -> None:
+    """Inserta todos los vínculos entidad-foto en una sola sentencia."""
+    if not ids_foto:
+        # Con una lista vacía el INSERT se emitiría como DEFAULT VALUES
+        return
+    modelo, columna, columna_detalle = ENLACES[tipo]
+    detalles = detalles or [None] * len(ids_foto)
+    db.execute(insert(modelo), [
+        {columna: id_entidad, "id_foto": id_foto, columna_detalle: detalle}
+        for id_foto, detalle in zip(ids_foto, detalles)
+    ])
+
+
+def leer_parte(foto: models.Foto, parte: int) -> Optional[bytes]:
+    """Bytes de la parte indicada, desde el almacenamiento o desde la columna heredada."""
+    hash_hex = getattr(foto, f"hash_parte{parte}", None)
+    if hash_hex:
+        try:
+            return get_almacenamiento().leer(hash_hex)
+        except BlobNoEncontrado:
+            return None
+    legado = getattr(foto, f"base64_parte{parte}", None)
+    return _b64(legado) if legado else None
+
+
+def base64_parte(foto: models.Foto, parte: int) -> Optional[str]:
+    if not getattr(foto, f"hash_parte{parte}", None):
+        return getattr(foto, f"base64_parte{parte}", None)
+    data = leer_parte(foto, parte)
+    return base64.b64encode(data).decode("ascii") if data is not None else None
+
+
+def url_blob(hash_hex: str) -> str:
+    return f"/fotos/blob/{hash_hex}"
+
+
+def _url_parte(foto: models.Foto, parte: int, variante: str, variantes: dict,
+               no_imagenes: set) -> Optional[str]:
+    hash_origen = getattr(foto, f"hash_parte{parte}", None)
+    if hash_origen in no_imagenes:
+        return None
+    if hash_origen and (hash_origen, variante) in variantes:
+        return url_blob(variantes[(hash_origen, variante)])
+    if not hash_origen and not getattr(foto, f"legado_parte{parte}", False):
+        return None
+    # Variante aún no generada (o foto sin migrar): se resuelve bajo demanda
+    return f"/fotos/{foto.id}/imagen?parte={parte}&variante={variante}"
+
+
+def fotos_listado(db: Session, fotos: list[models.Foto], contenido: bool = False) -> list[dict]:
+    """
+    Forma de schemas.FotoListadoResponse: metadatos y referencia a la miniatura.
+    Las miniaturas ya generadas se resuelven en una sola consulta y apuntan a la
+    URL inmutable del blob; las partes que no son imágenes (PDF) no tienen.
+    """
+    hashes = {h for f in fotos for h in (f.hash_parte1, f.hash_parte2) if h}
+    variantes = {}
+    no_imagenes = set()
+    if hashes:
+        filas = (
+            db.query(models.Blob.hash, models.Blob.tipo_contenido, models.BlobVariante.hash)
+            .outerjoin(models.BlobVariante, and_(models.BlobVariante.hash_origen == models.Blob.hash,
+                                                 models.BlobVariante.variante == "miniatura"))
+            .filter(models.Blob.hash.in_(hashes))
+            .all()
+        )
+        for hash_origen, tipo_contenido, hash_miniatura in filas:
+            if not imagenes.es_imagen(tipo_contenido):
+                no_imagenes.add(hash_origen)
+            elif hash_miniatura:
+                variantes[(hash_origen, "miniatura")] = hash_miniatura
+
+    return [
+        {
+            "id": foto.id,
+            "contexto": foto.contexto,
+            "hash_parte1": foto.hash_parte1,
+            "hash_parte2": foto.hash_parte2,
+            "tamanno_parte1": foto.tamanno_parte1,
+            "tamanno_parte2": foto.tamanno_parte2,
+            "miniatura_parte1": _url_parte(foto, 1, "miniatura", variantes, no_imagenes),
+            "miniatura_parte2": _url_parte(foto, 2, "miniatura", variantes, no_imagenes),
+            "base64_parte1": base64_parte(foto, 1) if contenido else None,
+            "base64_parte2": base64_parte(foto, 2) if contenido else None,
+        }
+        for foto in fotos
+    ]
+
+
+def foto_respuesta(foto: models.Foto) -> dict:
+    """Forma compatible con schemas.FotoResponse (incluye el contenido en base64)."""
+    return {
+        "id": foto.id,
+        "contexto": foto.contexto,
+        "hash_parte1": foto.hash_parte1,
+        "hash_parte2": foto.hash_parte2,
+        "base64_parte1": base64_parte(foto, 1),
+        "base64_parte2": base64_parte(foto, 2),
+    }
+
+
+# ---------------------------------------------------------
+# Reporte de ahorro por normalización
+# ---------------------------------------------------------
+def estadisticas_almacenamiento(db: Session) -> dict:
+    """Bytes recibidos frente a bytes guardados de los blobs subidos (sin contar variantes)."""
+    originales = func.coalesce(func.sum(func.coalesce(models.Blob.tamanno_original, models.Blob.tamanno)), 0)
+    almacenados = func.coalesce(func.sum(models.Blob.tamanno), 0)
+    blobs, normalizados, bytes_originales, bytes_almacenados = (
+        db.query(
+            func.count(models.Blob.hash),
+            func.count(models.Blob.tamanno_original),
+            originales,
+            almacenados,
+        )
+        .filter(~exists().where(models.BlobVariante.hash == models.Blob.hash))
+        .one()
+    )
+    return {
+        "blobs": blobs,
+        "normalizados": normalizados,
+        "bytes_originales": int(bytes_originales),
+        "bytes_almacenados": int(bytes_almacenados),
+        "bytes_ahorrados": int(bytes_originales) - int(bytes_almacenados),
+        "factor_reduccion": round(bytes_originales / bytes_almacenados, 2) if bytes_almacenados else None,
+    }
@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import extract
 from models import Contrato, PagoMensual, TipoPagoEnum, ContratoInquilino
 from database import SessionLocal
+import reportes
+import resumen_pagos
 
 def generar_pagos_pendientes():
     print("entra al metodo de generar pagos pendientes")
@@ -11,6 +13,7 @@ def generar_pagos_pendientes():
 
     with SessionLocal() as db:
         contratos_activos = db.query(Contrato).filter(Contrato.estado == 1).all()
+        meses = {(contrato.id, hoy.year, hoy.month) for contrato in contratos_activos}
 
         for contrato in contratos_activos:
             if not contrato.dia_pago_mes:
@@ -245,3 +248,10 @@ def generar_pagos_pendientes():
                             )
                             db.add(nuevo_pago_deposito_atrasado)
                             db.commit()
+
+        # Los cargos se generan con el mes y año de hoy
+        resumen_pagos.refrescar(db, meses)
+        db.commit()
+
+    # Cargos nuevos: el tablero debe recalcularse
+    reportes.invalidar()
@@ -0,0 +1,57 @@
+"""
+ZIP escrito a medida que se envía.
+
+zipfile admite un destino sin seek (marca cada entrada con descriptor de
+datos), así que cada bloque escrito se puede entregar de inmediato a una
+StreamingResponse: en memoria solo queda el bloque actual.
+"""
+import io
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, Union
+
+BLOQUE_ZIP = 64 * 1024
+
+
+class _Salida(io.RawIOBase):
+    """Destino sin seek que acumula lo escrito hasta que se vacía."""
+
+    def __init__(self):
+        super().__init__()
+        self._partes: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._partes.append(bytes(data))
+        return len(data)
+
+    def vaciar(self) -> bytes:
+        data = b"".join(self._partes)
+        self._partes.clear()
+        return data
+
+
+def zip_en_flujo(entradas: Iterable[tuple[str, Union[BinaryIO, bytes]]]) -> Iterator[bytes]:
+    """
+    entradas: (nombre, archivo abierto o bytes). Los archivos se copian por
+    bloques y se cierran. Se guardan sin comprimir (ZIP_STORED): los PDFs ya
+    vienen comprimidos por dentro.
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as zf:
+        for nombre, contenido in entradas:
+            if isinstance(contenido, bytes):
+                zf.writestr(nombre, contenido)
+            else:
+                with contenido, zf.open(nombre, "w") as destino:
+                    while True:
+                        bloque = contenido.read(BLOQUE_ZIP)
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+                        if pendiente := salida.vaciar():
+                            yield pendiente
+            if pendiente := salida.vaciar():
+                yield pendiente
+    yield salida.vaciar()  # directorio central